@@ -7,26 +7,134 @@ Universal theme installer for ANY Notepad++ theme
 import os
 import sys
 import stat
-import shutil
-import subprocess
-import json
 import re
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from fnmatch import fnmatch
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import click
-from rich.console import Console
-from rich.panel import Panel
-from rich.prompt import Prompt, Confirm
-from rich.table import Table
-from rich import box
 
-console = Console()
+# Rich, subprocess, shutil, json and friends are imported inside the
+# functions that use them, so scripted one-shot commands start quickly.
+
+# Rich markup tags such as [bold red] or [/]; literal labels like [OK] start
+# with an uppercase letter and are left alone, as rich itself does
+MARKUP_TAG_RE = re.compile(r'\[[a-z#/@][^\[\]]*\]')
+
+
+class LazyConsole:
+    """Stand-in for rich's Console that defers importing rich until first use
+
+    In plain mode, strings are printed with their markup stripped and rich
+    is never imported; tables and other renderables still go through a
+    colorless rich Console.
+    """
+
+    def __init__(self):
+        self._console = None
+        self.plain = False
+
+    def _get_console(self):
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console(no_color=self.plain, highlight=not self.plain)
+        return self._console
+
+    def print(self, *objects, **kwargs):
+        if TRACE_SPANS is not None:
+            with trace_span("console.print"):
+                return self._print(*objects, **kwargs)
+        return self._print(*objects, **kwargs)
+
+    def _print(self, *objects, **kwargs):
+        if self.plain and all(isinstance(obj, str) for obj in objects):
+            print(*(MARKUP_TAG_RE.sub("", obj) for obj in objects), end=kwargs.get("end", "\n"))
+            return
+        self._get_console().print(*objects, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._get_console(), name)
+
+
+console = LazyConsole()
+SHOW_BANNER = True
+# Set while `mkpp run` executes a plan, so no step stops to ask
+ASSUME_YES = False
+# Set by --dedupe: installs reflink the content-addressed store instead of copying
+DEDUPE_INSTALLS = False
+
+# Finished timing spans for --profile/--trace-file; None while tracing is off
+TRACE_SPANS: Optional[List[Dict]] = None
+TRACE_START = 0.0
+_trace_ids = itertools.count(1)
+_trace_stacks = threading.local()
+
+
+def start_tracing():
+    """Start collecting timing spans"""
+    global TRACE_SPANS, TRACE_START
+    TRACE_SPANS = []
+    TRACE_START = time.perf_counter()
+
+
+@contextmanager
+def trace_span(name: str, detail: Optional[str] = None):
+    """Time the enclosed block as one span (does nothing unless tracing)
+
+    Spans opened inside another span on the same thread record it as their
+    parent, which is how print_trace_profile works out self time.
+    """
+    if TRACE_SPANS is None:
+        yield
+        return
+
+    stack = _trace_stacks.__dict__.setdefault("stack", [])
+    span = {"id": next(_trace_ids), "parent": stack[-1]["id"] if stack else None, "name": name,
+            "thread": threading.get_ident(), "start": time.perf_counter()}
+    if detail is not None:
+        span["detail"] = detail
+    stack.append(span)
+    try:
+        yield
+    except BaseException as e:
+        if not (isinstance(e, SystemExit) and e.code in (0, None)):
+            span["error"] = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        span["duration"] = time.perf_counter() - span["start"]
+        TRACE_SPANS.append(span)
+
+
+def traced(name: str, detail: bool = False):
+    """Decorator form of trace_span; with detail, the first argument is recorded too"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if TRACE_SPANS is None:
+                return func(*args, **kwargs)
+            with trace_span(name, str(args[0]) if detail and args else None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
 
 # Configuration
 CONFIG_DIR = Path.home() / ".mkpp"
 CONFIG_FILE = CONFIG_DIR / "config.txt"
+INSTALL_MANIFEST_FILE = CONFIG_DIR / "install_manifest.json"
+REPO_CACHE_DIR = CONFIG_DIR / "repos"
+INSTALLED_INDEX_FILE = CONFIG_DIR / "installed_index.json"
+SEARCH_INDEX_FILE = CONFIG_DIR / "search_index.db"
+STORE_DIR = CONFIG_DIR / "store"
 DEFAULT_THEME_DIR = Path(os.getenv("APPDATA", "")) / "Notepad++" / "themes"
 DEFAULT_UDL_DIR = Path(os.getenv("APPDATA", "")) / "Notepad++" / "userDefineLangs"
+DEFAULT_INSTALL_JOBS = 8
+THEMES_DIR = Path(__file__).parent / "Themes"
 
 
 def ensure_config_dir():
@@ -34,6 +142,7 @@ def ensure_config_dir():
     CONFIG_DIR.mkdir(exist_ok=True)
 
 
+@traced("get_source_path")
 def get_source_path() -> Optional[Path]:
     """Get the configured source path"""
     ensure_config_dir()
@@ -44,14 +153,241 @@ def get_source_path() -> Optional[Path]:
     return None
 
 
+@traced("set_source_path")
 def set_source_path(path: Path):
     """Set the source path in config"""
     ensure_config_dir()
-    CONFIG_FILE.write_text(str(path))
+    atomic_write_text(CONFIG_FILE, str(path))
+
+
+def remove_quietly(path: Path):
+    """Delete a file if it exists, ignoring errors"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def open_temp_beside(dest: Path, mode: str = 'wb', encoding: Optional[str] = None):
+    """Open a new temp file in dest's folder; returns (file, temp path)
+
+    Temp files are hidden and never end in .xml, so discovery ignores any
+    that a crash leaves behind.
+    """
+    import tempfile
+
+    fd, temp_name = tempfile.mkstemp(prefix=f".{dest.name}.", suffix=".mkpp-tmp", dir=dest.parent)
+    return os.fdopen(fd, mode, encoding=encoding), Path(temp_name)
+
+
+def close_durably(f):
+    """Flush a file all the way to disk and close it"""
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def fsync_directory(directory: Path):
+    """Persist a rename inside a directory (no-op on Windows)"""
+    if os.name == 'nt':
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def replace_durably(temp: Path, dest: Path):
+    """Swap a finished temp file in over dest"""
+    os.replace(temp, dest)
+    fsync_directory(dest.parent)
+
+
+def keep_file_mode(temp: Path, dest: Path):
+    """Give a temp file dest's permissions (or the usual ones for a new file)"""
+    import shutil
+
+    if dest.exists():
+        shutil.copymode(dest, temp)
+    else:
+        os.chmod(temp, 0o644)
+
+
+@contextmanager
+def atomic_output(dest: Path, mode: str = 'w', encoding: Optional[str] = 'utf-8'):
+    """Write a file through an fsynced temp file that replaces dest on success
+
+    If the block raises, dest is left untouched and the temp file removed.
+    """
+    f, temp = open_temp_beside(dest, mode, None if 'b' in mode else encoding)
+    try:
+        yield f
+        close_durably(f)
+        keep_file_mode(temp, dest)
+        replace_durably(temp, dest)
+    except BaseException:
+        f.close()
+        remove_quietly(temp)
+        raise
+
+
+def atomic_write_text(path: Path, text: str, encoding: str = 'utf-8'):
+    """Replace a text file atomically and durably"""
+    with atomic_output(path, 'w', encoding) as f:
+        f.write(text)
+
+
+def stage_file_copy(source: Path, dest: Path) -> Tuple[Path, str]:
+    """Copy source with its metadata into an fsynced temp file beside dest
+
+    Returns the temp path and the SHA-256 of the content.
+    """
+    import hashlib
+    import shutil
+
+    digest = hashlib.sha256()
+    out, temp = open_temp_beside(dest, 'wb')
+    try:
+        with open(source, 'rb') as src:
+            for block in iter(lambda: src.read(1024 * 1024), b""):
+                digest.update(block)
+                out.write(block)
+        close_durably(out)
+        shutil.copystat(source, temp)
+    except BaseException:
+        out.close()
+        remove_quietly(temp)
+        raise
+    return temp, digest.hexdigest()
+
+
+class FileTransaction:
+    """Stage several file writes and swap them all in together, or none
+
+    Use as a context manager::
+
+        with FileTransaction() as tx:
+            tx.copy(source, dest)
+            tx.write_text(other_dest, text)
+
+    Every write goes to an fsynced temp file beside its destination. If the
+    block raises, the temp files are discarded and no destination is
+    touched. On commit, existing files are backed up first, so a failure
+    part-way through (e.g. a file locked by Notepad++) puts every original
+    back. Staging may be called from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._staged = []
+
+    def _add(self, temp: Path, dest: Path):
+        with self._lock:
+            self._staged.append((temp, dest))
+
+    def copy(self, source: Path, dest: Path) -> Tuple[Path, str]:
+        """Stage a copy of source to dest; returns (temp path, SHA-256)"""
+        temp, sha256 = stage_file_copy(source, dest)
+        self._add(temp, dest)
+        return temp, sha256
+
+    def link(self, obj: Path, dest: Path) -> Tuple[Path, str]:
+        """Stage a link from a store object to dest; returns (temp path, method)"""
+        temp, method = stage_store_link(obj, dest)
+        self._add(temp, dest)
+        return temp, method
+
+    def write_text(self, dest: Path, text: str, encoding: str = 'utf-8') -> Path:
+        """Stage new text content for dest; returns the temp path"""
+        return self._write(dest, text, 'w', encoding)
+
+    def write_bytes(self, dest: Path, data) -> Path:
+        """Stage new binary content (bytes or a memoryview) for dest; returns the temp path"""
+        return self._write(dest, data, 'wb', None)
+
+    def _write(self, dest: Path, data, mode: str, encoding: Optional[str]) -> Path:
+        f, temp = open_temp_beside(dest, mode, encoding)
+        try:
+            f.write(data)
+            close_durably(f)
+            keep_file_mode(temp, dest)
+        except BaseException:
+            f.close()
+            remove_quietly(temp)
+            raise
+        self._add(temp, dest)
+        return temp
+
+    def discard(self):
+        """Throw away everything staged so far"""
+        for temp, _ in self._staged:
+            remove_quietly(temp)
+        self._staged = []
+
+    def commit(self):
+        """Swap every staged file in, rolling all of them back on failure"""
+        import shutil
+
+        applied = []
+        backup = None
+        try:
+            for temp, dest in self._staged:
+                if dest.exists():
+                    backup = dest.with_name(f".{dest.name}.mkpp-bak")
+                    remove_quietly(backup)
+                    try:
+                        os.link(dest, backup)
+                    except OSError:
+                        shutil.copy2(dest, backup)
+                os.replace(temp, dest)
+                applied.append((dest, backup))
+                backup = None
+        except BaseException:
+            # A file whose swap failed still holds its original; drop the backup
+            if backup:
+                remove_quietly(backup)
+            for dest, backup in reversed(applied):
+                try:
+                    if backup:
+                        os.replace(backup, dest)
+                    else:
+                        os.unlink(dest)
+                except OSError:
+                    pass
+            self.discard()
+            raise
+
+        for dest, backup in applied:
+            if backup:
+                remove_quietly(backup)
+        for directory in {dest.parent for _, dest in self._staged}:
+            fsync_directory(directory)
+        self._staged = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
 
 
 def print_banner():
-    """Print the milk++ banner"""
+    """Print the milk++ banner (unless --quiet/--no-banner was given)"""
+    if not SHOW_BANNER:
+        return
+    from rich.panel import Panel
+    from rich import box
+
     banner = """
                 milk++
            ================
@@ -60,6 +396,15 @@ def print_banner():
     console.print(Panel(banner, style="bold magenta", box=box.DOUBLE))
 
 
+def confirm(question: str, yes: bool = False, default: bool = True) -> bool:
+    """Ask a yes/no question, unless --yes was given or a plan is running"""
+    if yes or ASSUME_YES:
+        return True
+    from rich.prompt import Confirm
+
+    return Confirm.ask(question, default=default)
+
+
 def verify_notepad_installation() -> bool:
     """Check if Notepad++ appears to be installed"""
     if not DEFAULT_THEME_DIR.parent.exists():
@@ -79,910 +424,5033 @@ def ensure_udl_directory():
     DEFAULT_UDL_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def find_theme_files(directory: Path) -> List[Path]:
-    """Find all .xml theme files in a directory (excluding .udl.xml files)"""
-    if not directory.exists():
-        return []
-    # Find .xml files but exclude .udl.xml files
-    all_xml = directory.glob("*.xml")
-    theme_files = [f for f in all_xml if not f.name.endswith('.udl.xml')]
-    return sorted(theme_files)
+def is_udl_file_name(name: str) -> bool:
+    """Check whether a file name is a UDL file (.udl.xml, any case)"""
+    return name.lower().endswith('.udl.xml')
 
 
-def find_udl_files(directory: Path) -> List[Path]:
-    """Find all .udl.xml files in a directory"""
-    if not directory.exists():
-        return []
-    return sorted(directory.glob("*.udl.xml"))
+def is_theme_file_name(name: str) -> bool:
+    """Check whether a file name is a theme file (.xml but not .udl.xml)"""
+    return name.lower().endswith('.xml') and not is_udl_file_name(name)
 
 
-def install_theme(theme_path: Path, custom_name: Optional[str] = None) -> bool:
-    """Install a theme file to Notepad++"""
-    if not theme_path.exists():
-        console.print(f"[bold red][ERROR] Theme file not found: {theme_path}[/bold red]")
-        return False
+def matches_file_filters(rel_path: str, include: Optional[List[str]], exclude: Optional[List[str]]) -> bool:
+    """Apply include/exclude globs to a relative path (or its file name)"""
+    name = rel_path.rsplit('/', 1)[-1]
+
+    def matches(patterns):
+        return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
 
-    if theme_path.suffix.lower() != ".xml":
-        console.print("[bold red][ERROR] File must be an .xml file[/bold red]")
+    if include and not matches(include):
         return False
+    if exclude and matches(exclude):
+        return False
+    return True
 
-    ensure_themes_directory()
 
-    dest_name = custom_name if custom_name else theme_path.name
-    if not dest_name.endswith('.xml'):
-        dest_name += '.xml'
+@traced("discover_files")
+def discover_files(directory: Path, recursive: bool = False, include: Optional[List[str]] = None,
+                   exclude: Optional[List[str]] = None,
+                   max_depth: Optional[int] = None) -> Tuple[List[Path], List[Path]]:
+    """Find theme and UDL files in a single walk of a directory
 
-    dest_path = DEFAULT_THEME_DIR / dest_name
+    Returns (themes, udls), each sorted. Subfolders are walked when
+    ``recursive`` is set, down to ``max_depth`` levels below ``directory``
+    (unlimited if None); hidden folders such as .git are skipped.
+    ``include``/``exclude`` are glob patterns matched against the path
+    relative to ``directory`` (with / separators) or the file name.
+    """
+    themes = []
+    udls = []
+    if not directory.exists():
+        return themes, udls
 
-    try:
-        shutil.copy2(theme_path, dest_path)
-        console.print(f"[bold green][OK] Theme '{dest_name}' installed![/bold green]")
-        console.print(f"[cyan]Location: {dest_path}[/cyan]")
-        return True
-    except Exception as e:
-        console.print(f"[bold red][ERROR] Installation failed: {e}[/bold red]")
-        return False
+    if not recursive:
+        max_depth = 0
 
+    pending = [(str(directory), "", 0)]
+    while pending:
+        folder, rel_folder, depth = pending.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                name = entry.name
+                rel_path = rel_folder + name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if (max_depth is None or depth < max_depth) and not name.startswith('.'):
+                            pending.append((entry.path, rel_path + '/', depth + 1))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                if is_udl_file_name(name):
+                    found = udls
+                elif is_theme_file_name(name):
+                    found = themes
+                else:
+                    continue
+
+                if (include or exclude) and not matches_file_filters(rel_path, include, exclude):
+                    continue
+                found.append(Path(entry.path))
+
+    return sorted(themes), sorted(udls)
+
+
+def find_name_clashes(paths: List[Path]) -> List[str]:
+    """Files that would be installed over each other, one message per clash
+
+    Notepad++ folders are flat, and case-insensitive on Windows, so files
+    from different subfolders clash when their names differ only in case.
+    """
+    seen = {}
+    clashes = []
+    for path in paths:
+        other = seen.setdefault(path.name.lower(), path)
+        if other is not path:
+            clashes.append(f"{path} has the same name as {other}")
+    return clashes
 
-def install_udl(udl_path: Path, custom_name: Optional[str] = None) -> bool:
-    """Install a UDL file to Notepad++"""
-    if not udl_path.exists():
-        console.print(f"[bold red][ERROR] UDL file not found: {udl_path}[/bold red]")
-        return False
 
-    if not udl_path.name.endswith('.udl.xml'):
-        console.print("[bold red][ERROR] File must be a .udl.xml file[/bold red]")
-        return False
+def report_name_clashes(themes: List[Path], udls: List[Path]) -> bool:
+    """Print an error for every pair of discovered files with the same name
 
-    ensure_udl_directory()
+    Returns True if there were any; such a batch must not be installed.
+    """
+    clashes = find_name_clashes(themes) + find_name_clashes(udls)
+    for clash in clashes:
+        console.print(f"[red][ERROR] {clash}[/red]")
+    if clashes:
+        console.print("[dim]Rename one of each pair, or leave it out with --exclude[/dim]")
+    return bool(clashes)
 
-    dest_name = custom_name if custom_name else udl_path.name
-    if not dest_name.endswith('.udl.xml'):
-        dest_name += '.udl.xml'
 
-    dest_path = DEFAULT_UDL_DIR / dest_name
+@traced("find_theme_files")
+def find_theme_files(directory: Path, recursive: bool = False) -> List[Path]:
+    """Find all .xml theme files in a directory (excluding .udl.xml files)"""
+    return discover_files(directory, recursive)[0]
 
-    try:
-        shutil.copy2(udl_path, dest_path)
-        console.print(f"[bold green][OK] UDL '{dest_name}' installed![/bold green]")
-        console.print(f"[cyan]Location: {dest_path}[/cyan]")
-        return True
-    except Exception as e:
-        console.print(f"[bold red][ERROR] Installation failed: {e}[/bold red]")
-        return False
 
+@traced("find_udl_files")
+def find_udl_files(directory: Path, recursive: bool = False) -> List[Path]:
+    """Find all .udl.xml files in a directory"""
+    return discover_files(directory, recursive)[1]
 
-def clone_git_repo(repo_url: str, dest: Path) -> bool:
-    """Clone a git repository"""
-    try:
-        subprocess.run(
-            ["git", "clone", repo_url, str(dest)],
-            check=True,
-            capture_output=True
-        )
-        return True
-    except subprocess.CalledProcessError:
-        return False
-    except FileNotFoundError:
-        console.print("[yellow][WARNING]  Git not installed[/yellow]")
-        return False
 
+@traced("load_install_manifest")
+def load_install_manifest() -> Dict:
+    """Load the record of installed files (dest path -> size, mtime, hash)"""
+    import json
 
-def remove_readonly(func, path, excinfo):
-    """Error handler for Windows readonly file deletion"""
-    os.chmod(path, 0o777)
-    func(path)
+    if not INSTALL_MANIFEST_FILE.exists():
+        return {}
+    try:
+        with open(INSTALL_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError, AttributeError):
+        # A damaged manifest only costs a full recopy
+        return {}
 
 
-def safe_rmtree(path: Path):
-    """Safely remove directory tree, handling Windows permission issues"""
-    if not path.exists():
-        return
+@traced("save_install_manifest")
+def save_install_manifest(manifest: Dict):
+    """Save the record of installed files"""
+    import json
 
+    ensure_config_dir()
     try:
-        shutil.rmtree(path, onerror=remove_readonly)
-    except Exception as e:
-        console.print(f"[dim]Warning: Could not clean temp files: {e}[/dim]")
+        atomic_write_text(INSTALL_MANIFEST_FILE, json.dumps({"version": 1, "files": manifest}, indent=2))
+    except OSError as e:
+        console.print(f"[dim]Warning: Could not save install manifest: {e}[/dim]")
 
 
-@click.group(invoke_without_command=True)
-@click.pass_context
-def cli(ctx):
-    """milk++ - Universal Notepad++ Theme Injector"""
-    if ctx.invoked_subcommand is None:
-        print_banner()
-        show_main_menu()
+def copy_file_hashed(source: Path, dest: Path) -> str:
+    """Copy a file with its metadata atomically, hashing it on the way
 
+    Returns the SHA-256 of the content.
+    """
+    temp, sha256 = stage_file_copy(source, dest)
+    try:
+        replace_durably(temp, dest)
+    except BaseException:
+        remove_quietly(temp)
+        raise
+    return sha256
 
-def show_install_menu():
-    """Display all install options submenu"""
-    while True:
-        console.print("\n[bold cyan]=== All Install Options ===[/bold cyan]\n")
 
-        table = Table(show_header=False, box=box.SIMPLE)
-        table.add_column("Option", style="cyan", width=6)
-        table.add_column("Description", style="white")
+def file_sha256(path: Path) -> str:
+    """Get the SHA-256 of a file's content"""
+    import hashlib
 
-        table.add_row("1", "Install from File")
-        table.add_row("2", "Install from Git Repository")
-        table.add_row("3", "Scan and Install (Batch)")
-        table.add_row("b", "Back to Main Menu")
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-        console.print(table)
 
-        choice = Prompt.ask(
-            "\n[bold yellow]Select option[/bold yellow]",
-            choices=["1", "2", "3", "b"],
-            default="b"
-        )
+def make_manifest_record(source: Path, written: Path, sha256: str) -> Dict:
+    """Build the manifest entry for a freshly installed file
 
-        if choice == "1":
-            install_from_file()
-        elif choice == "2":
-            install_from_git()
-        elif choice == "3":
-            install_batch()
-        elif choice == "b":
-            break
+    ``written`` is the installed file, or its staged temp file (which keeps
+    its size and mtime when renamed into place).
+    """
+    source_stat = source.stat()
+    dest_stat = written.stat()
+    return {
+        "source": str(source),
+        "source_mtime": source_stat.st_mtime_ns,
+        "size": dest_stat.st_size,
+        "mtime": dest_stat.st_mtime_ns,
+        "sha256": sha256,
+    }
 
 
-def show_settings_menu():
-    """Display settings submenu"""
-    while True:
-        console.print("\n[bold cyan]=== Settings ===[/bold cyan]\n")
+def is_install_current(source: Path, dest: Path, record: Optional[Dict]) -> bool:
+    """Check whether dest already holds an unmodified copy of source
 
-        table = Table(show_header=False, box=box.SIMPLE)
-        table.add_column("Option", style="cyan", width=6)
-        table.add_column("Description", style="white")
+    The installed copy must still match the size and mtime recorded when
+    mkpp wrote it. The source is only hashed when its size matches but its
+    path or mtime differs from the recorded one.
+    """
+    if not record:
+        return False
+    try:
+        dest_stat = dest.stat()
+        source_stat = source.stat()
+    except OSError:
+        return False
 
-        table.add_row("1", "Show Paths & Configuration")
-        table.add_row("2", "Set Source Path")
-        table.add_row("b", "Back to Main Menu")
+    if dest_stat.st_size != record["size"] or dest_stat.st_mtime_ns != record["mtime"]:
+        return False
+    if source_stat.st_size != record["size"]:
+        return False
+    if record.get("source") == str(source) and record.get("source_mtime") == source_stat.st_mtime_ns:
+        return True
+    return file_sha256(source) == record["sha256"]
 
-        console.print(table)
 
-        choice = Prompt.ask(
-            "\n[bold yellow]Select option[/bold yellow]",
-            choices=["1", "2", "b"],
-            default="b"
-        )
+# Content-addressed store for --dedupe installs: one read-only object per
+# distinct content under ~/.mkpp/store/<sha[:2]>/<sha>, shared by every
+# installed copy through a reflink (copy-on-write clone). Installed files
+# are never hard links: Notepad++ must be able to save edits to each one.
+# Where reflinks don't work the store is not used at all, since a store
+# object plus a full copy would only double the writes.
+FICLONE = 0x40049409
+_reflink_support: Dict[Tuple[Path, Path], bool] = {}
+_reflink_support_lock = threading.Lock()
 
-        if choice == "1":
-            show_paths()
-        elif choice == "2":
-            set_path_interactive()
-        elif choice == "b":
-            break
 
+def get_store_object_path(sha256: str) -> Path:
+    """Path of the store object for a SHA-256"""
+    return STORE_DIR / sha256[:2] / sha256
 
-def show_main_menu():
-    """Display interactive main menu"""
-    while True:
-        console.print("\n[bold cyan]=== Main Menu ===[/bold cyan]\n")
 
-        table = Table(show_header=False, box=box.SIMPLE)
-        table.add_column("Option", style="cyan", width=6)
-        table.add_column("Description", style="white")
+def make_read_only(path: Path):
+    """Clear a file's write bits"""
+    os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
 
-        table.add_row("1", "Scan and Install")
-        table.add_row("2", "Install from Git Repository")
-        table.add_row("3", "All Install Options")
-        table.add_row("4", "View Installed Themes")
-        table.add_row("5", "View Installed UDLs")
-        table.add_row("6", "Settings")
-        table.add_row("7", "Palette Editor")
-        table.add_row("q", "Quit")
 
-        console.print(table)
+def make_writable(path: Path):
+    """Set a file's owner write bit, e.g. on a copy of a read-only store object"""
+    os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) | stat.S_IWUSR)
 
-        choice = Prompt.ask(
-            "\n[bold yellow]Select option[/bold yellow]",
-            choices=["1", "2", "3", "4", "5", "6", "7", "q"],
-            default="q"
-        )
 
-        if choice == "1":
-            install_batch()
-        elif choice == "2":
-            install_from_git()
-        elif choice == "3":
-            show_install_menu()
-        elif choice == "4":
-            list_themes()
-        elif choice == "5":
-            list_udls()
-        elif choice == "6":
-            show_settings_menu()
-        elif choice == "7":
-            show_palette_editor()
-        elif choice == "q":
-            console.print("\n[bold magenta]Thanks for using milk++![/bold magenta]\n")
-            break
+def store_object_from_file(source: Path) -> Tuple[Path, str]:
+    """Add a file's content to the store; returns the object path and SHA-256
 
+    Content that is already stored is not copied again.
+    """
+    sha256 = file_sha256(source)
+    obj = get_store_object_path(sha256)
+    if not obj.exists():
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        temp, _ = stage_file_copy(source, obj)
+        make_read_only(temp)
+        replace_durably(temp, obj)
+    return obj, sha256
+
+
+def store_object_from_bytes(data, sha256: str) -> Path:
+    """Add already-verified content (bytes or a memoryview) to the store"""
+    obj = get_store_object_path(sha256)
+    if not obj.exists():
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        f, temp = open_temp_beside(obj, 'wb')
+        try:
+            f.write(data)
+            close_durably(f)
+            make_read_only(temp)
+            replace_durably(temp, obj)
+        except BaseException:
+            f.close()
+            remove_quietly(temp)
+            raise
+    return obj
+
+
+def probe_reflink(dest_dir: Path) -> bool:
+    """Try to reflink a scratch file from the store into dest_dir"""
+    try:
+        import fcntl
 
-def install_from_file():
-    """Install theme from a single file"""
-    console.print("\n[bold cyan]Install Theme from File[/bold cyan]\n")
+        STORE_DIR.mkdir(parents=True, exist_ok=True)
+        src, src_temp = open_temp_beside(STORE_DIR / "probe")
+    except (ImportError, OSError):
+        return False
+    try:
+        src.write(b"mkpp")
+        src.flush()
+        out, out_temp = open_temp_beside(dest_dir / "probe")
+        try:
+            with out:
+                fcntl.ioctl(out.fileno(), FICLONE, src.fileno())
+            return True
+        finally:
+            remove_quietly(out_temp)
+    except OSError:
+        return False
+    finally:
+        src.close()
+        remove_quietly(src_temp)
 
-    if not verify_notepad_installation():
-        Prompt.ask("\nPress Enter to continue")
-        return
 
-    file_path = Prompt.ask("[yellow]Enter theme file path (.xml)[/yellow]")
-    theme_path = Path(file_path).expanduser().resolve()
+def use_store_for(dest_dir: Path) -> bool:
+    """Whether a --dedupe install into dest_dir should go through the store
 
-    if install_theme(theme_path):
-        console.print(
-            "\n[yellow]📝 To activate:[/yellow]"
-            "\n   1. Restart Notepad++"
-            "\n   2. Settings → Style Configurator"
-            "\n   3. Select your theme from dropdown"
-        )
+    Reflink support is probed once per folder; where it is missing, a
+    warning is printed the first time and files are installed as plain
+    copies instead.
+    """
+    if not DEDUPE_INSTALLS:
+        return False
+    key = (STORE_DIR, dest_dir)
+    with _reflink_support_lock:
+        if key not in _reflink_support:
+            _reflink_support[key] = probe_reflink(dest_dir)
+            if not _reflink_support[key]:
+                console.print(f"[yellow][WARNING]  --dedupe needs reflinks between {STORE_DIR} and {dest_dir} "
+                              f"(e.g. Btrfs or XFS); installing plain copies[/yellow]")
+        return _reflink_support[key]
+
+
+def stage_store_link(obj: Path, dest: Path) -> Tuple[Path, str]:
+    """Make a temp file beside dest that shares obj's content
+
+    Tries a reflink (Linux FICLONE: a copy-on-write clone, so Notepad++
+    may edit it freely). use_store_for has already checked that the folder
+    supports them, so the plain-copy fallback only covers a clone that
+    fails anyway (a full disk, say). Returns the temp path and the method
+    used.
+    """
+    f, temp = open_temp_beside(dest, 'wb')
+    try:
+        import fcntl
+
+        with open(obj, 'rb') as src:
+            fcntl.ioctl(f.fileno(), FICLONE, src.fileno())
+        close_durably(f)
+        keep_file_mode(temp, dest)
+        make_writable(temp)
+        return temp, "reflink"
+    except (ImportError, OSError):
+        f.close()
+        remove_quietly(temp)
+
+    temp, _ = stage_file_copy(obj, dest)
+    keep_file_mode(temp, dest)
+    make_writable(temp)
+    return temp, "copy"
+
+
+def link_from_store(obj: Path, dest: Path) -> Tuple[Path, str]:
+    """Replace dest with a link to a store object; returns (dest, method)"""
+    temp, method = stage_store_link(obj, dest)
+    try:
+        if os.name == 'nt' and dest.exists() and not os.access(dest, os.W_OK):
+            # Windows can't replace a read-only file
+            os.chmod(dest, stat.S_IWRITE)
+        replace_durably(temp, dest)
+    except BaseException:
+        remove_quietly(temp)
+        raise
+    return dest, method
+
+
+def collect_store_references(manifest: Dict) -> set:
+    """SHA-256s of store objects that an installed file still links to"""
+    referenced = set()
+    for dest, record in manifest.items():
+        if record.get("store") != "reflink":
+            continue
+        try:
+            dest_stat = os.stat(dest)
+        except OSError:
+            continue
+        if dest_stat.st_size == record["size"] and dest_stat.st_mtime_ns == record["mtime"]:
+            referenced.add(record["sha256"])
+    return referenced
 
-    Prompt.ask("\nPress Enter to continue")
 
+@traced("gc_store")
+def gc_store(dry_run: bool = False) -> Tuple[int, int, int]:
+    """Delete store objects no installed file refers to
 
-def install_from_git():
-    """Install theme from Git repository"""
-    console.print("\n[bold cyan]Install from Git Repository[/bold cyan]\n")
+    An object is kept while the install manifest records an unchanged
+    installed reflink of it, or while anything else hard-links to it.
+    Returns (objects kept, objects removed, bytes freed).
+    """
+    referenced = collect_store_references(load_install_manifest())
+    kept = removed = freed = 0
+    if not STORE_DIR.exists():
+        return kept, removed, freed
+
+    for bucket in sorted(STORE_DIR.iterdir()):
+        if not bucket.is_dir():
+            continue
+        for obj in sorted(bucket.iterdir()):
+            obj_stat = obj.stat()
+            if obj.name in referenced or obj_stat.st_nlink > 1:
+                kept += 1
+                continue
+            if not dry_run:
+                try:
+                    if os.name == 'nt':
+                        os.chmod(obj, stat.S_IWRITE)
+                    os.unlink(obj)
+                except OSError as e:
+                    console.print(f"[yellow][WARNING]  Could not remove {obj.name}: {e}[/yellow]")
+                    kept += 1
+                    continue
+            removed += 1
+            freed += obj_stat.st_size
+        if not dry_run and not any(bucket.iterdir()):
+            bucket.rmdir()
+    return kept, removed, freed
+
+
+# Validation before install. Each candidate is stream-parsed with expat, so
+# a malformed file is rejected before anything is written to the Notepad++
+# folders; batches above the threshold are spread over a process pool.
+VALIDATE_POOL_THRESHOLD = 4 * 1024 * 1024
+VALIDATE_CHUNK_SIZE = 64 * 1024
+MAX_VALIDATION_ERRORS = 5
+VALIDATE_COLOR_ATTRS = ("fgColor", "bgColor")
+# The element Notepad++ expects directly under <NotepadPlus>
+REQUIRED_XML_SECTION = {"theme": "LexerStyles", "udl": "UserLang"}
+
+
+def validate_theme_xml(chunks, kind: str) -> List[str]:
+    """Stream-parse a theme or UDL file and return what is wrong with it
+
+    ``chunks`` is an iterable of bytes. The file must be well-formed XML
+    with a <NotepadPlus> root and a <LexerStyles> (themes) or <UserLang>
+    (UDLs) section directly under it, and every fgColor/bgColor must be a
+    six-digit hex color. Stops after MAX_VALIDATION_ERRORS problems.
+    """
+    from xml.parsers import expat
+
+    parser = expat.ParserCreate()
+    section = REQUIRED_XML_SECTION[kind]
+    errors = []
+    state = {"depth": 0, "section": False}
+
+    def start(name, attrs):
+        depth = state["depth"]
+        state["depth"] = depth + 1
+        if depth == 0 and name != "NotepadPlus":
+            errors.append(f"root element is <{name}>, not <NotepadPlus>")
+        elif depth == 1 and name == section:
+            state["section"] = True
+        for attr in VALIDATE_COLOR_ATTRS:
+            value = attrs.get(attr)
+            if value is not None and not is_hex_color(value):
+                errors.append(f"line {parser.CurrentLineNumber}: <{name}> {attr}=\"{value}\" "
+                              f"is not a six-digit hex color")
+
+    def end(name):
+        state["depth"] -= 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    try:
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+            if len(errors) >= MAX_VALIDATION_ERRORS:
+                return errors[:MAX_VALIDATION_ERRORS]
+        parser.Parse(b"", True)
+    except expat.ExpatError as e:
+        errors.append(f"not well-formed XML: {expat.ErrorString(e.code)} at line {e.lineno}, column {e.offset}")
+        return errors[:MAX_VALIDATION_ERRORS]
+
+    if not state["section"] and not errors:
+        errors.append(f"no <{section}> section under <NotepadPlus>")
+    return errors[:MAX_VALIDATION_ERRORS]
+
+
+def validate_install_file(source: Path, kind: str) -> List[str]:
+    """Problems that would make Notepad++ ignore a theme/UDL file (empty if none)"""
+    try:
+        with open(source, 'rb') as f:
+            return validate_theme_xml(iter(lambda: f.read(VALIDATE_CHUNK_SIZE), b""), kind)
+    except OSError as e:
+        return [f"could not read file: {e}"]
 
-    if not verify_notepad_installation():
-        Prompt.ask("\nPress Enter to continue")
-        return
 
-    repo_url = Prompt.ask("[yellow]Enter Git repository URL[/yellow]")
+@traced("validate_install_files")
+def validate_install_files(candidates: List[Tuple[Path, str]], jobs: int = DEFAULT_INSTALL_JOBS) -> Dict[Path, List[str]]:
+    """Validate many (path, kind) candidates; returns the problems of each invalid one
 
-    temp_dir = CONFIG_DIR / "temp_repo"
-    safe_rmtree(temp_dir)
+    Large batches are parsed on a process pool of up to ``jobs`` workers.
+    """
+    if not candidates:
+        return {}
+    sources = [source for source, _ in candidates]
+    kinds = [kind for _, kind in candidates]
 
-    console.print("\n[dim]Cloning repository...[/dim]")
+    work = 0
+    for source in sources:
+        try:
+            work += source.stat().st_size
+        except OSError:
+            pass
 
-    if clone_git_repo(repo_url, temp_dir):
-        themes = find_theme_files(temp_dir)
-        udls = find_udl_files(temp_dir)
+    workers = min(jobs, os.cpu_count() or 1, len(candidates))
+    if workers > 1 and work > VALIDATE_POOL_THRESHOLD:
+        from concurrent.futures import ProcessPoolExecutor
 
-        if not themes and not udls:
-            console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found in repository[/yellow]")
-        else:
-            # Show found files
-            if themes:
-                console.print(f"\n[green]Found {len(themes)} theme(s):[/green]\n")
-                for i, theme in enumerate(themes, 1):
-                    console.print(f"  {i}. {theme.name}")
-
-            if udls:
-                console.print(f"\n[green]Found {len(udls)} UDL file(s):[/green]\n")
-                for i, udl in enumerate(udls, len(themes) + 1):
-                    console.print(f"  {i}. {udl.name}")
-
-            console.print()
-            install_all = Confirm.ask("Install all files?", default=True)
-
-            if install_all:
-                installed_themes = 0
-                installed_udls = 0
-
-                # Install themes
-                for theme in themes:
-                    if install_theme(theme):
-                        installed_themes += 1
-
-                # Install UDL files
-                for udl in udls:
-                    if install_udl(udl):
-                        installed_udls += 1
-
-                # Summary
-                if installed_themes > 0:
-                    console.print(f"\n[green][OK] Installed {installed_themes}/{len(themes)} themes[/green]")
-                if installed_udls > 0:
-                    console.print(f"[green][OK] Installed {installed_udls}/{len(udls)} UDL files[/green]")
-            else:
-                choice = Prompt.ask("Enter file number to install (or 0 to cancel)")
-                try:
-                    idx = int(choice) - 1
-                    if 0 <= idx < len(themes):
-                        install_theme(themes[idx])
-                    elif len(themes) <= idx < len(themes) + len(udls):
-                        udl_idx = idx - len(themes)
-                        install_udl(udls[udl_idx])
-                except ValueError:
-                    console.print("[red]Invalid choice[/red]")
-
-        safe_rmtree(temp_dir)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            reports = list(pool.map(validate_install_file, sources, kinds,
+                                    chunksize=max(1, len(candidates) // (workers * 4))))
     else:
-        console.print("[bold red][ERROR] Failed to clone repository[/bold red]")
+        reports = [validate_install_file(source, kind) for source, kind in candidates]
+    return {source: errors for source, errors in zip(sources, reports) if errors}
+
+
+def describe_validation_errors(kind: str, errors: List[str]) -> str:
+    """One-line rejection message for an install result"""
+    label = "UDL file" if kind == "udl" else "theme"
+    more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+    return f"Invalid {label}: {errors[0]}{more}"
+
+
+def show_validation_report(names: List[str], invalid: Dict[str, List[str]]) -> bool:
+    """Print every problem found by validation; returns True if all files are valid"""
+    for name in names:
+        if name in invalid:
+            click.echo(f"{name}:")
+            for error in invalid[name]:
+                console.print(f"  [red]•[/red] {error}")
+    if invalid:
+        console.print(f"\n[red][ERROR] {len(invalid)} of {len(names)} file(s) are invalid[/red]")
+        return False
+    console.print(f"[green][OK] All {len(names)} file(s) are valid[/green]")
+    return True
 
-    Prompt.ask("\nPress Enter to continue")
 
+def run_validate_only(candidates: List[Tuple[Path, str]], jobs: int = DEFAULT_INSTALL_JOBS):
+    """Check (path, kind) candidates without installing; exits with status 1 if any is invalid"""
+    invalid = {}
+    for source, kind in candidates:
+        error = check_install_source(source, kind)
+        if error:
+            invalid[source] = [error]
+    invalid.update(validate_install_files([c for c in candidates if c[0] not in invalid], jobs))
 
-def install_batch():
-    """Install all themes and UDL files from source folder"""
-    console.print("\n[bold cyan]Batch Install from Folder[/bold cyan]\n")
+    names = [str(source) for source, _ in candidates]
+    if not show_validation_report(names, {str(source): errors for source, errors in invalid.items()}):
+        sys.exit(1)
 
-    if not verify_notepad_installation():
-        Prompt.ask("\nPress Enter to continue")
-        return
 
-    source_path = get_source_path()
-    if source_path:
-        console.print(f"[dim]Current source: {source_path}[/dim]")
-        use_current = Confirm.ask("Use this folder?", default=True)
-        if use_current:
-            folder_path = source_path
-        else:
-            folder_path = Path(Prompt.ask("[yellow]Enter folder path[/yellow]")).expanduser()
+def check_install_source(source: Path, kind: str) -> Optional[str]:
+    """Return why a file can't be installed as a theme/UDL, or None if it can"""
+    if kind == "udl":
+        if not source.exists():
+            return f"UDL file not found: {source}"
+        if not is_udl_file_name(source.name):
+            return "File must be a .udl.xml file"
     else:
-        folder_path = Path(Prompt.ask("[yellow]Enter folder path[/yellow]")).expanduser()
+        if not source.exists():
+            return f"Theme file not found: {source}"
+        if source.suffix.lower() != ".xml":
+            return "File must be an .xml file"
+    return None
 
-    if not folder_path.exists():
-        console.print("[bold red][ERROR] Folder not found[/bold red]")
-        Prompt.ask("\nPress Enter to continue")
-        return
 
-    # Find both themes and UDL files
-    themes = find_theme_files(folder_path)
-    udls = find_udl_files(folder_path)
+def resolve_install_dest(source: Path, kind: str, custom_name: Optional[str] = None) -> Path:
+    """Get the Notepad++ destination path for a theme/UDL file"""
+    suffix = '.udl.xml' if kind == "udl" else '.xml'
+    dest_dir = DEFAULT_UDL_DIR if kind == "udl" else DEFAULT_THEME_DIR
 
-    if not themes and not udls:
-        console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found[/yellow]")
-    else:
-        # Show found files
-        if themes:
-            console.print(f"\n[green]Found {len(themes)} theme(s):[/green]\n")
-            for theme in themes:
-                console.print(f"  • {theme.name}")
+    dest_name = custom_name if custom_name else source.name
+    if not dest_name.lower().endswith(suffix):
+        dest_name += suffix
 
-        if udls:
-            console.print(f"\n[green]Found {len(udls)} UDL file(s):[/green]\n")
-            for udl in udls:
-                console.print(f"  • {udl.name}")
+    return dest_dir / dest_name
 
-        console.print()
-        if Confirm.ask("Install all?", default=True):
-            installed_themes = 0
-            installed_udls = 0
 
-            # Install themes
-            for theme in themes:
-                if install_theme(theme):
-                    installed_themes += 1
+def write_install_file(result: Dict, transaction: Optional[FileTransaction] = None) -> Dict:
+    """Copy a checked result's source to its dest and fill in its status and record
 
-            # Install UDL files
-            for udl in udls:
-                if install_udl(udl):
-                    installed_udls += 1
+    With --dedupe, dest is reflinked to a store object instead of copied
+    (see use_store_for). With a transaction, the copy is only staged until
+    the transaction commits. The destination directory must already exist.
+    """
+    source, dest_path = result["source"], result["dest"]
+    with trace_span("write_install_file", str(source)):
+        try:
+            method = None
+            if use_store_for(dest_path.parent):
+                obj, sha256 = store_object_from_file(source)
+                if transaction is not None:
+                    written, method = transaction.link(obj, dest_path)
+                else:
+                    written, method = link_from_store(obj, dest_path)
+            elif transaction is not None:
+                written, sha256 = transaction.copy(source, dest_path)
+            else:
+                written, sha256 = dest_path, copy_file_hashed(source, dest_path)
+            result["record"] = make_manifest_record(source, written, sha256)
+            if method == "reflink":
+                result["record"]["store"] = method
+            result.update(status="installed", error=None)
+        except Exception as e:
+            result.update(status="failed", error=f"Installation failed: {e}")
+    return result
 
-            # Summary
-            if installed_themes > 0:
-                console.print(f"\n[green][OK] Installed {installed_themes}/{len(themes)} themes[/green]")
-            if installed_udls > 0:
-                console.print(f"[green][OK] Installed {installed_udls}/{len(udls)} UDL files[/green]")
 
-    Prompt.ask("\nPress Enter to continue")
+@traced("copy_install_file", detail=True)
+def copy_install_file(source: Path, kind: str, custom_name: Optional[str] = None,
+                      manifest: Optional[Dict] = None, force: bool = False,
+                      transaction: Optional[FileTransaction] = None) -> Dict:
+    """Check and copy one theme/UDL file without printing anything
 
+    Returns a result record with the kind, source, dest, status
+    ("installed", "skipped" or "failed"), error message and the new
+    manifest record. When a manifest is given, files whose installed copy
+    is still current are skipped unless ``force`` is set. The copy itself
+    is done by write_install_file.
+    """
+    result = {"kind": kind, "source": source, "dest": None, "status": "failed",
+              "error": None, "record": None}
+
+    error = check_install_source(source, kind)
+    if error:
+        result["error"] = error
+        return result
+
+    dest_path = resolve_install_dest(source, kind, custom_name)
+    result["dest"] = dest_path
+
+    if manifest is not None and not force and is_install_current(source, dest_path, manifest.get(str(dest_path))):
+        result["status"] = "skipped"
+        return result
+
+    return write_install_file(result, transaction)
+
+
+def update_install_manifest(manifest: Dict, results: List[Dict]):
+    """Record freshly installed files in the manifest and save it"""
+    changed = False
+    for result in results:
+        if result["record"]:
+            manifest[str(result["dest"])] = result["record"]
+            changed = True
+    if changed:
+        save_install_manifest(manifest)
+
+
+def install_file(source: Path, kind: str, custom_name: Optional[str] = None, force: bool = False) -> bool:
+    """Install a single theme/UDL file and print the outcome"""
+    errors = [] if check_install_source(source, kind) else validate_install_file(source, kind)
+    if errors:
+        console.print(f"[bold red][ERROR] {describe_validation_errors(kind, errors[:1])}[/bold red]")
+        for error in errors[1:]:
+            console.print(f"  [red]•[/red] {error}")
+        return False
 
-def list_themes():
-    """List installed themes"""
-    console.print("\n[bold cyan]Installed Themes[/bold cyan]\n")
+    if kind == "udl":
+        ensure_udl_directory()
+    else:
+        ensure_themes_directory()
 
-    if not DEFAULT_THEME_DIR.exists():
-        console.print("[yellow][WARNING]  Themes directory not found[/yellow]")
-        console.print(f"[dim]{DEFAULT_THEME_DIR}[/dim]")
-        Prompt.ask("\nPress Enter to continue")
-        return
+    manifest = load_install_manifest()
+    result = copy_install_file(source, kind, custom_name, manifest, force)
+    if result["status"] == "failed":
+        console.print(f"[bold red][ERROR] {result['error']}[/bold red]")
+        return False
 
-    themes = find_theme_files(DEFAULT_THEME_DIR)
+    update_install_manifest(manifest, [result])
+    if result["status"] == "installed":
+        mark_installed_index_stale(kind)
 
-    if not themes:
-        console.print("[yellow]No themes installed[/yellow]")
+    label = "UDL" if kind == "udl" else "Theme"
+    if result["status"] == "skipped":
+        console.print(f"[bold green][OK] {label} '{result['dest'].name}' is already up to date[/bold green]")
     else:
-        table = Table(title="[FOLDER] Installed Themes", box=box.ROUNDED)
-        table.add_column("Theme Name", style="cyan")
-        table.add_column("File Size", style="white")
-
-        for theme in themes:
-            size = theme.stat().st_size
-            size_str = f"{size:,} bytes" if size < 1024 else f"{size/1024:.1f} KB"
-            table.add_row(theme.stem, size_str)
+        console.print(f"[bold green][OK] {label} '{result['dest'].name}' installed![/bold green]")
+    console.print(f"[cyan]Location: {result['dest']}[/cyan]")
+    return True
 
-        console.print(table)
 
-    Prompt.ask("\nPress Enter to continue")
+@traced("install_theme", detail=True)
+def install_theme(theme_path: Path, custom_name: Optional[str] = None) -> bool:
+    """Install a theme file to Notepad++"""
+    return install_file(theme_path, "theme", custom_name)
 
 
-def list_udls():
-    """List installed UDL files"""
-    console.print("\n[bold cyan]Installed UDL Files[/bold cyan]\n")
+@traced("install_udl", detail=True)
+def install_udl(udl_path: Path, custom_name: Optional[str] = None) -> bool:
+    """Install a UDL file to Notepad++"""
+    return install_file(udl_path, "udl", custom_name)
 
-    if not DEFAULT_UDL_DIR.exists():
-        console.print("[yellow][WARNING]  UDL directory not found[/yellow]")
-        console.print(f"[dim]{DEFAULT_UDL_DIR}[/dim]")
-        Prompt.ask("\nPress Enter to continue")
-        return
 
-    udls = find_udl_files(DEFAULT_UDL_DIR)
+def finish_install_transaction(transaction: FileTransaction, results: List[Dict]) -> List[Dict]:
+    """Commit a batch's staged copies, or roll all of them back if any failed"""
+    staged = [r for r in results if r["status"] == "installed"]
 
-    if not udls:
-        console.print("[yellow]No UDL files installed[/yellow]")
+    if any(r["status"] == "failed" for r in results):
+        transaction.discard()
+        error = "Rolled back: another file in the batch failed"
     else:
-        table = Table(title="[FOLDER] Installed UDL Files", box=box.ROUNDED)
-        table.add_column("UDL Name", style="cyan")
-        table.add_column("File Size", style="white")
+        try:
+            transaction.commit()
+            return results
+        except OSError as e:
+            error = f"Rolled back: {e}"
+
+    for result in staged:
+        result.update(status="failed", error=error, record=None)
+    return results
+
+
+@traced("install_many")
+def install_many(themes: List[Path], udls: List[Path], jobs: int = DEFAULT_INSTALL_JOBS,
+                 force: bool = False, atomic: bool = False) -> List[Dict]:
+    """Install many themes and UDL files on a bounded thread pool
+
+    Each file's destination and currency are worked out once. Files that
+    are unchanged since the last install are skipped (see
+    is_install_current) unless ``force`` is set. Files that will be copied
+    are validated first (see validate_install_files); missing and invalid
+    files fail before anything is written. With ``atomic``, the whole batch
+    is installed as one FileTransaction: either every copy lands or none
+    does, and one failed check stops the whole batch. Nothing is printed
+    per file; the per-file result records are returned in input order
+    (themes first) for show_install_summary.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    manifest = load_install_manifest()
+    candidates = [(theme, "theme") for theme in themes] + [(udl, "udl") for udl in udls]
+
+    results = []
+    to_copy = []
+    for source, kind in candidates:
+        dest = resolve_install_dest(source, kind)
+        result = {"kind": kind, "source": source, "dest": dest, "status": "failed",
+                  "error": check_install_source(source, kind), "record": None}
+        results.append(result)
+        if result["error"]:
+            continue
+        if not force and is_install_current(source, dest, manifest.get(str(dest))):
+            result["status"] = "skipped"
+        else:
+            to_copy.append(result)
+
+    invalid = validate_install_files([(r["source"], r["kind"]) for r in to_copy], jobs)
+    for result in to_copy:
+        if result["source"] in invalid:
+            result["error"] = describe_validation_errors(result["kind"], invalid[result["source"]])
+    to_copy = [r for r in to_copy if not r["error"]]
+
+    if atomic and any(r["error"] for r in results):
+        for result in to_copy:
+            result["error"] = "Not installed: another file in the batch failed its checks"
+        return results
+
+    if any(r["kind"] == "theme" for r in to_copy):
+        ensure_themes_directory()
+    if any(r["kind"] == "udl" for r in to_copy):
+        ensure_udl_directory()
+
+    transaction = FileTransaction() if atomic else None
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        list(pool.map(lambda result: write_install_file(result, transaction), to_copy))
+
+    if transaction is not None:
+        results = finish_install_transaction(transaction, results)
+
+    update_install_manifest(manifest, results)
+    for kind in {r["kind"] for r in results if r["status"] == "installed"}:
+        mark_installed_index_stale(kind)
+    return results
+
+
+def show_install_summary(results: List[Dict]):
+    """Display one aggregated table for a batch install"""
+    from rich.table import Table
+    from rich import box
+
+    table = Table(title="Install Summary", box=box.ROUNDED)
+    table.add_column("Type", style="cyan")
+    table.add_column("Found", style="white", justify="right")
+    table.add_column("Installed", style="green", justify="right")
+    table.add_column("Skipped", style="dim", justify="right")
+    table.add_column("Failed", style="red", justify="right")
+
+    for kind, label in (("theme", "Themes"), ("udl", "UDL files")):
+        kind_results = [r for r in results if r["kind"] == kind]
+        if not kind_results:
+            continue
+        counts = {status: sum(1 for r in kind_results if r["status"] == status)
+                  for status in ("installed", "skipped", "failed")}
+        table.add_row(label, str(len(kind_results)), str(counts["installed"]),
+                      str(counts["skipped"]), str(counts["failed"]))
 
-        for udl in udls:
-            size = udl.stat().st_size
-            size_str = f"{size:,} bytes" if size < 1024 else f"{size/1024:.1f} KB"
-            table.add_row(udl.stem, size_str)
+    console.print()
+    console.print(table)
 
-        console.print(table)
+    failures = [r for r in results if r["status"] == "failed"]
+    for failure in failures:
+        console.print(f"[red]  • {failure['source'].name}: {failure['error']}[/red]")
 
-    Prompt.ask("\nPress Enter to continue")
 
+def run_batch_install(themes: List[Path], udls: List[Path], jobs: int = DEFAULT_INSTALL_JOBS,
+                      force: bool = False, atomic: bool = False) -> List[Dict]:
+    """Install a batch of files in parallel and print the summary table"""
+    results = install_many(themes, udls, jobs, force, atomic)
+    show_install_summary(results)
+    return results
 
-def show_paths():
-    """Show current paths and configuration"""
-    console.print("\n[bold cyan]Paths & Configuration[/bold cyan]\n")
 
-    table = Table(box=box.ROUNDED, show_header=False)
-    table.add_column("Setting", style="yellow", width=25)
-    table.add_column("Value", style="white")
+# Theme pack archives (.mkpp): a fixed header, the member files stored back
+# to back, then a JSON table of contents. The header holds the magic and the
+# TOC's offset and size; each TOC entry holds a member's name, kind
+# ("theme", "udl" or "palette"), offset, size and SHA-256. Installs map the
+# archive and write each member straight from the mapping.
+PACK_MAGIC = b"MKPPACK\x01"
+PACK_HEADER_FORMAT = "<8sQQ"
+PACK_HEADER_SIZE = 24
+PACK_FORMAT = 1
+PACK_SUFFIX = ".mkpp"
+PACK_PALETTE_NAME = "color_config.json"
 
-    table.add_row("Themes Directory", str(DEFAULT_THEME_DIR))
-    table.add_row("Themes Exists?", "[OK] Yes" if DEFAULT_THEME_DIR.exists() else "[ERROR] No")
 
-    table.add_row("UDL Directory", str(DEFAULT_UDL_DIR))
-    table.add_row("UDL Exists?", "[OK] Yes" if DEFAULT_UDL_DIR.exists() else "[ERROR] No")
+def collect_pack_members(folder: Path, recursive: bool = False, include: Optional[List[str]] = None,
+                         exclude: Optional[List[str]] = None) -> Tuple[List[Tuple[Path, str]], List[str]]:
+    """Files to pack as (path, kind), plus every problem that blocks packing
 
-    source_path = get_source_path()
-    table.add_row(
-        "Source Path",
-        str(source_path) if source_path else "[dim]Not set[/dim]"
-    )
+    Themes and UDLs are found as scan finds them and must pass validation;
+    a color_config.json at the top of the folder is packed as the pack's
+    palettes.
+    """
+    import json
 
-    table.add_row("Config File", str(CONFIG_FILE))
+    themes, udls = discover_files(folder, recursive, include, exclude)
+    members = [(theme, "theme") for theme in themes] + [(udl, "udl") for udl in udls]
+    errors = [f"{source}: {error}" for source, problems in validate_install_files(members).items()
+              for error in problems]
 
-    console.print(table)
-    Prompt.ask("\nPress Enter to continue")
+    palette_path = folder / PACK_PALETTE_NAME
+    if palette_path.is_file():
+        try:
+            with open(palette_path, 'r', encoding='utf-8') as f:
+                errors += [f"{PACK_PALETTE_NAME}: {error}" for error in validate_palette_config(json.load(f))]
+        except (OSError, ValueError) as e:
+            errors.append(f"{PACK_PALETTE_NAME}: {e}")
+        members.append((palette_path, "palette"))
+
+    errors += find_name_clashes([path for path, _ in members])
+    return members, errors
+
+
+@traced("build_pack", detail=True)
+def build_pack(dest: Path, members: List[Tuple[Path, str]]) -> Dict:
+    """Write members into a pack archive at dest; returns its table of contents"""
+    import hashlib
+    import json
+    import struct
+
+    toc = {"format": PACK_FORMAT, "members": []}
+    with atomic_output(dest, 'wb') as out:
+        out.write(bytes(PACK_HEADER_SIZE))
+        offset = PACK_HEADER_SIZE
+        for path, kind in members:
+            digest = hashlib.sha256()
+            size = 0
+            with open(path, 'rb') as src:
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+            toc["members"].append({"name": path.name, "kind": kind, "offset": offset, "size": size,
+                                   "sha256": digest.hexdigest()})
+            offset += size
+
+        toc_bytes = json.dumps(toc, separators=(",", ":")).encode('utf-8')
+        out.write(toc_bytes)
+        out.seek(0)
+        out.write(struct.pack(PACK_HEADER_FORMAT, PACK_MAGIC, offset, len(toc_bytes)))
+    return toc
+
+
+def is_pack_member_name(name, kind) -> bool:
+    """Check that a TOC entry names a plain file of its kind, with no folders"""
+    if not isinstance(name, str) or re.search(r'[\\/:]', name) or name in ("", ".", ".."):
+        return False
+    if kind == "palette":
+        return name == PACK_PALETTE_NAME
+    return is_udl_file_name(name) if kind == "udl" else is_theme_file_name(name)
 
 
-def set_path_interactive():
-    """Set source path interactively"""
-    console.print("\n[bold cyan]Set Source Path[/bold cyan]\n")
-    console.print("[dim]Set default folder for batch theme installation[/dim]\n")
+def read_pack_toc(data) -> Dict:
+    """Parse and check the table of contents of a mapped pack
 
-    current = get_source_path()
-    if current:
-        console.print(f"[yellow]Current:[/yellow] {current}\n")
+    Raises ValueError if data is not a valid pack.
+    """
+    import json
+    import struct
+
+    if len(data) < PACK_HEADER_SIZE:
+        raise ValueError("file is too small to be a theme pack")
+    magic, toc_offset, toc_size = struct.unpack_from(PACK_HEADER_FORMAT, data)
+    if magic != PACK_MAGIC:
+        raise ValueError("not a milk++ theme pack")
+    if toc_offset < PACK_HEADER_SIZE or toc_offset + toc_size > len(data):
+        raise ValueError("pack is truncated")
+
+    with data[toc_offset:toc_offset + toc_size] as toc_bytes:
+        try:
+            toc = json.loads(toc_bytes.tobytes().decode('utf-8'))
+        except ValueError:
+            raise ValueError("table of contents is damaged") from None
+    if not isinstance(toc, dict) or toc.get("format") != PACK_FORMAT or not isinstance(toc.get("members"), list):
+        raise ValueError("unsupported pack format")
+
+    for member in toc["members"]:
+        valid = (
+            isinstance(member, dict)
+            and is_pack_member_name(member.get("name"), member.get("kind"))
+            and isinstance(member.get("offset"), int) and isinstance(member.get("size"), int)
+            and isinstance(member.get("sha256"), str)
+            and PACK_HEADER_SIZE <= member["offset"]
+            and 0 <= member["size"] <= toc_offset - member["offset"]
+        )
+        if not valid:
+            raise ValueError(f"bad table of contents entry: {member!r}")
+    return toc
 
-    new_path = Prompt.ask("[yellow]Enter path[/yellow]")
-    path = Path(new_path).expanduser().resolve()
 
-    if not path.exists():
-        if Confirm.ask("Path doesn't exist. Create it?", default=False):
-            try:
-                path.mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                console.print(f"[bold red][ERROR] Failed: {e}[/bold red]")
-                Prompt.ask("\nPress Enter to continue")
-                return
-        else:
-            Prompt.ask("\nPress Enter to continue")
-            return
+def is_pack_member_current(dest: Path, record: Optional[Dict], sha256: str) -> bool:
+    """Check whether dest already holds an unmodified copy of a pack member"""
+    if not record or record.get("sha256") != sha256:
+        return False
+    try:
+        dest_stat = dest.stat()
+    except OSError:
+        return False
+    return dest_stat.st_size == record["size"] and dest_stat.st_mtime_ns == record["mtime"]
 
-    set_source_path(path)
-    console.print(f"[bold green][OK] Source path set: {path}[/bold green]")
-    Prompt.ask("\nPress Enter to continue")
 
+def install_pack_member(archive: Path, view, member: Dict, manifest: Dict, force: bool = False,
+                        transaction: Optional[FileTransaction] = None) -> Dict:
+    """Write one verified member of a mapped pack into Notepad++
 
-@cli.command()
-@click.option("--setpath", type=click.Path(), help="Set source path")
-def path(setpath):
-    """Show or set the source path"""
-    print_banner()
+    Returns a result record like copy_install_file's. The member is written
+    from the mapping, so nothing is extracted to a temp folder first; its
+    checksum must already have been checked (see verify_pack_checksums).
+    """
+    kind = member["kind"]
+    dest = (DEFAULT_UDL_DIR if kind == "udl" else DEFAULT_THEME_DIR) / member["name"]
+    result = {"kind": kind, "source": Path(member["name"]), "dest": dest, "status": "failed",
+              "error": None, "record": None}
 
-    if setpath:
-        path_obj = Path(setpath).expanduser().resolve()
-        if not path_obj.exists():
-            console.print(f"[bold red][ERROR] Path not found: {path_obj}[/bold red]")
-            sys.exit(1)
+    if not force and is_pack_member_current(dest, manifest.get(str(dest)), member["sha256"]):
+        result["status"] = "skipped"
+        return result
 
-        set_source_path(path_obj)
-        console.print(f"[bold green][OK] Source path set: {path_obj}[/bold green]")
-    else:
-        console.print("\n[bold cyan]Configuration[/bold cyan]\n")
-        console.print(f"[yellow]Themes Directory:[/yellow] {DEFAULT_THEME_DIR}")
-        console.print(f"[yellow]Themes Exists:[/yellow] {'[OK]' if DEFAULT_THEME_DIR.exists() else '[ERROR]'}")
+    with view[member["offset"]:member["offset"] + member["size"]] as data:
+        try:
+            method = None
+            if use_store_for(dest.parent):
+                obj = store_object_from_bytes(data, member["sha256"])
+                if transaction is not None:
+                    written, method = transaction.link(obj, dest)
+                else:
+                    written, method = link_from_store(obj, dest)
+            elif transaction is not None:
+                written = transaction.write_bytes(dest, data)
+            else:
+                with atomic_output(dest, 'wb') as f:
+                    f.write(data)
+                written = dest
+            written_stat = written.stat()
+            result["record"] = {
+                "source": f"{archive}!{member['name']}",
+                "source_mtime": archive.stat().st_mtime_ns,
+                "size": written_stat.st_size,
+                "mtime": written_stat.st_mtime_ns,
+                "sha256": member["sha256"],
+            }
+            if method == "reflink":
+                result["record"]["store"] = method
+            result["status"] = "installed"
+        except Exception as e:
+            result["error"] = f"Installation failed: {e}"
+    return result
 
-        console.print(f"\n[yellow]UDL Directory:[/yellow] {DEFAULT_UDL_DIR}")
-        console.print(f"[yellow]UDL Exists:[/yellow] {'[OK]' if DEFAULT_UDL_DIR.exists() else '[ERROR]'}")
 
-        source_path = get_source_path()
-        if source_path:
-            console.print(f"\n[yellow]Source Path:[/yellow] {source_path}")
-        else:
-            console.print("\n[dim]No source path set[/dim]")
+def verify_pack_checksums(view, members: List[Dict]) -> Dict[str, List[str]]:
+    """Members of a mapped pack whose content doesn't match its SHA-256"""
+    import hashlib
 
+    damaged = {}
+    for member in members:
+        with view[member["offset"]:member["offset"] + member["size"]] as data:
+            if hashlib.sha256(data).hexdigest() != member["sha256"]:
+                damaged[member["name"]] = ["checksum mismatch: the pack is damaged"]
+    return damaged
 
-@cli.command()
-@click.argument("theme_file", type=click.Path(exists=True))
-@click.option("--name", help="Custom name for theme")
-def install(theme_file, name):
-    """Install a theme file"""
-    print_banner()
-    theme_path = Path(theme_file)
 
-    if not verify_notepad_installation():
-        sys.exit(1)
+def validate_pack_members(view, members: List[Dict]) -> Dict[str, List[str]]:
+    """Validate the themes and UDLs of a mapped pack; returns the problems by member name"""
+    invalid = {}
+    for member in members:
+        with view[member["offset"]:member["offset"] + member["size"]] as data:
+            errors = validate_theme_xml([data], member["kind"])
+        if errors:
+            invalid[member["name"]] = errors
+    return invalid
 
-    if install_theme(theme_path, name):
-        console.print("\n[dim]Restart Notepad++ and check Style Configurator[/dim]")
 
+@contextmanager
+def open_pack(archive: Path):
+    """Map a pack read-only; yields (memoryview of the file, table of contents)
 
-@cli.command()
-@click.argument("udl_file", type=click.Path(exists=True))
-@click.option("--name", help="Custom name for UDL")
-def install_udl_cmd(udl_file, name):
-    """Install a UDL file"""
-    print_banner()
-    udl_path = Path(udl_file)
+    Raises ValueError for an invalid pack. Slices of the view must be
+    released before the block ends.
+    """
+    import mmap
 
-    if not verify_notepad_installation():
-        sys.exit(1)
+    with open(archive, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("file is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view, read_pack_toc(view)
+            finally:
+                view.release()
+
+
+@traced("install_pack", detail=True)
+def install_pack(archive: Path, jobs: int = DEFAULT_INSTALL_JOBS, force: bool = False,
+                 atomic: bool = False) -> Tuple[List[Dict], Optional[bytes]]:
+    """Install every theme and UDL in a pack straight from a memory map
+
+    Members are verified against their SHA-256 and validated, then written
+    on a bounded thread pool, skipping ones whose installed copy is
+    current. Damaged and invalid members are rejected (with ``atomic``, the
+    whole pack is) before anything is written. Returns the result records (as
+    install_many does) and the pack's palette JSON, or None if it has none.
+    Raises ValueError for an invalid pack.
+    """
+    import hashlib
+    from concurrent.futures import ThreadPoolExecutor
+
+    manifest = load_install_manifest()
+    transaction = FileTransaction() if atomic else None
+    palette_json = None
+
+    with open_pack(archive) as (view, toc):
+        members = [member for member in toc["members"] if member["kind"] != "palette"]
+        for member in toc["members"]:
+            if member["kind"] == "palette":
+                with view[member["offset"]:member["offset"] + member["size"]] as data:
+                    if hashlib.sha256(data).hexdigest() != member["sha256"]:
+                        raise ValueError(f"checksum mismatch in {member['name']}")
+                    palette_json = data.tobytes()
+
+        problems = {name: "Checksum mismatch: the pack is damaged" for name in verify_pack_checksums(view, members)}
+        kinds = {member["name"]: member["kind"] for member in members}
+        invalid = validate_pack_members(view, [member for member in members if member["name"] not in problems])
+        problems.update({name: describe_validation_errors(kinds[name], errors) for name, errors in invalid.items()})
+
+        def reject(member: Dict, error: str) -> Dict:
+            return {"kind": member["kind"], "source": Path(member["name"]), "dest": None, "status": "failed",
+                    "error": error, "record": None}
+
+        if problems and atomic:
+            return [reject(member, problems.get(member["name"], "Not installed: another file in the pack is invalid"))
+                    for member in members], palette_json
+
+        def install_member(member: Dict) -> Dict:
+            if member["name"] in problems:
+                return reject(member, problems[member["name"]])
+            return install_pack_member(archive, view, member, manifest, force, transaction)
+
+        if any(member["kind"] == "theme" for member in members):
+            ensure_themes_directory()
+        if any(member["kind"] == "udl" for member in members):
+            ensure_udl_directory()
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            results = list(pool.map(install_member, members))
+
+    if transaction is not None:
+        results = finish_install_transaction(transaction, results)
+
+    update_install_manifest(manifest, results)
+    for kind in {r["kind"] for r in results if r["status"] == "installed"}:
+        mark_installed_index_stale(kind)
+    return results, palette_json
+
+
+def merge_pack_palettes(palette_json: bytes, replace: bool = False) -> Optional[Tuple[List[str], List[str]]]:
+    """Add a pack's palette versions to color_config.json
+
+    Versions that already exist are kept unless ``replace`` is set. Returns
+    the (added, kept) version names, or None if nothing could be saved.
+    """
+    import json
 
-    if install_udl(udl_path, name):
-        console.print("\n[dim]Restart Notepad++ and check Language menu[/dim]")
+    try:
+        palettes = json.loads(palette_json.decode('utf-8'))
+    except ValueError as e:
+        console.print(f"[red]Error: The pack's palettes are not valid JSON: {e}[/red]")
+        return None
+    errors = validate_palette_config(palettes)
+    if errors:
+        console.print(f"[red]Error: The pack's palettes have {len(errors)} invalid value(s):[/red]")
+        for error in errors:
+            console.print(f"  [red]•[/red] {error}")
+        return None
 
+    config = load_palette_config()
+    added = [version for version in palettes if replace or version not in config]
+    kept = [version for version in palettes if version not in added]
+    if added:
+        config.update({version: palettes[version] for version in added})
+        if not save_palette_config(config):
+            return None
+    return added, kept
 
-def load_palette_config():
-    """Load palette configuration from JSON file"""
-    config_path = Path(__file__).parent / "Themes" / "color_config.json"
 
-    if not config_path.exists():
-        console.print(f"[red]Error: color_config.json not found at {config_path}[/red]")
-        return {}
+# Only theme and UDL files are checked out from git sources
+GIT_SPARSE_PATTERNS = ["*.xml", "*.udl.xml"]
 
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        console.print(f"[red]Error loading palette config: {e}[/red]")
-        return {}
 
-def save_palette_config(config: Dict):
-    """Save palette configuration to JSON file"""
-    config_path = Path(__file__).parent / "Themes" / "color_config.json"
+def get_repo_cache_dir(repo_url: str) -> Path:
+    """Get the persistent checkout folder for a repository URL"""
+    import hashlib
 
-    try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2)
-        return True
-    except Exception as e:
-        console.print(f"[red]Error saving palette config: {e}[/red]")
-        return False
+    url = repo_url.strip().rstrip('/')
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', url.rsplit('/', 1)[-1])[:40] or "repo"
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return REPO_CACHE_DIR / f"{name}-{key}"
 
-def update_theme_xml(version: str, xml_file: str = "StrawberryMilk.xml"):
-    """Update XML theme file with colors from specified version"""
-    config = load_palette_config()
 
-    if version not in config:
-        console.print(f"[red]Error: Version '{version}' not found[/red]")
-        return False
+def run_git(args: List[str], cwd: Optional[Path] = None):
+    """Run a git command, raising CalledProcessError on failure"""
+    import subprocess
 
-    colors = config[version]["colors"]
-    xml_path = Path(__file__).parent / "Themes" / xml_file
+    return subprocess.run(
+        ["git", *args],
+        cwd=str(cwd) if cwd else None,
+        check=True,
+        capture_output=True
+    )
 
-    if not xml_path.exists():
-        console.print(f"[red]Error: {xml_file} not found[/red]")
-        return False
 
-    # Read XML content
-    with open(xml_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Apply color replacements
-    replacements = [
-        (r'bgColor="120A14"', f'bgColor="{colors["bg_primary"]}"'),
-        (r'bgColor="1C1420"', f'bgColor="{colors["bg_secondary"]}"'),
-        (r'bgColor="1f181e"', f'bgColor="{colors["bg_surface"]}"'),
-        (r'bgColor="3D2F42"', f'bgColor="{colors["bg_surface_alt"]}"'),
-        (r'fgColor="E8C5D5"', f'fgColor="{colors["text_primary"]}"'),
-        (r'fgColor="FFB3D1"', f'fgColor="{colors["text_secondary"]}"'),
-        (r'fgColor="D9B8C4"', f'fgColor="{colors["text_muted"]}"'),
-        (r'fgColor="BB889F"', f'fgColor="{colors["text_muted"]}"'),
-        (r'fgColor="FF8DBD"', f'fgColor="{colors["accent_primary"]}"'),
-        (r'fgColor="FF6BA8"', f'fgColor="{colors["accent_secondary"]}"'),
-        (r'fgColor="FFD6E8"', f'fgColor="{colors["accent_light"]}"'),
+def git_update_steps(dest: Path) -> List[Tuple[List[str], Optional[Path]]]:
+    """Git commands, as (args, cwd), that move a cached clone to the latest commit"""
+    return [
+        (["fetch", "--depth", "1", "--filter=blob:none", "origin"], dest),
+        (["reset", "--hard", "FETCH_HEAD"], dest),
     ]
 
-    # Apply all replacements
-    for pattern, replacement in replacements:
-        content = re.sub(pattern, replacement, content)
 
-    # Write updated content to source file
-    with open(xml_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+def git_clone_steps(repo_url: str, dest: Path) -> List[Tuple[List[str], Optional[Path]]]:
+    """Git commands, as (args, cwd), for a shallow, blob-filtered, sparse clone into dest
 
-    console.print(f"[green]Updated {xml_file} with {version} colors[/green]")
+    Only the latest *.xml and *.udl.xml files are downloaded.
+    """
+    return [
+        (["clone", "--depth", "1", "--filter=blob:none", "--no-checkout", repo_url, str(dest)], None),
+        (["sparse-checkout", "set", "--no-cone", *GIT_SPARSE_PATTERNS], dest),
+        (["checkout"], dest),
+    ]
 
-    # Check if theme is already installed and update it
-    installed_path = DEFAULT_THEME_DIR / xml_file
-    if installed_path.exists():
-        # Copy updated theme to Notepad++ themes directory
-        try:
-            shutil.copy2(xml_path, installed_path)
-            console.print(f"[green]Updated installed theme in Notepad++[/green]")
-            console.print("[yellow]Restart Notepad++ to see the changes[/yellow]")
-        except Exception as e:
-            console.print(f"[red]Warning: Could not update installed theme: {e}[/red]")
+
+REPO_LOCK_POLL_INTERVAL = 0.2
+
+
+def get_repo_lock_path(dest: Path) -> Path:
+    """Lock file guarding a repository's cache folder"""
+    return dest.parent / f"{dest.name}.lock"
+
+
+def try_lock_file(f) -> bool:
+    """Take an exclusive lock on an open file without waiting; False if another process holds it"""
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def repo_cache_lock(dest: Path):
+    """Hold a repository's lock file while its cache folder is cloned, updated or read
+
+    Another mkpp process working on the same repository is waited for.
+    The lock is released when the file is closed.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with open(get_repo_lock_path(dest), 'wb') as f:
+        if not try_lock_file(f):
+            console.print("[dim]Waiting for another mkpp process using this repository...[/dim]")
+            while not try_lock_file(f):
+                time.sleep(REPO_LOCK_POLL_INTERVAL)
+        yield
+
+
+def update_git_repo(dest: Path) -> bool:
+    """Fetch the latest commit into an existing cached clone"""
+    import subprocess
+
+    try:
+        for args, cwd in git_update_steps(dest):
+            run_git(args, cwd=cwd)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+
+
+@traced("clone_git_repo", detail=True)
+def clone_git_repo(repo_url: str, dest: Path) -> bool:
+    """Clone a git repository, or update it if dest already holds a clone
+
+    Clones are shallow (--depth 1), blob-filtered and sparse (see
+    git_clone_steps). An existing clone in dest is updated with ``git
+    fetch`` instead of being cloned again; if that fails (e.g. rewritten
+    history) it is recloned from scratch. Callers hold repo_cache_lock.
+    """
+    import subprocess
+
+    try:
+        if (dest / ".git").exists() and update_git_repo(dest):
+            return True
+
+        safe_rmtree(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        for args, cwd in git_clone_steps(repo_url, dest):
+            run_git(args, cwd=cwd)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+    except FileNotFoundError:
+        console.print("[yellow][WARNING]  Git not installed[/yellow]")
+        return False
+
+
+DEFAULT_FETCH_JOBS = 4
+DEFAULT_FETCH_TIMEOUT = 300
+
+
+async def run_git_async(args: List[str], cwd: Optional[Path] = None):
+    """Run a git command as an asyncio subprocess, raising CalledProcessError on failure
+
+    If the awaiting task is cancelled (e.g. by a timeout), git is killed.
+    """
+    import asyncio
+    import subprocess
+
+    process = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=str(cwd) if cwd else None,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await process.communicate()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, ["git", *args], stderr=stderr)
+
+
+async def clone_git_repo_async(repo_url: str, dest: Path):
+    """Async counterpart of clone_git_repo: update a cached clone or make a new one
+
+    Runs the same git_update_steps and git_clone_steps. Raises
+    CalledProcessError, or FileNotFoundError if git is not installed.
+    """
+    import asyncio
+    import subprocess
+
+    if (dest / ".git").exists():
+        try:
+            for args, cwd in git_update_steps(dest):
+                await run_git_async(args, cwd=cwd)
+            return
+        except subprocess.CalledProcessError:
+            pass
+
+    await asyncio.get_running_loop().run_in_executor(None, safe_rmtree, dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    for args, cwd in git_clone_steps(repo_url, dest):
+        await run_git_async(args, cwd=cwd)
+
+
+@asynccontextmanager
+async def repo_cache_lock_async(dest: Path):
+    """Async counterpart of repo_cache_lock; waiting never blocks the event loop"""
+    import asyncio
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with open(get_repo_lock_path(dest), 'wb') as f:
+        if not try_lock_file(f):
+            console.print(f"[dim]Waiting for another mkpp process using {dest.name}...[/dim]")
+            while not try_lock_file(f):
+                await asyncio.sleep(REPO_LOCK_POLL_INTERVAL)
+        yield
+
+
+def remove_readonly(func, path, excinfo):
+    """Error handler for Windows readonly file deletion"""
+    os.chmod(path, 0o777)
+    func(path)
+
+
+def safe_rmtree(path: Path):
+    """Safely remove directory tree, handling Windows permission issues"""
+    import shutil
+
+    if not path.exists():
+        return
+
+    try:
+        shutil.rmtree(path, onerror=remove_readonly)
+    except Exception as e:
+        console.print(f"[dim]Warning: Could not clean temp files: {e}[/dim]")
+
+
+def print_trace_profile():
+    """Print a per-phase timing table of the collected spans to stderr"""
+    from rich.console import Console
+    from rich.table import Table
+    from rich import box
+
+    child_time = {}
+    for span in TRACE_SPANS:
+        if span["parent"] is not None:
+            child_time[span["parent"]] = child_time.get(span["parent"], 0.0) + span["duration"]
+
+    phases = {}
+    for span in TRACE_SPANS:
+        phase = phases.setdefault(span["name"], {"calls": 0, "total": 0.0, "self": 0.0, "max": 0.0, "errors": 0})
+        phase["calls"] += 1
+        phase["total"] += span["duration"]
+        phase["self"] += span["duration"] - child_time.get(span["id"], 0.0)
+        phase["max"] = max(phase["max"], span["duration"])
+        phase["errors"] += "error" in span
+
+    wall = time.perf_counter() - TRACE_START
+    table = Table(title=f"Profile ({wall * 1000:.1f} ms wall)", box=box.SIMPLE, header_style="bold magenta")
+    table.add_column("Phase", style="cyan")
+    table.add_column("Calls", justify="right")
+    table.add_column("Total ms", justify="right")
+    table.add_column("Self ms", justify="right")
+    table.add_column("Max ms", justify="right")
+    table.add_column("Errors", justify="right")
+    for name, phase in sorted(phases.items(), key=lambda item: item[1]["self"], reverse=True):
+        table.add_row(name, str(phase["calls"]), f"{phase['total'] * 1000:.2f}", f"{phase['self'] * 1000:.2f}",
+                      f"{phase['max'] * 1000:.2f}", str(phase["errors"]) if phase["errors"] else "")
+    Console(stderr=True, no_color=console.plain).print(table)
+
+
+def write_trace_file(trace_file: Path):
+    """Append this run's spans to a JSON lines file
+
+    The first line of each run describes it (argv, host, platform, start
+    time); every span after it has times in milliseconds from the start of
+    the run, so runs from different machines can be charted side by side.
+    All lines of a run share its "run" id.
+    """
+    import json
+    import platform
+    import uuid
+
+    run_id = uuid.uuid4().hex[:12]
+    lines = [{"type": "run", "run": run_id, "argv": sys.argv[1:], "host": platform.node(),
+              "platform": platform.platform(), "python": platform.python_version(),
+              "started": time.time() - (time.perf_counter() - TRACE_START)}]
+    for span in sorted(TRACE_SPANS, key=lambda span: span["start"]):
+        line = {"type": "span", "run": run_id, "id": span["id"], "parent": span["parent"], "name": span["name"],
+                "thread": span["thread"], "start_ms": round((span["start"] - TRACE_START) * 1000, 3),
+                "duration_ms": round(span["duration"] * 1000, 3)}
+        for key in ("detail", "error"):
+            if key in span:
+                line[key] = span[key]
+        lines.append(line)
+
+    try:
+        trace_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(trace_file, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(line) + "\n" for line in lines))
+    except OSError as e:
+        console.print(f"[yellow][WARNING]  Could not write trace file: {e}[/yellow]")
+
+
+def finish_tracing(profile: bool, trace_file: Optional[Path]):
+    """Report the collected spans and switch tracing off"""
+    global TRACE_SPANS
+    if profile:
+        print_trace_profile()
+    if trace_file is not None:
+        write_trace_file(trace_file)
+    TRACE_SPANS = None
+
+
+@click.group(invoke_without_command=True)
+@click.option("--quiet", "-q", is_flag=True, envvar="MKPP_QUIET",
+              help="Plain output: no banner, colors or styling")
+@click.option("--no-banner", is_flag=True, envvar="MKPP_NO_BANNER", help="Don't print the banner")
+@click.option("--profile", is_flag=True, envvar="MKPP_PROFILE",
+              help="Print a per-phase timing table to stderr when the command finishes")
+@click.option("--trace-file", type=click.Path(dir_okay=False), envvar="MKPP_TRACE_FILE",
+              help="Append timing spans to this file as JSON lines")
+@click.option("--dedupe", is_flag=True, envvar="MKPP_DEDUPE",
+              help="Install as reflinks of ~/.mkpp/store, so identical files share one copy on disk "
+                   "(needs Btrfs, XFS or another reflink file system)")
+@click.pass_context
+def cli(ctx, quiet, no_banner, profile, trace_file, dedupe):
+    """milk++ - Universal Notepad++ Theme Injector"""
+    global SHOW_BANNER, DEDUPE_INSTALLS
+    if quiet:
+        console.plain = True
+    SHOW_BANNER = not (quiet or no_banner)
+    DEDUPE_INSTALLS = dedupe
+
+    if profile or trace_file:
+        start_tracing()
+        # Close callbacks run in reverse order: the command span ends first
+        ctx.call_on_close(lambda: finish_tracing(profile, Path(trace_file) if trace_file else None))
+        ctx.with_resource(trace_span(f"mkpp {ctx.invoked_subcommand or 'menu'}"))
+
+    if ctx.invoked_subcommand is None:
+        print_banner()
+        show_main_menu()
+
+
+def show_install_menu():
+    """Display all install options submenu"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    while True:
+        console.print("\n[bold cyan]=== All Install Options ===[/bold cyan]\n")
+
+        table = Table(show_header=False, box=box.SIMPLE)
+        table.add_column("Option", style="cyan", width=6)
+        table.add_column("Description", style="white")
+
+        table.add_row("1", "Install from File")
+        table.add_row("2", "Install from Git Repository")
+        table.add_row("3", "Scan and Install (Batch)")
+        table.add_row("b", "Back to Main Menu")
+
+        console.print(table)
+
+        choice = Prompt.ask(
+            "\n[bold yellow]Select option[/bold yellow]",
+            choices=["1", "2", "3", "b"],
+            default="b"
+        )
+
+        if choice == "1":
+            install_from_file()
+        elif choice == "2":
+            install_from_git()
+        elif choice == "3":
+            install_batch()
+        elif choice == "b":
+            break
+
+
+def show_settings_menu():
+    """Display settings submenu"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    while True:
+        console.print("\n[bold cyan]=== Settings ===[/bold cyan]\n")
+
+        table = Table(show_header=False, box=box.SIMPLE)
+        table.add_column("Option", style="cyan", width=6)
+        table.add_column("Description", style="white")
+
+        table.add_row("1", "Show Paths & Configuration")
+        table.add_row("2", "Set Source Path")
+        table.add_row("b", "Back to Main Menu")
+
+        console.print(table)
+
+        choice = Prompt.ask(
+            "\n[bold yellow]Select option[/bold yellow]",
+            choices=["1", "2", "b"],
+            default="b"
+        )
+
+        if choice == "1":
+            show_paths()
+        elif choice == "2":
+            set_path_interactive()
+        elif choice == "b":
+            break
+
+
+def show_main_menu():
+    """Display interactive main menu"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    while True:
+        console.print("\n[bold cyan]=== Main Menu ===[/bold cyan]\n")
+
+        table = Table(show_header=False, box=box.SIMPLE)
+        table.add_column("Option", style="cyan", width=6)
+        table.add_column("Description", style="white")
+
+        table.add_row("1", "Scan and Install")
+        table.add_row("2", "Install from Git Repository")
+        table.add_row("3", "All Install Options")
+        table.add_row("4", "View Installed Themes")
+        table.add_row("5", "View Installed UDLs")
+        table.add_row("6", "Settings")
+        table.add_row("7", "Palette Editor")
+        table.add_row("q", "Quit")
+
+        console.print(table)
+
+        choice = Prompt.ask(
+            "\n[bold yellow]Select option[/bold yellow]",
+            choices=["1", "2", "3", "4", "5", "6", "7", "q"],
+            default="q"
+        )
+
+        if choice == "1":
+            install_batch()
+        elif choice == "2":
+            install_from_git()
+        elif choice == "3":
+            show_install_menu()
+        elif choice == "4":
+            list_themes()
+        elif choice == "5":
+            list_udls()
+        elif choice == "6":
+            show_settings_menu()
+        elif choice == "7":
+            show_palette_editor()
+        elif choice == "q":
+            console.print("\n[bold magenta]Thanks for using milk++![/bold magenta]\n")
+            break
+
+
+def install_from_file():
+    """Install theme from a single file"""
+    from rich.prompt import Prompt
+
+    console.print("\n[bold cyan]Install Theme from File[/bold cyan]\n")
+
+    if not verify_notepad_installation():
+        Prompt.ask("\nPress Enter to continue")
+        return
+
+    file_path = Prompt.ask("[yellow]Enter theme file path (.xml)[/yellow]")
+    theme_path = Path(file_path).expanduser().resolve()
+
+    if install_theme(theme_path):
+        console.print(
+            "\n[yellow]📝 To activate:[/yellow]"
+            "\n   1. Restart Notepad++"
+            "\n   2. Settings → Style Configurator"
+            "\n   3. Select your theme from dropdown"
+        )
+
+    Prompt.ask("\nPress Enter to continue")
+
+
+def install_from_git():
+    """Install theme from Git repository"""
+    from rich.prompt import Prompt, Confirm
+
+    console.print("\n[bold cyan]Install from Git Repository[/bold cyan]\n")
+
+    if not verify_notepad_installation():
+        Prompt.ask("\nPress Enter to continue")
+        return
+
+    repo_url = Prompt.ask("[yellow]Enter Git repository URL[/yellow]")
+
+    repo_dir = get_repo_cache_dir(repo_url)
+
+    with repo_cache_lock(repo_dir):
+        if (repo_dir / ".git").exists():
+            console.print("\n[dim]Updating cached repository...[/dim]")
+        else:
+            console.print("\n[dim]Cloning repository...[/dim]")
+
+        if clone_git_repo(repo_url, repo_dir):
+            # Theme packs often keep their files in subfolders
+            themes, udls = discover_files(repo_dir, recursive=True)
+
+            if not themes and not udls:
+                console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found in repository[/yellow]")
+            elif not report_name_clashes(themes, udls):
+                # Show found files
+                if themes:
+                    console.print(f"\n[green]Found {len(themes)} theme(s):[/green]\n")
+                    for i, theme in enumerate(themes, 1):
+                        console.print(f"  {i}. {theme.name}")
+
+                if udls:
+                    console.print(f"\n[green]Found {len(udls)} UDL file(s):[/green]\n")
+                    for i, udl in enumerate(udls, len(themes) + 1):
+                        console.print(f"  {i}. {udl.name}")
+
+                console.print()
+                install_all = Confirm.ask("Install all files?", default=True)
+
+                if install_all:
+                    run_batch_install(themes, udls)
+                else:
+                    choice = Prompt.ask("Enter file number to install (or 0 to cancel)")
+                    try:
+                        idx = int(choice) - 1
+                        if 0 <= idx < len(themes):
+                            install_theme(themes[idx])
+                        elif len(themes) <= idx < len(themes) + len(udls):
+                            udl_idx = idx - len(themes)
+                            install_udl(udls[udl_idx])
+                    except ValueError:
+                        console.print("[red]Invalid choice[/red]")
+        else:
+            console.print("[bold red][ERROR] Failed to clone repository[/bold red]")
+
+    Prompt.ask("\nPress Enter to continue")
+
+
+def install_batch():
+    """Install all themes and UDL files from source folder"""
+    from rich.prompt import Prompt, Confirm
+
+    console.print("\n[bold cyan]Batch Install from Folder[/bold cyan]\n")
+
+    if not verify_notepad_installation():
+        Prompt.ask("\nPress Enter to continue")
+        return
+
+    source_path = get_source_path()
+    if source_path:
+        console.print(f"[dim]Current source: {source_path}[/dim]")
+        use_current = Confirm.ask("Use this folder?", default=True)
+        if use_current:
+            folder_path = source_path
+        else:
+            folder_path = Path(Prompt.ask("[yellow]Enter folder path[/yellow]")).expanduser()
+    else:
+        folder_path = Path(Prompt.ask("[yellow]Enter folder path[/yellow]")).expanduser()
+
+    if not folder_path.exists():
+        console.print("[bold red][ERROR] Folder not found[/bold red]")
+        Prompt.ask("\nPress Enter to continue")
+        return
+
+    # Find both themes and UDL files
+    themes, udls = discover_files(folder_path)
+
+    if not themes and not udls:
+        console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found[/yellow]")
+    elif not report_name_clashes(themes, udls):
+        # Show found files
+        if themes:
+            console.print(f"\n[green]Found {len(themes)} theme(s):[/green]\n")
+            for theme in themes:
+                console.print(f"  • {theme.name}")
+
+        if udls:
+            console.print(f"\n[green]Found {len(udls)} UDL file(s):[/green]\n")
+            for udl in udls:
+                console.print(f"  • {udl.name}")
+
+        console.print()
+        if Confirm.ask("Install all?", default=True):
+            run_batch_install(themes, udls)
+
+    Prompt.ask("\nPress Enter to continue")
+
+
+USERLANG_TAG_RE = re.compile(r'<UserLang\b([^>]*)>')
+XML_ATTR_RE = re.compile(r'([\w:.-]+)\s*=\s*"([^"]*)"')
+
+
+def read_installed_details(path: Path, kind: str) -> Dict:
+    """Read the listing details of an installed file
+
+    Themes report their lexer count; UDL files their ``UserLang`` name and
+    extensions. Unreadable files get empty details instead of an error.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return {}
+
+    if kind == "udl":
+        match = USERLANG_TAG_RE.search(data.decode('utf-8', errors='replace'))
+        attrs = dict(XML_ATTR_RE.findall(match.group(1))) if match else {}
+        return {"udl_name": attrs.get("name", ""), "ext": attrs.get("ext", "")}
+    return {"lexers": data.count(b"<LexerType")}
+
+
+@traced("load_installed_index")
+def load_installed_index() -> Dict:
+    """Load the on-disk index of installed themes and UDL files"""
+    import json
+
+    if not INSTALLED_INDEX_FILE.exists():
+        return {}
+    try:
+        with open(INSTALLED_INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@traced("save_installed_index")
+def save_installed_index(index: Dict):
+    """Save the index of installed themes and UDL files"""
+    import json
+
+    ensure_config_dir()
+    try:
+        atomic_write_text(INSTALLED_INDEX_FILE, json.dumps(index, indent=2))
+    except OSError as e:
+        console.print(f"[dim]Warning: Could not save installed index: {e}[/dim]")
+
+
+def mark_installed_index_stale(kind: str):
+    """Force the next listing of a kind to rescan its directory
+
+    Overwriting an existing file doesn't change the directory mtime, so
+    anything that writes into the Notepad++ folders calls this.
+    """
+    index = load_installed_index()
+    if index.get(kind, {}).get("dir_mtime") is not None:
+        index[kind]["dir_mtime"] = None
+        save_installed_index(index)
+
+
+def get_installed_entries(kind: str, refresh: bool = False) -> List[Dict]:
+    """Get installed themes or UDL files from the index, refreshing as needed
+
+    The directory is only listed when its mtime differs from the indexed
+    one (or ``refresh`` is set), and only files whose size or mtime changed
+    are re-read.
+    """
+    directory = DEFAULT_UDL_DIR if kind == "udl" else DEFAULT_THEME_DIR
+    index = load_installed_index()
+    section = index.get(kind, {})
+    same_dir = section.get("dir") == str(directory)
+
+    dir_mtime = directory.stat().st_mtime_ns
+    if not refresh and same_dir and section.get("dir_mtime") == dir_mtime:
+        return [section["entries"][name] for name in sorted(section["entries"])]
+
+    old_entries = section.get("entries", {}) if same_dir else {}
+    is_kind = is_udl_file_name if kind == "udl" else is_theme_file_name
+    entries = {}
+
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not is_kind(entry.name) or not entry.is_file():
+                continue
+            file_stat = entry.stat()
+            old = old_entries.get(entry.name)
+            if old and old["size"] == file_stat.st_size and old["mtime"] == file_stat.st_mtime_ns:
+                entries[entry.name] = old
+                continue
+
+            record = {"file": entry.name, "name": Path(entry.name).stem, "size": file_stat.st_size,
+                      "mtime": file_stat.st_mtime_ns}
+            record.update(read_installed_details(Path(entry.path), kind))
+            entries[entry.name] = record
+
+    index[kind] = {"dir": str(directory), "dir_mtime": dir_mtime, "entries": entries}
+    save_installed_index(index)
+    return [entries[name] for name in sorted(entries)]
+
+
+def format_file_size(size: int) -> str:
+    """Format a file size for the listing tables"""
+    return f"{size:,} bytes" if size < 1024 else f"{size/1024:.1f} KB"
+
+
+def list_themes(refresh: bool = False, as_json: bool = False, pause: bool = True):
+    """List installed themes; ``pause`` waits for Enter, as the menu does"""
+    import json
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    if as_json:
+        entries = get_installed_entries("theme", refresh) if DEFAULT_THEME_DIR.exists() else []
+        click.echo(json.dumps(entries, indent=2))
+        return
+
+    console.print("\n[bold cyan]Installed Themes[/bold cyan]\n")
+
+    if not DEFAULT_THEME_DIR.exists():
+        console.print("[yellow][WARNING]  Themes directory not found[/yellow]")
+        console.print(f"[dim]{DEFAULT_THEME_DIR}[/dim]")
+        if pause:
+            Prompt.ask("\nPress Enter to continue")
+        return
+
+    themes = get_installed_entries("theme", refresh)
+
+    if not themes:
+        console.print("[yellow]No themes installed[/yellow]")
+    else:
+        table = Table(title="[FOLDER] Installed Themes", box=box.ROUNDED)
+        table.add_column("Theme Name", style="cyan")
+        table.add_column("Lexers", style="white", justify="right")
+        table.add_column("File Size", style="white")
+
+        for theme in themes:
+            table.add_row(theme["name"], str(theme.get("lexers", "")), format_file_size(theme["size"]))
+
+        console.print(table)
+
+    if pause:
+        Prompt.ask("\nPress Enter to continue")
+
+
+def list_udls(refresh: bool = False, as_json: bool = False, pause: bool = True):
+    """List installed UDL files; ``pause`` waits for Enter, as the menu does"""
+    import json
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    if as_json:
+        entries = get_installed_entries("udl", refresh) if DEFAULT_UDL_DIR.exists() else []
+        click.echo(json.dumps(entries, indent=2))
+        return
+
+    console.print("\n[bold cyan]Installed UDL Files[/bold cyan]\n")
+
+    if not DEFAULT_UDL_DIR.exists():
+        console.print("[yellow][WARNING]  UDL directory not found[/yellow]")
+        console.print(f"[dim]{DEFAULT_UDL_DIR}[/dim]")
+        if pause:
+            Prompt.ask("\nPress Enter to continue")
+        return
+
+    udls = get_installed_entries("udl", refresh)
+
+    if not udls:
+        console.print("[yellow]No UDL files installed[/yellow]")
+    else:
+        table = Table(title="[FOLDER] Installed UDL Files", box=box.ROUNDED)
+        table.add_column("UDL Name", style="cyan")
+        table.add_column("Language", style="white")
+        table.add_column("Extensions", style="white")
+        table.add_column("File Size", style="white")
+
+        for udl in udls:
+            table.add_row(udl["name"], udl.get("udl_name", ""), udl.get("ext", ""), format_file_size(udl["size"]))
+
+        console.print(table)
+
+    if pause:
+        Prompt.ask("\nPress Enter to continue")
+
+
+# Postings are stored as integers (color value, file id, style name id) so
+# an index over thousands of themes stays small and queries hit an index
+SEARCH_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, kind TEXT, size INTEGER, mtime INTEGER);
+CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY, lexer TEXT, style TEXT, attr TEXT, UNIQUE (lexer, style, attr));
+CREATE TABLE IF NOT EXISTS colors (color INTEGER, file INTEGER, name INTEGER,
+                                   PRIMARY KEY (color, file, name)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lexers (lexer TEXT, file INTEGER);
+CREATE INDEX IF NOT EXISTS colors_by_file ON colors (file);
+CREATE INDEX IF NOT EXISTS lexers_by_lexer ON lexers (lexer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS lexers_by_file ON lexers (file);
+"""
+
+
+def open_search_index():
+    """Open (creating if needed) the search index database under ~/.mkpp"""
+    import sqlite3
+
+    ensure_config_dir()
+    db = sqlite3.connect(str(SEARCH_INDEX_FILE))
+    db.executescript(SEARCH_INDEX_SCHEMA)
+    return db
+
+
+def read_search_postings(path: Path) -> Tuple[List[Tuple[int, str, str, str]], List[str]]:
+    """Parse a theme or UDL file once into (color, lexer, style, attribute) rows and its lexer names"""
+    content = path.read_text(encoding='utf-8', errors='replace')
+    postings = []
+    lexers = set()
+    for (lexer, name), entries in build_style_index(content).items():
+        if lexer != "GlobalStyles":
+            lexers.add(lexer)
+        for entry in entries:
+            for attr, (start, end) in entry["spans"].items():
+                postings.append((int(content[start:end], 16), lexer, name, attr))
+    return postings, sorted(lexers)
+
+
+@traced("update_search_index")
+def update_search_index(db, refresh: bool = False) -> int:
+    """Bring the search index up to date with the installed themes and UDL files
+
+    Only files that are new or whose size or mtime changed are parsed
+    again; removed files are dropped. Returns the number of files parsed.
+    """
+    indexed = {path: (file_id, size, mtime)
+               for file_id, path, size, mtime in db.execute("SELECT id, path, size, mtime FROM files")}
+    name_ids = {(lexer, style, attr): name_id
+                for name_id, lexer, style, attr in db.execute("SELECT id, lexer, style, attr FROM names")}
+    seen = set()
+    parsed = 0
+
+    def get_name_id(key):
+        if key not in name_ids:
+            name_ids[key] = db.execute("INSERT INTO names (lexer, style, attr) VALUES (?, ?, ?)", key).lastrowid
+        return name_ids[key]
+
+    with db:
+        for kind, directory in (("theme", DEFAULT_THEME_DIR), ("udl", DEFAULT_UDL_DIR)):
+            if not directory.is_dir():
+                continue
+            is_kind = is_udl_file_name if kind == "udl" else is_theme_file_name
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not is_kind(entry.name) or not entry.is_file():
+                        continue
+                    seen.add(entry.path)
+                    file_stat = entry.stat()
+                    old = indexed.get(entry.path)
+                    if not refresh and old and old[1:] == (file_stat.st_size, file_stat.st_mtime_ns):
+                        continue
+
+                    try:
+                        postings, lexers = read_search_postings(Path(entry.path))
+                    except (OSError, ValueError):
+                        continue
+                    if old:
+                        db.execute("DELETE FROM colors WHERE file = ?", (old[0],))
+                        db.execute("DELETE FROM lexers WHERE file = ?", (old[0],))
+                        db.execute("UPDATE files SET size = ?, mtime = ? WHERE id = ?",
+                                   (file_stat.st_size, file_stat.st_mtime_ns, old[0]))
+                        file_id = old[0]
+                    else:
+                        file_id = db.execute("INSERT INTO files (path, kind, size, mtime) VALUES (?, ?, ?, ?)",
+                                             (entry.path, kind, file_stat.st_size, file_stat.st_mtime_ns)).lastrowid
+                    db.executemany("INSERT OR IGNORE INTO colors VALUES (?, ?, ?)",
+                                   [(color, file_id, get_name_id((lexer, style, attr)))
+                                    for color, lexer, style, attr in postings])
+                    db.executemany("INSERT INTO lexers VALUES (?, ?)", [(lexer, file_id) for lexer in lexers])
+                    parsed += 1
+
+        for path in set(indexed) - seen:
+            file_id = indexed[path][0]
+            db.execute("DELETE FROM colors WHERE file = ?", (file_id,))
+            db.execute("DELETE FROM lexers WHERE file = ?", (file_id,))
+            db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+    return parsed
+
+
+def search_themes(db, color: Optional[str] = None, lexer: Optional[str] = None,
+                  style: Optional[str] = None, attr: Optional[str] = None) -> List[Dict]:
+    """Query the search index
+
+    With a color, returns one row per matching style attribute, optionally
+    narrowed by lexer, style name glob and attribute; without one, returns
+    the files that define the lexer. Lexers match by exact name
+    (ignoring case) or as a glob.
+    """
+    lexer_match = "(lexer = ? COLLATE NOCASE OR lower(lexer) GLOB ?)"
+    lexer_params = [lexer, (lexer or "").lower()]
+
+    if color is None:
+        rows = db.execute(f"SELECT DISTINCT path FROM lexers JOIN files ON files.id = lexers.file "
+                          f"WHERE {lexer_match} ORDER BY path", lexer_params)
+        return [{"file": Path(path).name, "path": path} for path, in rows]
+
+    query = ("SELECT path, lexer, style, attr FROM colors JOIN files ON files.id = colors.file "
+             "JOIN names ON names.id = colors.name WHERE color = ?")
+    params = [int(color.lstrip('#'), 16)]
+    if lexer:
+        query += f" AND {lexer_match}"
+        params += lexer_params
+    if style:
+        query += " AND upper(style) GLOB ?"
+        params.append(style.upper())
+    if attr:
+        query += " AND attr = ?"
+        params.append(attr)
+    rows = db.execute(query + " ORDER BY path, colors.name", params)
+    return [{"file": Path(path).name, "path": path, "lexer": row_lexer, "style": row_style, "attr": row_attr}
+            for path, row_lexer, row_style, row_attr in rows]
+
+
+def show_paths():
+    """Show current paths and configuration"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    console.print("\n[bold cyan]Paths & Configuration[/bold cyan]\n")
+
+    table = Table(box=box.ROUNDED, show_header=False)
+    table.add_column("Setting", style="yellow", width=25)
+    table.add_column("Value", style="white")
+
+    table.add_row("Themes Directory", str(DEFAULT_THEME_DIR))
+    table.add_row("Themes Exists?", "[OK] Yes" if DEFAULT_THEME_DIR.exists() else "[ERROR] No")
+
+    table.add_row("UDL Directory", str(DEFAULT_UDL_DIR))
+    table.add_row("UDL Exists?", "[OK] Yes" if DEFAULT_UDL_DIR.exists() else "[ERROR] No")
+
+    source_path = get_source_path()
+    table.add_row(
+        "Source Path",
+        str(source_path) if source_path else "[dim]Not set[/dim]"
+    )
+
+    table.add_row("Config File", str(CONFIG_FILE))
+
+    console.print(table)
+    Prompt.ask("\nPress Enter to continue")
+
+
+def set_path_interactive():
+    """Set source path interactively"""
+    from rich.prompt import Prompt, Confirm
+
+    console.print("\n[bold cyan]Set Source Path[/bold cyan]\n")
+    console.print("[dim]Set default folder for batch theme installation[/dim]\n")
+
+    current = get_source_path()
+    if current:
+        console.print(f"[yellow]Current:[/yellow] {current}\n")
+
+    new_path = Prompt.ask("[yellow]Enter path[/yellow]")
+    path = Path(new_path).expanduser().resolve()
+
+    if not path.exists():
+        if Confirm.ask("Path doesn't exist. Create it?", default=False):
+            try:
+                path.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                console.print(f"[bold red][ERROR] Failed: {e}[/bold red]")
+                Prompt.ask("\nPress Enter to continue")
+                return
+        else:
+            Prompt.ask("\nPress Enter to continue")
+            return
+
+    set_source_path(path)
+    console.print(f"[bold green][OK] Source path set: {path}[/bold green]")
+    Prompt.ask("\nPress Enter to continue")
+
+
+@cli.command()
+@click.option("--setpath", type=click.Path(), help="Set source path")
+@click.option("--create", is_flag=True, help="Create the --setpath folder if it doesn't exist")
+def path(setpath, create):
+    """Show or set the source path"""
+    print_banner()
+
+    if setpath:
+        path_obj = Path(setpath).expanduser().resolve()
+        if not path_obj.exists():
+            if not create:
+                console.print(f"[bold red][ERROR] Path not found: {path_obj}[/bold red]")
+                sys.exit(1)
+            try:
+                path_obj.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                console.print(f"[bold red][ERROR] Failed: {e}[/bold red]")
+                sys.exit(1)
+
+        set_source_path(path_obj)
+        console.print(f"[bold green][OK] Source path set: {path_obj}[/bold green]")
+    else:
+        console.print("\n[bold cyan]Configuration[/bold cyan]\n")
+        console.print(f"[yellow]Themes Directory:[/yellow] {DEFAULT_THEME_DIR}")
+        console.print(f"[yellow]Themes Exists:[/yellow] {'[OK]' if DEFAULT_THEME_DIR.exists() else '[ERROR]'}")
+
+        console.print(f"\n[yellow]UDL Directory:[/yellow] {DEFAULT_UDL_DIR}")
+        console.print(f"[yellow]UDL Exists:[/yellow] {'[OK]' if DEFAULT_UDL_DIR.exists() else '[ERROR]'}")
+
+        source_path = get_source_path()
+        if source_path:
+            console.print(f"\n[yellow]Source Path:[/yellow] {source_path}")
+        else:
+            console.print("\n[dim]No source path set[/dim]")
+
+
+@cli.command()
+@click.argument("theme_file", type=click.Path(exists=True))
+@click.option("--name", help="Custom name for theme")
+@click.option("--validate-only", is_flag=True, help="Only check that the file is a valid theme")
+def install(theme_file, name, validate_only):
+    """Install a theme file"""
+    print_banner()
+    theme_path = Path(theme_file)
+
+    if validate_only:
+        run_validate_only([(theme_path, "theme")])
+        return
+    if not verify_notepad_installation():
+        sys.exit(1)
+
+    if install_theme(theme_path, name):
+        console.print("\n[dim]Restart Notepad++ and check Style Configurator[/dim]")
+
+
+@cli.command(name="install-udl")
+@click.argument("udl_file", type=click.Path(exists=True))
+@click.option("--name", help="Custom name for UDL")
+@click.option("--validate-only", is_flag=True, help="Only check that the file is a valid UDL")
+def install_udl_cmd(udl_file, name, validate_only):
+    """Install a UDL file"""
+    print_banner()
+    udl_path = Path(udl_file)
+
+    if validate_only:
+        run_validate_only([(udl_path, "udl")])
+        return
+    if not verify_notepad_installation():
+        sys.exit(1)
+
+    if install_udl(udl_path, name):
+        console.print("\n[dim]Restart Notepad++ and check Language menu[/dim]")
+
+
+HEX_COLOR_RE = re.compile(r'[0-9A-Fa-f]{6}')
+
+# Parsed color_config.json, reused until the file's mtime/size change (and
+# then only re-parsed if its SHA-256 changed too)
+_palette_cache = {"key": None, "sha256": None, "config": None}
+
+
+def is_hex_color(value) -> bool:
+    """Check for a six-digit hex color without '#'"""
+    return isinstance(value, str) and HEX_COLOR_RE.fullmatch(value) is not None
+
+
+def validate_palette_config(config) -> List[str]:
+    """Check a palette config against its schema, returning every problem found
+
+    Each version needs a string name and description and a colors object
+    whose values are six-digit hex colors.
+    """
+    if not isinstance(config, dict):
+        return ["top level must be an object of palette versions"]
+
+    errors = []
+    for version, palette in config.items():
+        if not isinstance(palette, dict):
+            errors.append(f"{version}: must be an object")
+            continue
+        for field in ("name", "description"):
+            if not isinstance(palette.get(field), str):
+                errors.append(f"{version}.{field}: missing or not a string")
+        colors = palette.get("colors")
+        if not isinstance(colors, dict):
+            errors.append(f"{version}.colors: missing or not an object")
+            continue
+        for key, value in colors.items():
+            if not is_hex_color(value):
+                errors.append(f"{version}.colors.{key}: {value!r} is not a six-digit hex color")
+    return errors
+
+
+def copy_palette_config(config: Dict) -> Dict:
+    """Copy a config deeply enough that editing a palette leaves the cache alone"""
+    return {version: dict(palette, colors=dict(palette["colors"])) for version, palette in config.items()}
+
+
+def cache_palette_config(config_path: Path, config: Dict, sha256: str):
+    """Remember a validated config for the file's current mtime and size"""
+    file_stat = config_path.stat()
+    _palette_cache.update(key=(str(config_path), file_stat.st_mtime_ns, file_stat.st_size),
+                          sha256=sha256, config=copy_palette_config(config))
+
+
+@traced("load_palette_config")
+def load_palette_config():
+    """Load palette configuration from JSON file
+
+    The parsed, validated config is cached and reused until the file
+    changes. If any value is invalid, all problems are reported and an
+    empty config is returned.
+    """
+    import hashlib
+    import json
+
+    config_path = THEMES_DIR / "color_config.json"
+
+    try:
+        file_stat = config_path.stat()
+    except OSError:
+        console.print(f"[red]Error: color_config.json not found at {config_path}[/red]")
+        return {}
+
+    if _palette_cache["key"] == (str(config_path), file_stat.st_mtime_ns, file_stat.st_size):
+        return copy_palette_config(_palette_cache["config"])
+
+    try:
+        data = config_path.read_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 == _palette_cache["sha256"] and _palette_cache["key"][0] == str(config_path):
+            # Touched but not changed
+            cache_palette_config(config_path, _palette_cache["config"], sha256)
+            return copy_palette_config(_palette_cache["config"])
+        config = json.loads(data.decode('utf-8'))
+    except Exception as e:
+        console.print(f"[red]Error loading palette config: {e}[/red]")
+        return {}
+
+    errors = validate_palette_config(config)
+    if errors:
+        console.print(f"[red]Error: color_config.json has {len(errors)} invalid value(s):[/red]")
+        for error in errors:
+            console.print(f"  [red]•[/red] {error}")
+        return {}
+
+    cache_palette_config(config_path, config, sha256)
+    return copy_palette_config(config)
+
+@traced("save_palette_config")
+def save_palette_config(config: Dict):
+    """Save palette configuration to JSON file"""
+    import hashlib
+    import json
+
+    config_path = THEMES_DIR / "color_config.json"
+
+    errors = validate_palette_config(config)
+    if errors:
+        console.print(f"[red]Error: Not saving palette config, {len(errors)} invalid value(s):[/red]")
+        for error in errors:
+            console.print(f"  [red]•[/red] {error}")
+        return False
+
+    try:
+        text = json.dumps(config, indent=2)
+        atomic_write_text(config_path, text)
+        cache_palette_config(config_path, config, hashlib.sha256(text.encode('utf-8')).hexdigest())
+        return True
+    except Exception as e:
+        console.print(f"[red]Error saving palette config: {e}[/red]")
+        return False
+
+# Color math. Each function takes whole lists of colors so callers can check
+# or derive entire palettes at once; with NumPy installed (pip install
+# milk-pp[fast]) the work is vectorized, otherwise it falls back to colorsys.
+# Lightness is HSL lightness in 0..1.
+LUMINANCE_WEIGHTS = (0.2126, 0.7152, 0.0722)
+WCAG_AA_CONTRAST = 4.5
+
+
+@lru_cache(maxsize=1)
+def get_numpy():
+    """NumPy if it is installed, else None"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def hex_colors_to_rgb(colors: List[str]):
+    """Six-digit hex colors as RGB in 0..1, an (N, 3) array with NumPy"""
+    np = get_numpy()
+    if np is not None:
+        return np.frombuffer(bytes.fromhex("".join(colors)), dtype=np.uint8).reshape(-1, 3) / 255.0
+    return [tuple(channel / 255 for channel in bytes.fromhex(color)) for color in colors]
+
+
+def rgb_to_hex_colors(rgb) -> List[str]:
+    """Inverse of hex_colors_to_rgb; channels are clipped to 0..1"""
+    np = get_numpy()
+    if np is not None:
+        data = np.clip(np.rint(rgb * 255), 0, 255).astype(np.uint8).tobytes().hex().upper()
+        return [data[i:i + 6] for i in range(0, len(data), 6)]
+    return ["".join(f"{min(max(round(channel * 255), 0), 255):02X}" for channel in color) for color in rgb]
+
+
+def relative_luminance(colors: List[str]) -> List[float]:
+    """WCAG relative luminance of each color"""
+    np = get_numpy()
+    rgb = hex_colors_to_rgb(colors)
+    if np is not None:
+        linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+        return (linear @ np.array(LUMINANCE_WEIGHTS)).tolist()
+
+    def linearize(channel):
+        return channel / 12.92 if channel <= 0.04045 else ((channel + 0.055) / 1.055) ** 2.4
+
+    return [sum(weight * linearize(channel) for weight, channel in zip(LUMINANCE_WEIGHTS, color)) for color in rgb]
+
+
+def contrast_ratios(foregrounds: List[str], backgrounds: List[str]) -> List[float]:
+    """WCAG contrast ratio (1 to 21) of each foreground against its background"""
+    luminance = relative_luminance(list(foregrounds) + list(backgrounds))
+    count = len(foregrounds)
+    return [(max(fg, bg) + 0.05) / (min(fg, bg) + 0.05)
+            for fg, bg in zip(luminance[:count], luminance[count:])]
+
+
+def shift_lightness(colors: List[str], deltas) -> List[str]:
+    """Add a lightness delta (one for all, or one per color) in HSL, keeping hue and saturation"""
+    np = get_numpy()
+    if np is None:
+        import colorsys
+
+        deltas = deltas if isinstance(deltas, (list, tuple)) else [deltas] * len(colors)
+        shifted = []
+        for (r, g, b), delta in zip(hex_colors_to_rgb(colors), deltas):
+            hue, lightness, saturation = colorsys.rgb_to_hls(r, g, b)
+            shifted.append(colorsys.hls_to_rgb(hue, min(max(lightness + delta, 0.0), 1.0), saturation))
+        return rgb_to_hex_colors(shifted)
+
+    rgb = hex_colors_to_rgb(colors)
+    r, g, b = rgb.T
+    high, low = rgb.max(axis=1), rgb.min(axis=1)
+    chroma = high - low
+    lightness = (high + low) / 2
+    safe_chroma = np.where(chroma == 0, 1, chroma)
+    hue = np.select([chroma == 0, high == r, high == g],
+                    [0, ((g - b) / safe_chroma) % 6, (b - r) / safe_chroma + 2],
+                    (r - g) / safe_chroma + 4) / 6
+    saturation = np.where(chroma == 0, 0, chroma / np.where(chroma == 0, 1, 1 - np.abs(high + low - 1)))
+
+    lightness = np.clip(lightness + np.asarray(deltas, dtype=float), 0, 1)
+    chroma = (1 - np.abs(2 * lightness - 1)) * saturation
+    sector = hue * 6
+    second = chroma * (1 - np.abs(sector % 2 - 1))
+    zero = np.zeros_like(chroma)
+    options = np.array([
+        [chroma, second, zero], [second, chroma, zero], [zero, chroma, second],
+        [zero, second, chroma], [second, zero, chroma], [chroma, zero, second],
+    ])
+    picked = options[np.floor(sector).astype(int) % 6, :, np.arange(len(colors))]
+    return rgb_to_hex_colors(picked + (lightness - chroma / 2)[:, None])
+
+
+def parse_color_input(text: str, current: str) -> Optional[str]:
+    """Read a palette editor entry: RRGGBB, #RRGGBB, or a lightness shift like +10% / -5%"""
+    text = text.strip()
+    shift = re.fullmatch(r'([+-]\d+(?:\.\d+)?)%', text)
+    if shift and is_hex_color(current):
+        return shift_lightness([current], float(shift.group(1)) / 100)[0]
+    text = text.lstrip('#')
+    return text.upper() if is_hex_color(text) else None
+
+
+# Palette keys whose contrast generate checks: text against the backgrounds
+# it is drawn on
+PALETTE_CONTRAST_PAIRS = [
+    (fg, bg)
+    for fg in ("text_primary", "text_secondary", "text_muted")
+    for bg in ("bg_primary", "bg_secondary")
+]
+
+
+def derive_palettes(base_colors: Dict[str, str], steps: List[float]) -> List[Dict[str, str]]:
+    """Derive one palette per step in a single batch
+
+    A positive step darkens the bg_* colors and lightens text and accents by
+    that much (more contrast); a negative step does the opposite.
+    """
+    keys = list(base_colors)
+    colors = [base_colors[key] for key in keys] * len(steps)
+    deltas = [(-step if key.startswith("bg_") else step) for step in steps for key in keys]
+    shifted = shift_lightness(colors, deltas)
+    return [dict(zip(keys, shifted[i * len(keys):(i + 1) * len(keys)])) for i in range(len(steps))]
+
+
+def palette_min_contrast(palettes: List[Dict[str, str]]) -> List[float]:
+    """Lowest text/background contrast of each palette, checked in one pass"""
+    pairs = [(palette[fg], palette[bg]) for palette in palettes
+             for fg, bg in PALETTE_CONTRAST_PAIRS if fg in palette and bg in palette]
+    counts = [sum(1 for fg, bg in PALETTE_CONTRAST_PAIRS if fg in palette and bg in palette) for palette in palettes]
+    ratios = contrast_ratios([fg for fg, _ in pairs], [bg for _, bg in pairs])
+    result, start = [], 0
+    for count in counts:
+        result.append(min(ratios[start:start + count]) if count else 21.0)
+        start += count
+    return result
+
+
+def collect_style_color_pairs(content: str) -> Dict[Tuple[str, str], List[str]]:
+    """Every distinct (fg, bg) pair a theme or UDL file uses, with the styles using it
+
+    Styles whose fg and bg are the same color are markers (e.g. change
+    history) rather than text, and are skipped.
+    """
+    pairs = {}
+    for (lexer, name), entries in build_style_index(content).items():
+        for entry in entries:
+            spans = entry["spans"]
+            if "fgColor" not in spans or "bgColor" not in spans:
+                continue
+            fg = content[slice(*spans["fgColor"])].upper()
+            bg = content[slice(*spans["bgColor"])].upper()
+            if fg != bg:
+                pairs.setdefault((fg, bg), []).append(f"{lexer}/{name}")
+    return pairs
+
+
+# Source colors used by the bundled StrawberryMilk theme and UDL files, and
+# the palette key each one is recolored to
+THEME_COLOR_MAP = [
+    ("bgColor", "120A14", "bg_primary"),
+    ("bgColor", "1C1420", "bg_secondary"),
+    ("bgColor", "1f181e", "bg_surface"),
+    ("bgColor", "3D2F42", "bg_surface_alt"),
+    ("fgColor", "E8C5D5", "text_primary"),
+    ("fgColor", "FFB3D1", "text_secondary"),
+    ("fgColor", "D9B8C4", "text_muted"),
+    ("fgColor", "BB889F", "text_muted"),
+    ("fgColor", "FF8DBD", "accent_primary"),
+    ("fgColor", "FF6BA8", "accent_secondary"),
+    ("fgColor", "FFD6E8", "accent_light"),
+]
+
+
+def build_recolor_targets(colors: Dict[str, str]) -> Tuple[Tuple[str, str, str], ...]:
+    """Resolve THEME_COLOR_MAP against a palette as (attribute, source, target)"""
+    return tuple(
+        (attr, source, colors[key])
+        for attr, source, key in THEME_COLOR_MAP
+        if key in colors
+    )
+
+
+@lru_cache(maxsize=32)
+def compile_recolor_map(version: str, targets: Tuple[Tuple[str, str, str], ...]):
+    """Compile a palette's color mapping into one regex and a lookup table
+
+    Cached per palette version and resolved colors, so an edited palette
+    gets a fresh matcher while repeated applies reuse the compiled one.
+    """
+    lookup = {}
+    for attr, source, target in targets:
+        # The first mapping for an attribute value wins, as with sequential subs
+        lookup.setdefault(f'{attr}="{source}"', f'{attr}="{target}"')
+    pattern = re.compile("|".join(re.escape(key) for key in lookup)) if lookup else None
+    return pattern, lookup
+
+
+def recolor_content(content: str, version: str, colors: Dict[str, str],
+                    targets: Optional[Tuple[Tuple[str, str, str], ...]] = None) -> Tuple[str, Dict[str, int]]:
+    """Rewrite all mapped color attributes in a single pass over the content
+
+    Works on both theme (stylers) and UDL files. Returns the new content and
+    the number of attributes each mapping changed, keyed by the matched
+    attribute text (e.g. 'bgColor="120A14"'). ``targets`` overrides the
+    THEME_COLOR_MAP mapping, as render does.
+    """
+    if targets is None:
+        targets = build_recolor_targets(colors)
+    pattern, lookup = compile_recolor_map(version, targets)
+    counts = dict.fromkeys(lookup, 0)
+    if pattern is None:
+        return content, counts
+
+    def replace(match):
+        key = match.group(0)
+        counts[key] += 1
+        return lookup[key]
+
+    return pattern.sub(replace, content), counts
+
+
+def show_recolor_report(counts: Dict[str, int]):
+    """Display how many attributes each color mapping changed"""
+    from rich.table import Table
+    from rich import box
+
+    changed = {key: count for key, count in counts.items() if count}
+    if not changed:
+        console.print("[yellow]No mapped colors found - nothing was recolored[/yellow]")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    table.add_column("Mapping", style="cyan")
+    table.add_column("Changed", style="white", justify="right")
+
+    for key, count in changed.items():
+        table.add_row(key, str(count))
+
+    console.print(table)
+    console.print(f"[dim]{sum(changed.values())} attribute(s) recolored[/dim]")
+
+
+# Files larger than this are recolored in streaming mode unless told otherwise
+STREAM_THRESHOLD = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_xml_pieces(f, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield the text of an open XML file in pieces that end on a tag boundary
+
+    Each piece holds whole elements (a run of <LexerType>/<WordsStyle> tags),
+    so no attribute is ever split between two pieces and only about one
+    chunk is held in memory at a time.
+    """
+    pending = ""
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        pending += block
+        cut = pending.rfind(">") + 1
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def recolor_file_streaming(xml_path: Path, version: str, colors: Dict[str, str]) -> Dict[str, int]:
+    """Recolor a file element by element through a temp file in the same folder
+
+    The source is only replaced once the whole output has been written.
+    """
+    counts = {}
+    with open(xml_path, 'r', encoding='utf-8') as src, atomic_output(xml_path) as dest:
+        for piece in iter_xml_pieces(src):
+            piece, piece_counts = recolor_content(piece, version, colors)
+            dest.write(piece)
+            for key, count in piece_counts.items():
+                counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+COLOR_ATTR_RE = re.compile(r'\b(fgColor|bgColor)="([0-9A-Fa-f]{6})"')
+STYLE_TAG_RE = re.compile(r'<(/?)(LexerType|UserLang|GlobalStyles|WordsStyle|WidgetStyle)\b([^>]*)>')
+
+# Palette role for each style attribute, as (lexer glob, style glob,
+# attribute, palette key). Styles belong to their LexerType (or UserLang)
+# name; WidgetStyles belong to "GlobalStyles". The first matching rule wins
+# and a key of None leaves the attribute alone. Style globs are matched
+# against the style name, or its styleID when the glob is a number.
+# Attributes no rule matches take the role of their current color (see
+# compile_role_plan), so highlight backgrounds keep their own color.
+ROLE_RULES = [
+    ("GlobalStyles", "Change History*", "*", None),
+    ("GlobalStyles", "Current line background colour", "bgColor", "bg_secondary"),
+    ("GlobalStyles", "Selected text colour", "bgColor", "bg_surface"),
+    ("GlobalStyles", "Brace highlight style", "bgColor", "accent_primary"),
+    ("GlobalStyles", "Tags match highlighting", "bgColor", "accent_primary"),
+    ("GlobalStyles", "Global override", "fgColor", "text_primary"),
+    ("GlobalStyles", "Global override", "bgColor", "bg_primary"),
+    ("GlobalStyles", "Default Style", "fgColor", "text_primary"),
+    ("GlobalStyles", "Default Style", "bgColor", "bg_primary"),
+    ("*", "DEFAULT", "fgColor", "text_primary"),
+    ("*", "DEFAULT", "bgColor", "bg_primary"),
+    ("*", "COMMENT*", "fgColor", "text_muted"),
+    ("*", "NUMBER*", "fgColor", "accent_secondary"),
+    ("*", "*KEYWORD*", "fgColor", "text_secondary"),
+    ("*", "*STRING*", "fgColor", "accent_light"),
+    ("*", "CHARACTER", "fgColor", "accent_light"),
+]
+
+
+@lru_cache(maxsize=4)
+def build_style_index(content: str) -> Dict[Tuple[str, str], List[Dict]]:
+    """Index every style of a stylers or UDL file by (lexer name, style name)
+
+    Each key holds one entry per style with that name, in file order (a
+    lexer may repeat a name with different styleIDs). An entry records the
+    styleID and the offsets of its fgColor/bgColor values, so a recolor
+    only touches those spans instead of rescanning the text. Cached per
+    content, so re-rendering the same file for several palettes parses it
+    once.
+    """
+    index = {}
+    lexer = None
+    for match in STYLE_TAG_RE.finditer(content):
+        closing, tag, attr_text = match.groups()
+        if tag in ("LexerType", "UserLang", "GlobalStyles"):
+            if closing:
+                lexer = None
+            else:
+                lexer = dict(XML_ATTR_RE.findall(attr_text)).get("name", tag) if tag != "GlobalStyles" else tag
+            continue
+        if closing or lexer is None:
+            continue
+
+        attrs = dict(XML_ATTR_RE.findall(attr_text))
+        spans = {
+            color.group(1): (match.start(3) + color.start(2), match.start(3) + color.end(2))
+            for color in COLOR_ATTR_RE.finditer(attr_text)
+        }
+        index.setdefault((lexer, attrs.get("name", "")), []).append(
+            {"styleID": attrs.get("styleID", ""), "spans": spans})
+    return index
+
+
+def parse_role_rule(text: str) -> Tuple[str, str, str, Optional[str]]:
+    """Parse a LEXER:STYLE[:ATTR]=KEY rule; ATTR defaults to fgColor, KEY '-' leaves it alone"""
+    target, sep, key = text.partition("=")
+    parts = target.split(":")
+    if not sep or len(parts) not in (2, 3) or not all(parts) or not key:
+        raise ValueError(f"Invalid rule '{text}', expected LEXER:STYLE[:ATTR]=KEY")
+    attr = parts[2] if len(parts) == 3 else "fgColor"
+    return parts[0], parts[1], attr, None if key == "-" else key
+
+
+def match_role(rules, lexer: str, name: str, style_id: str, attr: str) -> Optional[Tuple]:
+    """First rule matching a style attribute, or None if no rule does"""
+    for rule in rules:
+        lexer_glob, style_glob, attr_glob, _ = rule
+        subject = style_id if style_glob.isdigit() else name
+        if (fnmatch(lexer.lower(), lexer_glob.lower()) and fnmatch(subject.lower(), style_glob.lower())
+                and fnmatch(attr, attr_glob)):
+            return rule
+    return None
+
+
+@lru_cache(maxsize=16)
+def compile_role_plan(content: str, rules: Tuple, lexers: Optional[Tuple[str, ...]] = None):
+    """Resolve the rules against a file's style index as sorted (start, end, key) edits
+
+    Attributes that no rule matches are given a role by their current
+    color: the key the rules most often gave that attribute and color
+    elsewhere in the file, or else its THEME_COLOR_MAP key. Colors with
+    neither (error and highlight backgrounds, say) are left alone.
+    ``lexers`` limits the plan to those LexerType/UserLang names (or
+    "GlobalStyles"), matched as globs.
+    """
+    planned = []
+    unmatched = []
+    votes = {}
+    for (lexer, name), entries in build_style_index(content).items():
+        for entry in entries:
+            for attr, (start, end) in entry["spans"].items():
+                rule = match_role(rules, lexer, name, entry["styleID"], attr)
+                color = content[start:end].upper()
+                if rule is None:
+                    unmatched.append((lexer, start, end, (attr, color)))
+                elif rule[3] is not None:
+                    tally = votes.setdefault((attr, color), {})
+                    tally[rule[3]] = tally.get(rule[3], 0) + 1
+                    planned.append((lexer, start, end, rule[3]))
+
+    # The first THEME_COLOR_MAP entry for a color wins, as in recolor_content
+    color_roles = {(attr, source.upper()): key for attr, source, key in reversed(THEME_COLOR_MAP)}
+    color_roles.update({color: max(tally, key=tally.get) for color, tally in votes.items()})
+    planned += [(lexer, start, end, color_roles[color])
+                for lexer, start, end, color in unmatched if color in color_roles]
+
+    return sorted((start, end, key) for lexer, start, end, key in planned
+                  if not lexers or any(fnmatch(lexer.lower(), pattern.lower()) for pattern in lexers))
+
+
+def recolor_by_roles(content: str, colors: Dict[str, str], rules=ROLE_RULES,
+                     lexers: Optional[List[str]] = None) -> Tuple[str, Dict[str, int]]:
+    """Recolor a file by palette role instead of by hex value
+
+    Returns the new content and the number of attributes changed per
+    palette key. Attributes whose key is missing from the palette, or
+    already hold the right color, are left as they are.
+    """
+    edits = compile_role_plan(content, tuple(rules), tuple(lexers) if lexers else None)
+    counts = {}
+    pieces = []
+    last = 0
+    for start, end, key in edits:
+        color = colors.get(key)
+        if color is None or content[start:end] == color:
+            continue
+        pieces += [content[last:start], color]
+        last = end
+        counts[key] = counts.get(key, 0) + 1
+    pieces.append(content[last:])
+    return "".join(pieces), counts
+
+
+@traced("update_theme_xml", detail=True)
+def update_theme_xml(version: str, xml_file: str = "StrawberryMilk.xml", stream: Optional[bool] = None,
+                     roles: bool = False, lexers: Optional[List[str]] = None, rules: Optional[List] = None):
+    """Update XML theme or UDL file with colors from specified version
+
+    ``xml_file`` is relative to the Themes folder, e.g. "StrawberryMilk.xml"
+    or "UDL/markdown.strawberrymilk.udl.xml", or an absolute path. Files over
+    STREAM_THRESHOLD are streamed unless ``stream`` forces either mode.
+    With ``roles``, styles are recolored by ROLE_RULES (``rules`` go first)
+    and can be limited to some ``lexers``; role mode works in memory.
+    """
+    config = load_palette_config()
+
+    if version not in config:
+        console.print(f"[red]Error: Version '{version}' not found[/red]")
+        return False
+
+    colors = config[version]["colors"]
+    xml_path = THEMES_DIR / xml_file
+
+    if not xml_path.exists():
+        console.print(f"[red]Error: {xml_file} not found[/red]")
+        return False
+
+    if roles:
+        stream = False
+    elif stream is None:
+        stream = xml_path.stat().st_size > STREAM_THRESHOLD
+
+    if stream:
+        try:
+            counts = recolor_file_streaming(xml_path, version, colors)
+        except OSError as e:
+            console.print(f"[red]Error: Could not rewrite {xml_file}: {e}[/red]")
+            return False
+    else:
+        # Read XML content
+        with open(xml_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        # Apply all replacements in a single pass
+        if roles:
+            content, counts = recolor_by_roles(content, colors, (rules or []) + ROLE_RULES, lexers)
+        else:
+            content, counts = recolor_content(content, version, colors)
+
+        # Write updated content to source file
+        try:
+            atomic_write_text(xml_path, content)
+        except OSError as e:
+            console.print(f"[red]Error: Could not rewrite {xml_file}: {e}[/red]")
+            return False
+
+    console.print(f"[green]Updated {xml_file} with {version} colors[/green]")
+    show_recolor_report(counts)
+
+    # Check if theme is already installed and update it
+    if is_udl_file_name(xml_path.name):
+        installed_path = DEFAULT_UDL_DIR / xml_path.name
+    else:
+        installed_path = DEFAULT_THEME_DIR / xml_path.name
+    if installed_path.exists():
+        # Copy updated theme to Notepad++ themes directory
+        try:
+            copy_file_hashed(xml_path, installed_path)
+            mark_installed_index_stale("udl" if is_udl_file_name(xml_path.name) else "theme")
+            console.print(f"[green]Updated installed theme in Notepad++[/green]")
+            console.print("[yellow]Restart Notepad++ to see the changes[/yellow]")
+        except Exception as e:
+            console.print(f"[red]Warning: Could not update installed theme: {e}[/red]")
             console.print("[dim]You may need to reinstall the theme manually[/dim]")
 
-    return True
+    return True
+
+# Total template bytes x versions above which render uses a process pool;
+# below it, worker start-up costs more than the rendering itself
+RENDER_POOL_THRESHOLD = 4 * 1024 * 1024
+
+
+# Token templates hold {{palette_key}} at each color site instead of a hex
+# value. They are compiled once into a render plan of static chunks and slot
+# keys, cached beside the template as <template>.plan.json.
+TEMPLATE_SUFFIX = ".tmpl"
+TEMPLATE_TOKEN_RE = re.compile(r'\{\{\s*([A-Za-z_]\w*)\s*\}\}')
+RENDER_PLAN_FORMAT = 1
+
+
+def compile_render_plan(text: str) -> Dict:
+    """Split a token template into static chunks and the palette key of each slot
+
+    There is always one more chunk than there are slots.
+    """
+    parts = TEMPLATE_TOKEN_RE.split(text)
+    return {"chunks": parts[0::2], "slots": parts[1::2], "size": len(text)}
+
+
+def get_render_plan_path(template: Path) -> Path:
+    """Where a template's compiled render plan is cached"""
+    return template.with_name(template.name + ".plan.json")
+
+
+def load_render_plan(template: Path) -> Dict:
+    """Load a template's cached render plan, recompiling it if the template changed
+
+    The cache is keyed by the template's SHA-256, so edits (or copying a
+    stale plan around) are always picked up.
+    """
+    import hashlib
+    import json
+
+    data = template.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    plan_path = get_render_plan_path(template)
+
+    try:
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get("format") == RENDER_PLAN_FORMAT and cached.get("sha256") == sha256:
+            return cached
+    except (OSError, ValueError):
+        pass
+
+    plan = compile_render_plan(data.decode('utf-8'))
+    plan.update(format=RENDER_PLAN_FORMAT, sha256=sha256)
+    try:
+        atomic_write_text(plan_path, json.dumps(plan))
+    except OSError:
+        # A read-only template folder only costs a recompile next time
+        pass
+    return plan
+
+
+def fill_render_plan(plan: Dict, colors: Dict[str, str]) -> str:
+    """Render a plan with a palette: a single join, no regex work"""
+    parts = [""] * (len(plan["chunks"]) + len(plan["slots"]))
+    parts[0::2] = plan["chunks"]
+    parts[1::2] = [colors[key] for key in plan["slots"]]
+    return "".join(parts)
+
+
+def tokenize_theme(content: str, base_colors: Dict[str, str]) -> Tuple[str, Dict[str, int]]:
+    """Turn a theme colored with base_colors into a token template
+
+    Each fgColor/bgColor attribute holding one of the palette's colors gets
+    the matching {{key}} token. Where two keys share a color the first key
+    wins, so review the tokens of roles that should differ.
+    """
+    keys = {}
+    for key, value in base_colors.items():
+        keys.setdefault(value.upper(), key)
+    counts = dict.fromkeys(base_colors, 0)
+
+    def replace(match):
+        key = keys.get(match.group(2).upper())
+        if key is None:
+            return match.group(0)
+        counts[key] += 1
+        return f'{match.group(1)}="{{{{{key}}}}}"'
+
+    return COLOR_ATTR_RE.sub(replace, content), counts
+
+
+def detect_template_version(content: str, config: Dict) -> Optional[str]:
+    """Guess which palette version a template is currently colored with
+
+    Each version scores one point per color attribute whose value is one of
+    its palette colors; the highest score wins.
+    """
+    found = {}
+    for _, value in COLOR_ATTR_RE.findall(content):
+        found[value.upper()] = found.get(value.upper(), 0) + 1
+
+    best, best_score = None, 0
+    for version, palette in config.items():
+        palette_colors = {value.upper() for value in palette["colors"].values()}
+        score = sum(found.get(value, 0) for value in palette_colors)
+        if score > best_score:
+            best, best_score = version, score
+    return best
+
+
+def build_render_targets(base_colors: Dict[str, str], colors: Dict[str, str]) -> Tuple[Tuple[str, str, str], ...]:
+    """Map every color of the base palette to the same key of another palette
+
+    When two keys share a base color, the first key in the palette wins.
+    """
+    return tuple(
+        (attr, source, colors[key])
+        for attr in ("fgColor", "bgColor")
+        for key, source in base_colors.items()
+        if key in colors
+    )
+
+
+def get_render_name(template: Path, version: str) -> str:
+    """Output file name for a rendered version, e.g. StrawberryMilk.ver_001.xml"""
+    name = template.name
+    if name.endswith(TEMPLATE_SUFFIX):
+        name = name[:-len(TEMPLATE_SUFFIX)]
+    suffix = ".udl.xml" if name.lower().endswith(".udl.xml") else Path(name).suffix
+    return f"{name[:len(name) - len(suffix)]}.{version}{suffix}"
+
+
+def render_version(template: str, content: str, version: str,
+                   targets: Tuple[Tuple[str, str, str], ...], dest: str) -> Dict:
+    """Render one palette version of a template into dest
+
+    Runs in render's worker processes, so it takes and returns plain data.
+    """
+    result = {"template": template, "version": version, "dest": dest,
+              "status": "rendered", "error": None, "recolored": 0}
+    try:
+        rendered, counts = recolor_content(content, version, {}, targets)
+        atomic_write_text(Path(dest), rendered)
+        result["recolored"] = sum(counts.values())
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+    return result
+
+
+def render_plan_version(template: str, plan: Dict, version: str, colors: Dict[str, str], dest: str) -> Dict:
+    """Render one palette version of a token template's plan into dest"""
+    result = {"template": template, "version": version, "dest": dest,
+              "status": "rendered", "error": None, "recolored": len(plan["slots"])}
+    try:
+        atomic_write_text(Path(dest), fill_render_plan(plan, colors))
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+    return result
+
+
+@traced("render_templates")
+def render_templates(templates: List[Path], versions: List[str], config: Dict, output_dir: Path,
+                     base: Optional[str] = None, jobs: Optional[int] = None) -> List[Dict]:
+    """Render each template once per palette version into output_dir
+
+    Templates are read once and never modified. The recolor map for each
+    version is built from the palette the template is currently colored
+    with (``base``, or detected from its colors), so every output is
+    rendered from the same source and the result does not depend on
+    earlier applies. Large sets run on a process pool.
+    """
+    tasks = []
+    results = []
+    for template in templates:
+        if template.name.endswith(TEMPLATE_SUFFIX):
+            try:
+                plan = load_render_plan(template)
+            except (OSError, ValueError) as e:
+                results.append({"template": str(template), "version": None, "dest": None,
+                                "status": "failed", "error": str(e), "recolored": 0})
+                continue
+
+            for version in versions:
+                colors = config[version]["colors"]
+                missing = sorted(set(plan["slots"]) - set(colors))
+                if missing:
+                    results.append({"template": str(template), "version": version, "dest": None,
+                                    "status": "failed", "recolored": 0,
+                                    "error": f"palette has no {', '.join(missing)}"})
+                    continue
+                dest = output_dir / get_render_name(template, version)
+                tasks.append((render_plan_version, (str(template), plan, version, colors, str(dest)),
+                              plan["size"]))
+            continue
+
+        try:
+            content = template.read_text(encoding='utf-8')
+        except OSError as e:
+            results.append({"template": str(template), "version": None, "dest": None,
+                            "status": "failed", "error": str(e), "recolored": 0})
+            continue
+
+        template_base = base or detect_template_version(content, config)
+        if template_base is None:
+            results.append({"template": str(template), "version": None, "dest": None,
+                            "status": "failed", "error": "no palette colors found in template",
+                            "recolored": 0})
+            continue
+
+        base_colors = config[template_base]["colors"]
+        for version in versions:
+            dest = output_dir / get_render_name(template, version)
+            targets = build_render_targets(base_colors, config[version]["colors"])
+            tasks.append((render_version, (str(template), content, version, targets, str(dest)),
+                          len(content)))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    work = sum(size for _, _, size in tasks)
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs > 1 and len(tasks) > 1 and work > RENDER_POOL_THRESHOLD:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            futures = [pool.submit(func, *args) for func, args, _ in tasks]
+            results += [future.result() for future in futures]
+    else:
+        results += [func(*args) for func, args, _ in tasks]
+    return results
+
+
+def show_render_summary(results: List[Dict]):
+    """Display one row per rendered file"""
+    from rich.table import Table
+    from rich import box
+
+    table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    table.add_column("Template", style="cyan")
+    table.add_column("Version", style="white")
+    table.add_column("Output", style="white")
+    table.add_column("Recolored", style="white", justify="right")
+
+    for result in results:
+        if result["status"] == "failed":
+            console.print(f"[red][ERROR] {Path(result['template']).name}"
+                          f"{' ' + result['version'] if result['version'] else ''}: {result['error']}[/red]")
+            continue
+        table.add_row(Path(result["template"]).name, result["version"],
+                      str(result["dest"]), str(result["recolored"]))
+
+    if table.row_count:
+        console.print(table)
+
+
+# In-memory theme model. Styles are stored as columns of ids into a string
+# table shared by every loaded theme, so thousands of near-identical themes
+# cost a few integer arrays each; StyleRecord objects are light views over
+# one row, made on demand.
+STYLE_ELEMENT_RE = re.compile(rb'<(WordsStyle|WidgetStyle)\b[^>]*>')
+STYLE_ATTR_VALUE_RE = re.compile(rb'([\w:.-]+)\s*=\s*"([^"]*)"')
+
+_model_strings: List[str] = []
+_model_string_ids: Dict[str, int] = {}
+_model_shapes: List[Tuple[Tuple[str, ...], Tuple[str, ...], str]] = []
+_model_shape_ids: Dict[Tuple, int] = {}
+
+
+def intern_model_string(text: str) -> int:
+    """Id of a string in the shared table, adding it (interned) if new"""
+    string_id = _model_string_ids.get(text)
+    if string_id is None:
+        string_id = len(_model_strings)
+        _model_strings.append(sys.intern(text))
+        _model_string_ids[text] = string_id
+    return string_id
+
+
+def intern_model_shape(names: Tuple[str, ...], pieces: Tuple[str, ...], tail: str) -> int:
+    """Id of a style tag's shape: attribute names, the text around their values, and the closing tag"""
+    shape = (names, pieces, tail)
+    shape_id = _model_shape_ids.get(shape)
+    if shape_id is None:
+        shape_id = len(_model_shapes)
+        _model_shapes.append((tuple(sys.intern(name) for name in names),
+                              tuple(sys.intern(piece) for piece in pieces), sys.intern(tail)))
+        _model_shape_ids[shape] = shape_id
+    return shape_id
+
+
+def decode_model_text(data: bytes) -> str:
+    """Decode file bytes so that encoding them again gives the same bytes"""
+    return data.decode('utf-8', errors='surrogateescape')
+
+
+class StyleRecord:
+    """View of one WordsStyle/WidgetStyle row of a ThemeModel"""
+
+    __slots__ = ("model", "row")
+
+    def __init__(self, model: "ThemeModel", row: int):
+        self.model = model
+        self.row = row
+
+    @property
+    def lexer(self) -> str:
+        return _model_strings[self.model.lexers[self.row]]
+
+    @property
+    def attrs(self) -> Dict[str, str]:
+        names = _model_shapes[self.model.shapes[self.row]][0]
+        start = self.model.value_starts[self.row]
+        return {name: _model_strings[self.model.values[start + i]] for i, name in enumerate(names)}
+
+    @property
+    def name(self) -> str:
+        return self.get("name", "")
+
+    @property
+    def style_id(self) -> str:
+        return self.get("styleID", "")
+
+    @property
+    def keywords(self) -> str:
+        """The element's text content (keyword lists), read from disk on first use"""
+        return self.model.get_keywords(self.row)
+
+    def get(self, attr: str, default: Optional[str] = None) -> Optional[str]:
+        names = _model_shapes[self.model.shapes[self.row]][0]
+        if attr not in names:
+            return default
+        return _model_strings[self.model.values[self.model.value_starts[self.row] + names.index(attr)]]
+
+    def set(self, attr: str, value: str):
+        """Change an existing attribute's value; new attributes are not supported"""
+        names = _model_shapes[self.model.shapes[self.row]][0]
+        if attr not in names:
+            raise KeyError(attr)
+        self.model.values[self.model.value_starts[self.row] + names.index(attr)] = intern_model_string(value)
+
+
+class ThemeModel:
+    """Compact, lossless model of a stylers or UDL file
+
+    The text between style elements, each style's attribute values and its
+    tag shape are ids into tables shared by all models. Keyword text stays
+    on disk until asked for, and is only read back if the file still has
+    the SHA-256 it was loaded with. ``serialize()`` gives back the original
+    bytes unless styles were changed.
+    """
+
+    __slots__ = ("path", "sha256", "segments", "lexers", "shapes", "value_starts", "values",
+                 "keyword_spans", "_keywords")
+
+    def __init__(self, path: Path):
+        from array import array
+
+        self.path = path
+        self.sha256 = b""
+        self.segments = array('I')
+        self.lexers = array('I')
+        self.shapes = array('I')
+        self.value_starts = array('I')
+        self.values = array('I')
+        self.keyword_spans = {}
+        self._keywords = None
+
+    @classmethod
+    def load(cls, path: Path) -> "ThemeModel":
+        """Parse a theme or UDL file into a model"""
+        import hashlib
+
+        model = cls(Path(path))
+        data = model.path.read_bytes()
+        model.sha256 = hashlib.sha256(data).digest()
+        lexer_id = intern_model_string("")
+        last = 0
+
+        for match in STYLE_ELEMENT_RE.finditer(data):
+            # Static text up to this element; track which lexer it opens or closes
+            between = decode_model_text(data[last:match.start()])
+            for tag in STYLE_TAG_RE.finditer(between):
+                closing, tag_name, attr_text = tag.groups()
+                if closing:
+                    lexer_id = intern_model_string("")
+                elif tag_name == "GlobalStyles":
+                    lexer_id = intern_model_string(tag_name)
+                else:
+                    lexer_id = intern_model_string(dict(XML_ATTR_RE.findall(attr_text)).get("name", tag_name))
+            model.segments.append(intern_model_string(between))
+
+            names, pieces = [], []
+            cursor = match.start()
+            model.value_starts.append(len(model.values))
+            for attr in STYLE_ATTR_VALUE_RE.finditer(data, match.start(), match.end()):
+                names.append(decode_model_text(attr.group(1)))
+                pieces.append(decode_model_text(data[cursor:attr.start(2)]))
+                model.values.append(intern_model_string(decode_model_text(attr.group(2))))
+                cursor = attr.end(2)
+            pieces.append(decode_model_text(data[cursor:match.end()]))
+
+            tail = ""
+            last = match.end()
+            if not data[match.start():match.end()].endswith(b"/>"):
+                close = data.find(b"</" + match.group(1), last)
+                close_end = data.find(b">", close) + 1 if close != -1 else 0
+                if close_end:
+                    if close > last:
+                        model.keyword_spans[len(model.shapes)] = (last, close)
+                    tail = decode_model_text(data[close:close_end])
+                    last = close_end
+
+            model.lexers.append(lexer_id)
+            model.shapes.append(intern_model_shape(tuple(names), tuple(pieces), tail))
+
+        model.segments.append(intern_model_string(decode_model_text(data[last:])))
+        return model
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def styles(self):
+        """Iterate over StyleRecord views of every style, in file order"""
+        return (StyleRecord(self, row) for row in range(len(self.shapes)))
+
+    def find_style(self, lexer: str, name: str) -> Optional[StyleRecord]:
+        """First style with this lexer (or "GlobalStyles") and name"""
+        lexer_id = _model_string_ids.get(lexer)
+        name_id = _model_string_ids.get(name)
+        if lexer_id is None or name_id is None:
+            return None
+        for row, row_lexer in enumerate(self.lexers):
+            if row_lexer == lexer_id:
+                record = StyleRecord(self, row)
+                if record.name == name:
+                    return record
+        return None
+
+    def read_keywords(self) -> Dict[int, str]:
+        """Keyword text of every style row that has any, read from disk on first use
+
+        Raises ValueError if the file changed since it was loaded, as its
+        keyword offsets would no longer line up.
+        """
+        import hashlib
+
+        if self._keywords is None:
+            keywords = {}
+            if self.keyword_spans:
+                data = self.path.read_bytes()
+                if hashlib.sha256(data).digest() != self.sha256:
+                    raise ValueError(f"{self.path.name} changed since it was loaded; load it again")
+                keywords = {row: decode_model_text(data[start:end])
+                            for row, (start, end) in self.keyword_spans.items()}
+            self._keywords = keywords
+        return self._keywords
+
+    def get_keywords(self, row: int) -> str:
+        return self.read_keywords().get(row, "")
+
+    def serialize(self) -> bytes:
+        """The file's bytes, rebuilt from the model
+
+        Raises ValueError if the file has keyword text and changed since it
+        was loaded (see read_keywords).
+        """
+        keywords = self.read_keywords()
+
+        strings = _model_strings
+        parts = []
+        for row, shape_id in enumerate(self.shapes):
+            parts.append(strings[self.segments[row]])
+            names, pieces, tail = _model_shapes[shape_id]
+            start = self.value_starts[row]
+            for i, piece in enumerate(pieces[:-1]):
+                parts += [piece, strings[self.values[start + i]]]
+            parts += [pieces[-1], keywords.get(row, ""), tail]
+        parts.append(strings[self.segments[-1]])
+        return "".join(parts).encode('utf-8', errors='surrogateescape')
+
+
+def load_theme_models(directory: Optional[Path] = None, recursive: bool = False) -> Dict[str, ThemeModel]:
+    """Load every theme in a folder (the installed themes by default), keyed by path"""
+    themes, _ = discover_files(Path(directory) if directory else DEFAULT_THEME_DIR, recursive)
+    models = {}
+    for theme in themes:
+        try:
+            models[str(theme)] = ThemeModel.load(theme)
+        except OSError as e:
+            console.print(f"[yellow][WARNING]  Could not read {theme.name}: {e}[/yellow]")
+    return models
+
+
+# Structural diffs between themes. Elements are keyed by their path, where
+# each step is the bare tag when it is the only child with that tag and is
+# otherwise qualified by styleID (for WordsStyle), name, or position.
+XML_TOKEN_RE = re.compile(
+    r'<!--.*?-->|<\?.*?\?>|<!\[CDATA\[.*?\]\]>|<!DOCTYPE[^>]*>'
+    r'|<(/?)([A-Za-z_][\w:.-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>',
+    re.DOTALL,
+)
+XML_ATTR_SPAN_RE = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+PATCH_FORMAT = 1
+
+
+def scan_xml_elements(text: str) -> List[Dict]:
+    """List the elements of an XML document with their offsets, in document order
+
+    Each element records its tag, attribute values and value spans, the
+    span of its start tag and of the whole element, its parent and
+    children (indexes into the list), and the span of its text when it has
+    no child elements.
+    """
+    elements = []
+    stack = []
+    for match in XML_TOKEN_RE.finditer(text):
+        closing, tag, attr_text, self_closing = match.groups()
+        if tag is None:
+            continue
+        if closing:
+            # Tolerate unbalanced tags by closing up to the matching element
+            while stack:
+                element = elements[stack.pop()]
+                element["end"] = match.start() if element["tag"] != tag else match.end()
+                if element["tag"] == tag:
+                    if not element["children"]:
+                        element["text_span"] = (element["head_end"], match.start())
+                    break
+            continue
+
+        attrs, spans = {}, {}
+        for attr in XML_ATTR_SPAN_RE.finditer(attr_text):
+            group = 2 if attr.group(2) is not None else 3
+            attrs[attr.group(1)] = attr.group(group)
+            spans[attr.group(1)] = (match.start(3) + attr.start(group), match.start(3) + attr.end(group))
+
+        index = len(elements)
+        parent = stack[-1] if stack else None
+        elements.append({"tag": tag, "attrs": attrs, "spans": spans, "start": match.start(),
+                         "head_end": match.end(), "end": match.end(), "parent": parent,
+                         "children": [], "text_span": None, "self_closing": bool(self_closing)})
+        if parent is not None:
+            elements[parent]["children"].append(index)
+        if not self_closing:
+            stack.append(index)
+    return elements
+
+
+def index_xml_elements(text: str) -> Tuple[List[Dict], Dict[str, int]]:
+    """Scan a document and key every element by its path"""
+    elements = scan_xml_elements(text)
+    paths = {}
+
+    def add_children(children: List[int], prefix: str):
+        tag_counts = {}
+        for child in children:
+            tag_counts[elements[child]["tag"]] = tag_counts.get(elements[child]["tag"], 0) + 1
+        positions = {}
+        for child in children:
+            element = elements[child]
+            tag, attrs = element["tag"], element["attrs"]
+            positions[tag] = positions.get(tag, 0) + 1
+            if tag_counts[tag] == 1:
+                step = tag
+            elif tag == "WordsStyle" and "styleID" in attrs:
+                step = f"{tag}[@styleID='{attrs['styleID']}']"
+            elif "name" in attrs:
+                step = f"{tag}[@name='{attrs['name']}']"
+            else:
+                step = f"{tag}[{positions[tag]}]"
+            path = f"{prefix}/{step}" if prefix else step
+            if path in paths:
+                path = f"{path}[{positions[tag]}]"
+            element["path"] = path
+            paths[path] = child
+            add_children(element["children"], path)
+
+    add_children([i for i, element in enumerate(elements) if element["parent"] is None], "")
+    return elements, paths
+
+
+def get_element_text(text: str, element: Dict) -> Optional[str]:
+    """Text of a leaf element, or None if it has child elements"""
+    if element["children"]:
+        return None
+    if element["text_span"] is None:
+        return ""
+    return text[element["text_span"][0]:element["text_span"][1]]
+
+
+def diff_themes(old_text: str, new_text: str) -> Dict:
+    """Structural diff from one theme or UDL file to another, as patch operations
+
+    Comments and whitespace between elements are not compared.
+    """
+    old_elements, old_paths = index_xml_elements(old_text)
+    new_elements, new_paths = index_xml_elements(new_text)
+    patch = {"set": {}, "unset": {}, "text": {}, "remove": [], "add": []}
+
+    for path, index in old_paths.items():
+        element = old_elements[index]
+        if path not in new_paths:
+            parent = element["parent"]
+            if parent is None or old_elements[parent]["path"] in new_paths:
+                patch["remove"].append(path)
+            continue
+
+        new_element = new_elements[new_paths[path]]
+        changed = {attr: value for attr, value in new_element["attrs"].items()
+                   if element["attrs"].get(attr) != value}
+        if changed:
+            patch["set"][path] = changed
+        missing = [attr for attr in element["attrs"] if attr not in new_element["attrs"]]
+        if missing:
+            patch["unset"][path] = missing
+        new_element_text = get_element_text(new_text, new_element)
+        if new_element_text is not None and new_element_text != get_element_text(old_text, element):
+            patch["text"][path] = new_element_text
+
+    for path, index in new_paths.items():
+        element = new_elements[index]
+        if path in old_paths:
+            continue
+        parent = element["parent"]
+        parent_path = new_elements[parent]["path"] if parent is not None else ""
+        if parent is not None and parent_path not in old_paths:
+            continue
+        # Anchor on the closest earlier sibling that the old file also has
+        siblings = new_elements[parent]["children"] if parent is not None else []
+        after = None
+        for sibling in siblings[:siblings.index(index)] if index in siblings else []:
+            if new_elements[sibling]["path"] in old_paths:
+                after = new_elements[sibling]["path"]
+        patch["add"].append([parent_path, after, new_text[element["start"]:element["end"]]])
+
+    return {key: value for key, value in patch.items() if value}
+
+
+def get_line_indent(text: str, offset: int) -> Optional[str]:
+    """Whitespace between the start of a line and offset, or None if other text precedes it"""
+    line_start = text.rfind("\n", 0, offset) + 1
+    indent = text[line_start:offset]
+    return None if indent.strip() else indent
+
+
+def apply_theme_patch(text: str, patch: Dict) -> str:
+    """Apply a patch from diff_themes to a document
+
+    Raises ValueError if the document lacks an element the patch refers to.
+    """
+    elements, paths = index_xml_elements(text)
+    edits = []
+
+    def find(path):
+        if path not in paths:
+            raise ValueError(f"element not found: {path}")
+        return elements[paths[path]]
+
+    for path, attrs in patch.get("set", {}).items():
+        element = find(path)
+        for attr, value in attrs.items():
+            if attr in element["spans"]:
+                edits.append((*element["spans"][attr], value))
+            else:
+                insert_at = element["head_end"] - (2 if element["self_closing"] else 1)
+                while insert_at > element["start"] and text[insert_at - 1].isspace():
+                    insert_at -= 1
+                edits.append((insert_at, insert_at, f' {attr}="{value}"'))
+
+    for path, attrs in patch.get("unset", {}).items():
+        element = find(path)
+        for attr in attrs:
+            if attr not in element["spans"]:
+                continue
+            start, end = element["spans"][attr]
+            attr_start = text.rfind(attr, element["start"], start)
+            while attr_start > element["start"] and text[attr_start - 1].isspace():
+                attr_start -= 1
+            edits.append((attr_start, end + 1, ""))
+
+    for path, value in patch.get("text", {}).items():
+        element = find(path)
+        if element["text_span"] is None:
+            raise ValueError(f"cannot set the text of an empty element: {path}")
+        edits.append((*element["text_span"], value))
+
+    for path in patch.get("remove", []):
+        element = find(path)
+        indent = get_line_indent(text, element["start"])
+        start = element["start"]
+        if indent is not None:
+            # Take the element's whole line with it
+            start = max(start - len(indent) - 1, 0)
+        edits.append((start, element["end"], ""))
+
+    for parent_path, after, xml in patch.get("add", []):
+        if after:
+            anchor = find(after)
+            indent = get_line_indent(text, anchor["start"]) or ""
+            edits.append((anchor["end"], anchor["end"], f"\n{indent}{xml}"))
+        elif parent_path:
+            parent = find(parent_path)
+            if parent["self_closing"]:
+                raise ValueError(f"cannot add children to an empty element: {parent_path}")
+            first = elements[parent["children"][0]] if parent["children"] else None
+            if first:
+                indent = get_line_indent(text, first["start"]) or ""
+            else:
+                indent = (get_line_indent(text, parent["start"]) or "") + "    "
+            edits.append((parent["head_end"], parent["head_end"], f"\n{indent}{xml}"))
+        else:
+            raise ValueError("cannot add a second root element")
+
+    pieces = []
+    last = 0
+    for start, end, replacement in sorted(edits, key=lambda edit: edit[:2]):
+        if start < last:
+            raise ValueError("patch operations overlap")
+        pieces += [text[last:start], replacement]
+        last = end
+    pieces.append(text[last:])
+    return "".join(pieces)
+
+
+def count_patch_changes(patch: Dict) -> int:
+    """Number of attribute, text and element changes in a patch"""
+    return (sum(len(attrs) for attrs in patch.get("set", {}).values())
+            + sum(len(attrs) for attrs in patch.get("unset", {}).values())
+            + len(patch.get("text", {})) + len(patch.get("remove", [])) + len(patch.get("add", [])))
+
+
+def show_theme_diff(patch: Dict, old_text: str):
+    """Print a patch as one line per change, like a diff
+
+    Paths contain brackets, so this writes through click rather than rich.
+    """
+    old_elements, old_paths = index_xml_elements(old_text)
+    color = False if console.plain else None
+
+    def line(sign: str, fg: str, text: str):
+        click.echo(f"{click.style(sign, fg=fg)} {text}", color=color)
+
+    for path, attrs in patch.get("set", {}).items():
+        old_attrs = old_elements[old_paths[path]]["attrs"] if path in old_paths else {}
+        for attr, value in attrs.items():
+            old_value = old_attrs.get(attr)
+            change = f"{old_value} -> {value}" if old_value is not None else f"= {value}"
+            line("~", "yellow", f"{path} @{attr} {change}")
+    for path, attrs in patch.get("unset", {}).items():
+        for attr in attrs:
+            line("-", "red", f"{path} @{attr}")
+    for path in patch.get("text", {}):
+        line("~", "yellow", f"{path} (text)")
+    for path in patch.get("remove", []):
+        line("-", "red", path)
+    for parent_path, _, xml in patch.get("add", []):
+        line("+", "green", f"{parent_path}/{XML_TOKEN_RE.match(xml).group(2)}")
+
+
+def show_color_preview(colors: Dict[str, str]):
+    """Display visual color preview"""
+    from rich.table import Table
+
+    console.print("\n[bold cyan]Color Preview:[/bold cyan]")
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Element", style="cyan", width=20)
+    table.add_column("Color", style="white", width=10)
+    table.add_column("Preview", style="white", width=15)
+
+    color_map = {
+        "bg_primary": "Background",
+        "bg_secondary": "Current Line",
+        "bg_surface": "Selected Text",
+        "text_primary": "Default Text",
+        "text_secondary": "Keywords",
+        "text_muted": "Comments",
+        "accent_primary": "Brace/Tag Highlight",
+        "accent_secondary": "Numbers",
+        "accent_light": "Strings"
+    }
+
+    for key, name in color_map.items():
+        if key in colors:
+            color = colors[key]
+            preview = f"[#{color}]######[/]"
+            table.add_row(name, f"#{color}", preview)
+
+    console.print(table)
+
+def show_palette_editor():
+    """Display palette editor menu"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    while True:
+        config = load_palette_config()
+
+        console.print("\n[bold cyan]=== Palette Editor ===[/bold cyan]\n")
+
+        table = Table(show_header=False, box=box.SIMPLE)
+        table.add_column("Option", style="cyan", width=6)
+        table.add_column("Description", style="white")
+
+        table.add_row("1", "Edit StrawberryMilk Classic (ver_001)")
+        table.add_row("2", "Edit StrawberryMilk Modern (ver_002)")
+        table.add_row("3", "Edit StrawberryMilk High Contrast (ver_003)")
+        table.add_row("4", "Preview All Palettes")
+        table.add_row("5", "Apply Theme to XML")
+        table.add_row("b", "Back to Main Menu")
+
+        console.print(table)
+
+        choice = Prompt.ask(
+            "\n[bold yellow]Select option[/bold yellow]",
+            choices=["1", "2", "3", "4", "5", "b"],
+            default="b"
+        )
+
+        if choice == "1":
+            edit_palette("ver_001", config)
+        elif choice == "2":
+            edit_palette("ver_002", config)
+        elif choice == "3":
+            edit_palette("ver_003", config)
+        elif choice == "4":
+            preview_all_palettes(config)
+        elif choice == "5":
+            apply_theme_to_xml()
+        elif choice == "b":
+            break
+
+def edit_palette(version: str, config: Dict):
+    """Edit a specific palette"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    if version not in config:
+        console.print(f"[red]Error: Version '{version}' not found[/red]")
+        return
+
+    palette = config[version]
+    colors = palette["colors"]
+
+    console.print(f"\n[bold cyan]Editing {palette['name']}[/bold cyan]")
+    console.print(f"[dim]{palette['description']}[/dim]\n")
+
+    # Show current colors
+    show_color_preview(colors)
+
+    while True:
+        console.print(f"\n[bold yellow]Edit {version} Colors:[/bold yellow]")
+
+        table = Table(show_header=False, box=box.SIMPLE)
+        table.add_column("Option", style="cyan", width=6)
+        table.add_column("Description", style="white")
+
+        table.add_row("1", "Edit Background Colors")
+        table.add_row("2", "Edit Text Colors")
+        table.add_row("3", "Edit Accent Colors")
+        table.add_row("4", "Preview Changes")
+        table.add_row("5", "Save Palette")
+        table.add_row("b", "Back to Palette Editor")
+
+        console.print(table)
+
+        choice = Prompt.ask(
+            "\n[bold yellow]Select option[/bold yellow]",
+            choices=["1", "2", "3", "4", "5", "b"],
+            default="b"
+        )
+
+        if choice == "1":
+            edit_background_colors(colors)
+        elif choice == "2":
+            edit_text_colors(colors)
+        elif choice == "3":
+            edit_accent_colors(colors)
+        elif choice == "4":
+            show_color_preview(colors)
+        elif choice == "5":
+            if save_palette_config(config):
+                console.print(f"[green]Saved {version} palette[/green]")
+        elif choice == "b":
+            break
+
+def edit_background_colors(colors: Dict):
+    """Edit background colors"""
+    from rich.prompt import Prompt
+
+    console.print("\n[bold cyan]Background Colors:[/bold cyan]")
+
+    bg_colors = {
+        "bg_primary": "Primary Background",
+        "bg_secondary": "Secondary Background",
+        "bg_surface": "Surface Background",
+        "bg_surface_alt": "Alternative Surface"
+    }
+
+    for key, name in bg_colors.items():
+        current = colors.get(key, "000000")
+        console.print(f"\n[cyan]{name}:[/cyan] #{current}")
+
+        new_color = Prompt.ask(
+            f"Enter new color (hex, or a lightness shift like +10%)",
+            default=current
+        )
 
-def show_color_preview(colors: Dict[str, str]):
-    """Display visual color preview"""
-    console.print("\n[bold cyan]Color Preview:[/bold cyan]")
+        parsed = parse_color_input(new_color, current)
+        if parsed:
+            colors[key] = parsed
+        else:
+            console.print(f"[yellow]'{new_color}' is not a hex color or lightness shift; keeping #{current}[/yellow]")
 
-    table = Table(show_header=True, header_style="bold magenta")
-    table.add_column("Element", style="cyan", width=20)
-    table.add_column("Color", style="white", width=10)
-    table.add_column("Preview", style="white", width=15)
+def edit_text_colors(colors: Dict):
+    """Edit text colors"""
+    from rich.prompt import Prompt
 
-    color_map = {
-        "bg_primary": "Background",
-        "bg_secondary": "Current Line",
-        "bg_surface": "Selected Text",
-        "text_primary": "Default Text",
-        "text_secondary": "Keywords",
-        "text_muted": "Comments",
-        "accent_primary": "Syntax",
-        "accent_secondary": "Numbers",
-        "accent_light": "Strings"
+    console.print("\n[bold cyan]Text Colors:[/bold cyan]")
+
+    text_colors = {
+        "text_primary": "Primary Text",
+        "text_secondary": "Secondary Text",
+        "text_muted": "Muted Text"
+    }
+
+    for key, name in text_colors.items():
+        current = colors.get(key, "000000")
+        console.print(f"\n[cyan]{name}:[/cyan] #{current}")
+
+        new_color = Prompt.ask(
+            f"Enter new color (hex, or a lightness shift like +10%)",
+            default=current
+        )
+
+        parsed = parse_color_input(new_color, current)
+        if parsed:
+            colors[key] = parsed
+        else:
+            console.print(f"[yellow]'{new_color}' is not a hex color or lightness shift; keeping #{current}[/yellow]")
+
+def edit_accent_colors(colors: Dict):
+    """Edit accent colors"""
+    from rich.prompt import Prompt
+
+    console.print("\n[bold cyan]Accent Colors:[/bold cyan]")
+
+    accent_colors = {
+        "accent_primary": "Primary Accent",
+        "accent_secondary": "Secondary Accent",
+        "accent_light": "Light Accent"
+    }
+
+    for key, name in accent_colors.items():
+        current = colors.get(key, "000000")
+        console.print(f"\n[cyan]{name}:[/cyan] #{current}")
+
+        new_color = Prompt.ask(
+            f"Enter new color (hex, or a lightness shift like +10%)",
+            default=current
+        )
+
+        parsed = parse_color_input(new_color, current)
+        if parsed:
+            colors[key] = parsed
+        else:
+            console.print(f"[yellow]'{new_color}' is not a hex color or lightness shift; keeping #{current}[/yellow]")
+
+def preview_all_palettes(config: Dict):
+    """Preview all available palettes"""
+    console.print("\n[bold cyan]All Available Palettes:[/bold cyan]\n")
+
+    for version, palette in config.items():
+        console.print(f"[bold magenta]{palette['name']} ({version})[/bold magenta]")
+        console.print(f"[dim]{palette['description']}[/dim]")
+        show_color_preview(palette["colors"])
+        console.print()
+
+def apply_theme_to_xml():
+    """Apply a palette to the XML theme file"""
+    from rich.prompt import Prompt
+    from rich.table import Table
+    from rich import box
+
+    config = load_palette_config()
+
+    console.print("\n[bold cyan]Apply Theme to XML:[/bold cyan]\n")
+
+    table = Table(show_header=False, box=box.SIMPLE)
+    table.add_column("Option", style="cyan", width=6)
+    table.add_column("Description", style="white")
+
+    # Create numbered options for better UX
+    version_list = list(config.keys())
+    for i, version in enumerate(version_list, 1):
+        palette = config[version]
+        table.add_row(str(i), palette["name"])
+
+    table.add_row("b", "Back to Palette Editor")
+
+    console.print(table)
+
+    # Create choices list with numbers
+    choices = [str(i) for i in range(1, len(version_list) + 1)] + ["b"]
+
+    choice = Prompt.ask(
+        "\n[bold yellow]Select palette to apply[/bold yellow]",
+        choices=choices,
+        default="b"
+    )
+
+    if choice != "b" and choice.isdigit():
+        index = int(choice) - 1
+        if 0 <= index < len(version_list):
+            version = version_list[index]
+            if update_theme_xml(version):
+                console.print(f"\n[green]Successfully applied {config[version]['name']} to StrawberryMilk.xml[/green]")
+                console.print("[dim]If not already installed, use: mkpp install Themes/StrawberryMilk.xml[/dim]")
+
+@cli.command()
+@click.argument("version")
+@click.option("--file", "xml_file", default="StrawberryMilk.xml",
+              help="Theme or UDL file, relative to Themes/ or absolute")
+@click.option("--stream/--no-stream", default=None,
+              help="Force streaming (or in-memory) rewrite; picked by file size by default")
+@click.option("--roles", is_flag=True, help="Recolor styles by palette role (comments, numbers, ...) instead of hex value")
+@click.option("--lexer", "lexers", multiple=True, help="Only recolor this lexer, e.g. python (repeatable, implies --roles)")
+@click.option("--rule", "rule_texts", multiple=True,
+              help="Extra role rule LEXER:STYLE[:ATTR]=KEY, e.g. 'python:COMMENT*=accent_primary' (implies --roles)")
+def apply(version, xml_file, stream, roles, lexers, rule_texts):
+    """Apply a palette version to a theme or UDL file"""
+    print_banner()
+
+    try:
+        rules = [parse_role_rule(text) for text in rule_texts]
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+
+    roles = roles or bool(lexers) or bool(rules)
+    if not update_theme_xml(version, xml_file, stream=stream, roles=roles, lexers=list(lexers), rules=rules):
+        sys.exit(1)
+
+
+@cli.group()
+def palette():
+    """Palette tools"""
+
+
+@palette.command()
+def check():
+    """Validate color_config.json and report every invalid value"""
+    print_banner()
+
+    config = load_palette_config()
+    if not config:
+        sys.exit(1)
+    colors = sum(len(palette["colors"]) for palette in config.values())
+    console.print(f"[green][OK] {len(config)} palette version(s), {colors} color(s), all valid[/green]")
+
+
+@palette.command()
+@click.argument("base")
+@click.option("--count", "-n", type=click.IntRange(1, 200), default=12, show_default=True,
+              help="Number of variants to derive")
+@click.option("--step", type=click.FloatRange(0.001, 0.5), default=0.02, show_default=True,
+              help="Lightness change between neighbouring variants")
+@click.option("--min-contrast", type=float, help="Drop variants whose text/background contrast is below this")
+@click.option("--save", is_flag=True, help="Add the variants to color_config.json")
+@click.option("--json", "as_json", is_flag=True, help="Print the variants as JSON")
+def generate(base, count, step, min_contrast, save, as_json):
+    """Derive contrast variants of a palette in one batch"""
+    import json
+    from rich.table import Table
+    from rich import box
+
+    config = load_palette_config()
+    if base not in config:
+        console.print(f"[red]Error: Version '{base}' not found[/red]")
+        sys.exit(1)
+
+    # +1, -1, +2, -2, ... steps: more and less contrast around the base
+    ladder = sorted((k // 2 + 1) * (1 if k % 2 == 0 else -1) for k in range(count))
+    palettes = derive_palettes(config[base]["colors"], [k * step for k in ladder])
+    contrasts = palette_min_contrast(palettes)
+
+    variants = {}
+    for k, colors, contrast in zip(ladder, palettes, contrasts):
+        if min_contrast is not None and contrast < min_contrast:
+            continue
+        variants[f"{base}_c{k:+d}"] = {
+            "name": f"{config[base]['name']} (contrast {k:+d})",
+            "description": f"Derived from {base}: lightness {k * step:+.3f} on text, {-k * step:+.3f} on backgrounds",
+            "colors": colors,
+            "min_contrast": round(contrast, 2),
+        }
+
+    if as_json:
+        click.echo(json.dumps(variants, indent=2))
+    else:
+        print_banner()
+        table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+        table.add_column("Version", style="cyan")
+        table.add_column("Min contrast", style="white", justify="right")
+        table.add_column("Preview", style="white")
+        for version, variant in variants.items():
+            colors = variant["colors"]
+            preview = "".join(f"[#{colors[key]} on #{colors['bg_primary']}] Aa [/]"
+                              for key in ("text_primary", "text_muted", "accent_primary") if key in colors)
+            table.add_row(version, f"{variant['min_contrast']:.2f}", preview)
+        console.print(table)
+        dropped = len(palettes) - len(variants)
+        if dropped:
+            console.print(f"[dim]{dropped} variant(s) below {min_contrast} contrast dropped[/dim]")
+
+    if save and variants:
+        for version, variant in variants.items():
+            config[version] = {key: value for key, value in variant.items() if key != "min_contrast"}
+        if not save_palette_config(config):
+            sys.exit(1)
+        if not as_json:
+            console.print(f"[green][OK] Added {len(variants)} variant(s) to color_config.json[/green]")
+
+
+@palette.command()
+@click.argument("versions", nargs=-1)
+@click.option("--all", "audit_all", is_flag=True, help="Audit every version in color_config.json")
+@click.option("--file", "xml_file", default="StrawberryMilk.xml", show_default=True,
+              help="Theme, UDL or .tmpl template, relative to Themes/ or absolute")
+@click.option("--min-contrast", type=float, default=WCAG_AA_CONTRAST, show_default=True,
+              help="Lowest acceptable contrast ratio (4.5 is WCAG AA for text)")
+def audit(versions, audit_all, xml_file, min_contrast):
+    """Check the contrast of every fg/bg pair a theme uses
+
+    Without versions, the file is audited as it is; with versions, it is
+    rendered with each palette in memory first.
+    """
+    from rich.table import Table
+    from rich import box
+
+    print_banner()
+    xml_path = THEMES_DIR / xml_file
+    if not xml_path.exists():
+        console.print(f"[red]Error: {xml_file} not found[/red]")
+        sys.exit(1)
+
+    config = load_palette_config() if versions or audit_all else {}
+    if audit_all:
+        versions = list(config)
+    unknown = [version for version in versions if version not in config]
+    if unknown:
+        console.print(f"[red]Error: Version(s) not found: {', '.join(unknown)}[/red]")
+        sys.exit(1)
+
+    is_template = xml_path.name.endswith(TEMPLATE_SUFFIX)
+    if is_template and not versions:
+        console.print("[red]Error: Name the versions to audit a template with, or use --all[/red]")
+        sys.exit(1)
+
+    # Render each version (or take the file as is), then check every pair at once
+    rendered = {}
+    if is_template:
+        plan = load_render_plan(xml_path)
+        for version in versions:
+            rendered[version] = fill_render_plan(plan, config[version]["colors"])
+    else:
+        content = xml_path.read_text(encoding='utf-8', errors='replace')
+        if not versions:
+            rendered["as is"] = content
+        else:
+            base = detect_template_version(content, config) or versions[0]
+            for version in versions:
+                targets = build_render_targets(config[base]["colors"], config[version]["colors"])
+                rendered[version] = recolor_content(content, version, {}, targets)[0]
+
+    rows = [(label, fg, bg, styles) for label, text in rendered.items()
+            for (fg, bg), styles in collect_style_color_pairs(text).items()]
+    ratios = contrast_ratios([row[1] for row in rows], [row[2] for row in rows])
+
+    summary = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    summary.add_column("Version", style="cyan")
+    summary.add_column("Pairs", style="white", justify="right")
+    summary.add_column("Below", style="white", justify="right")
+    summary.add_column("Lowest", style="white", justify="right")
+    failures = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    failures.add_column("Version", style="cyan")
+    failures.add_column("Pair", style="white")
+    failures.add_column("Contrast", style="white", justify="right")
+    failures.add_column("Styles", style="white")
+
+    for label in rendered:
+        results = [(row, ratio) for row, ratio in zip(rows, ratios) if row[0] == label]
+        failing = sorted(((row, ratio) for row, ratio in results if ratio < min_contrast), key=lambda item: item[1])
+        lowest = min((ratio for _, ratio in results), default=21.0)
+        summary.add_row(label, str(len(results)), str(len(failing)), f"{lowest:.2f}")
+        for (_, fg, bg, styles), ratio in failing:
+            more = f" +{len(styles) - 3} more" if len(styles) > 3 else ""
+            failures.add_row(label, f"[#{fg} on #{bg}] #{fg} on #{bg} [/]", f"{ratio:.2f}",
+                             ", ".join(styles[:3]) + more)
+
+    console.print(summary)
+    if failures.row_count:
+        console.print(failures)
+        console.print(f"[yellow][WARNING]  {failures.row_count} pair(s) below {min_contrast}:1 contrast[/yellow]")
+        sys.exit(1)
+    console.print(f"[green][OK] Every pair meets {min_contrast}:1 contrast[/green]")
+
+
+@cli.command()
+@click.argument("versions", nargs=-1)
+@click.option("--all", "render_all", is_flag=True, help="Render every version in color_config.json")
+@click.option("--file", "xml_files", multiple=True,
+              help="Template theme or UDL file, relative to Themes/ or absolute (repeatable) "
+                   "[default: StrawberryMilk.xml]")
+@click.option("--output-dir", "-o", type=click.Path(file_okay=False),
+              help="Folder for rendered files [default: Themes/rendered]")
+@click.option("--base", help="Palette version the templates are colored with; detected by default")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), help="Worker processes for large template sets")
+def render(versions, render_all, xml_files, output_dir, base, jobs):
+    """Render palette versions to separate files without touching the template"""
+    print_banner()
+
+    config = load_palette_config()
+    if not config:
+        sys.exit(1)
+
+    if render_all:
+        versions = list(config)
+    if not versions:
+        console.print("[red]Error: Name one or more versions, or use --all[/red]")
+        sys.exit(1)
+
+    unknown = [version for version in list(versions) + [base] if version and version not in config]
+    if unknown:
+        console.print(f"[red]Error: Version(s) not found: {', '.join(unknown)}[/red]")
+        sys.exit(1)
+
+    templates = [THEMES_DIR / xml_file for xml_file in (xml_files or ["StrawberryMilk.xml"])]
+    missing = [str(template) for template in templates if not template.exists()]
+    if missing:
+        console.print(f"[red]Error: Template(s) not found: {', '.join(missing)}[/red]")
+        sys.exit(1)
+
+    output_path = Path(output_dir).expanduser() if output_dir else THEMES_DIR / "rendered"
+    results = render_templates(templates, list(versions), config, output_path, base=base, jobs=jobs)
+    show_render_summary(results)
+
+    rendered = sum(1 for result in results if result["status"] == "rendered")
+    console.print(f"\n[green]Rendered {rendered} file(s) to {output_path}[/green]")
+    if rendered < len(results):
+        sys.exit(1)
+
+
+# Linux inotify flags (sys/inotify.h). Editors save either in place
+# (IN_CLOSE_WRITE) or by renaming a temp file over the original (IN_MOVED_TO)
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_Q_OVERFLOW = 0x4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT_HEADER = 16
+WATCH_POLL_INTERVAL = 1.0
+WATCH_DEBOUNCE = 0.3
+
+
+def open_inotify(directories: List[Path]) -> Optional[Tuple[int, Dict[int, Path]]]:
+    """Watch directories with Linux inotify through ctypes
+
+    Returns the inotify descriptor and a map of watch descriptors to
+    directories, or None where inotify is unavailable.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    import ctypes
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+
+    watches = {}
+    for directory in directories:
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            # e.g. fs.inotify.max_user_watches reached
+            os.close(fd)
+            return None
+        watches[wd] = directory
+    return fd, watches
+
+
+def read_inotify(fd: int, watches: Dict[int, Path], timeout: Optional[float]) -> set:
+    """Wait up to timeout seconds for inotify events; returns the changed paths
+
+    If the kernel queue overflowed, the watched directories themselves are
+    returned so the caller rescans them.
+    """
+    import select
+    import struct
+
+    ready, _, _ = select.select([fd], [], [], timeout)
+    if not ready:
+        return set()
+
+    data = os.read(fd, 64 * 1024)
+    changed = set()
+    offset = 0
+    while offset + INOTIFY_EVENT_HEADER <= len(data):
+        wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+        name = data[offset + INOTIFY_EVENT_HEADER:offset + INOTIFY_EVENT_HEADER + length].rstrip(b"\0")
+        offset += INOTIFY_EVENT_HEADER + length
+        if mask & IN_Q_OVERFLOW:
+            changed.update(watches.values())
+        elif wd in watches and name:
+            changed.add(watches[wd] / os.fsdecode(name))
+    return changed
+
+
+def snapshot_directories(directories: List[Path]) -> Dict[Path, Tuple[int, int]]:
+    """(mtime_ns, size) of every file directly in the directories"""
+    snapshot = {}
+    for directory in directories:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        info = entry.stat()
+                        snapshot[Path(entry.path)] = (info.st_mtime_ns, info.st_size)
+        except OSError:
+            continue
+    return snapshot
+
+
+def open_watch(directories: List[Path], poll: bool = False, interval: float = WATCH_POLL_INTERVAL) -> Dict:
+    """Start watching directories (not recursively), with inotify if possible"""
+    directories = list(dict.fromkeys(directories))
+    inotify = None if poll else open_inotify(directories)
+    return {
+        "directories": directories,
+        "inotify": inotify,
+        "snapshot": snapshot_directories(directories) if inotify is None else None,
+        "interval": interval,
+    }
+
+
+def close_watch(watch: Dict):
+    """Release the inotify descriptor, if any"""
+    if watch["inotify"] is not None:
+        os.close(watch["inotify"][0])
+
+
+def wait_for_changes(watch: Dict, timeout: Optional[float]) -> set:
+    """Paths created or modified in the watched directories within timeout
+
+    Without inotify the directories are polled: the wait is at most one
+    poll interval and changes are found by comparing snapshots.
+    """
+    if watch["inotify"] is not None:
+        return read_inotify(*watch["inotify"], timeout)
+
+    time.sleep(watch["interval"] if timeout is None else min(timeout, watch["interval"]))
+    snapshot = snapshot_directories(watch["directories"])
+    previous = watch["snapshot"]
+    watch["snapshot"] = snapshot
+    return {path for path, signature in snapshot.items() if previous.get(path) != signature}
+
+
+def expand_watch_changes(changed: set, directories: List[Path]) -> set:
+    """Replace a rescanned directory in a change set with the files in it"""
+    files = {path for path in changed if path not in directories}
+    for directory in changed & set(directories):
+        files.update(snapshot_directories([directory]))
+    return files
+
+
+def get_changed_versions(old: Dict, new: Dict, versions: List[str]) -> List[str]:
+    """Watched palette versions whose colors differ between two configs"""
+    return [version for version in versions
+            if version in new and old.get(version, {}).get("colors") != new[version]["colors"]]
+
+
+def install_watched_files(paths: List[Path]) -> List[Dict]:
+    """Install changed theme and UDL files; unchanged ones are skipped"""
+    themes = [path for path in paths if is_theme_file_name(path.name)]
+    udls = [path for path in paths if is_udl_file_name(path.name)]
+    if not themes and not udls:
+        return []
+    return install_many(themes, udls)
+
+
+def report_watch_results(action: str, results: List[Dict]):
+    """One line per batch of watch results, plus any failures"""
+    if not results:
+        return
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    summary = ", ".join(f"{number} {status}" for status, number in sorted(counts.items()))
+    console.print(f"[dim]{time.strftime('%H:%M:%S')}[/dim] {action}: {summary}")
+    for result in results:
+        if result["status"] == "failed":
+            name = Path(result.get("template") or result["source"]).name
+            console.print(f"[red]  • {name}: {result['error']}[/red]")
+
+
+@traced("watch_batch")
+def handle_watch_changes(changed: set, state: Dict):
+    """Re-render and reinstall what a debounced batch of changes affects
+
+    Templates that changed are rendered for every watched version; after a
+    palette edit, only the versions whose colors changed are rendered.
+    Changed theme and UDL files in the source folder are reinstalled.
+    """
+    templates = state["templates"]
+    changed_templates = [template for template in templates if template in changed]
+    render_versions = []
+
+    if state["palette_path"] in changed:
+        config = load_palette_config()
+        if config:
+            render_versions = get_changed_versions(state["config"], config, state["versions"])
+            if state["base"] in render_versions:
+                # Every output is mapped from the base palette
+                render_versions = [version for version in state["versions"] if version in config]
+            state["config"] = config
+        else:
+            console.print("[yellow][WARNING]  Keeping the last valid palettes until the errors are fixed[/yellow]")
+
+    config = state["config"]
+    versions = [version for version in state["versions"] if version in config]
+    results = []
+    if changed_templates and versions:
+        results += render_templates(changed_templates, versions, config, state["output_dir"], base=state["base"])
+    other_templates = [template for template in templates if template not in changed_templates]
+    if other_templates and render_versions:
+        results += render_templates(other_templates, render_versions, config, state["output_dir"],
+                                    base=state["base"])
+    report_watch_results("Rendered", results)
+
+    installs = []
+    if state["install"]:
+        installs = [Path(result["dest"]) for result in results if result["status"] == "rendered"]
+    if state["source_dir"] is not None:
+        installs += sorted(path for path in changed
+                           if path.parent == state["source_dir"] and path.is_file())
+    report_watch_results("Installed", install_watched_files(installs))
+
+
+@cli.command()
+@click.argument("versions", nargs=-1)
+@click.option("--file", "xml_files", multiple=True,
+              help="Template theme or UDL file, relative to Themes/ or absolute (repeatable) "
+                   "[default: StrawberryMilk.xml]")
+@click.option("--output-dir", "-o", type=click.Path(file_okay=False),
+              help="Folder for rendered files [default: Themes/rendered]")
+@click.option("--base", help="Palette version the templates are colored with; detected by default")
+@click.option("--source", "source_dir", type=click.Path(exists=True, file_okay=False),
+              help="Folder of themes and UDLs to reinstall on change [default: the source path]")
+@click.option("--no-install", is_flag=True, help="Only render; don't install rendered files into Notepad++")
+@click.option("--poll", is_flag=True, help="Poll for changes instead of using inotify (e.g. network drives)")
+@click.option("--interval", type=click.FloatRange(min=0.05), default=WATCH_POLL_INTERVAL, show_default=True,
+              help="Seconds between polls")
+@click.option("--debounce", type=click.FloatRange(min=0), default=WATCH_DEBOUNCE, show_default=True,
+              help="Seconds to wait for a burst of saves to settle")
+def watch(versions, xml_files, output_dir, base, source_dir, no_install, poll, interval, debounce):
+    """Re-render and reinstall themes whenever palettes or sources change
+
+    Watches color_config.json and the template files (re-rendering the
+    watched VERSIONS, all by default), plus the source folder, whose
+    changed theme and UDL files are reinstalled. Stop with Ctrl+C.
+    """
+    print_banner()
+
+    config = load_palette_config()
+    if not config:
+        sys.exit(1)
+    unknown = [version for version in list(versions) + [base] if version and version not in config]
+    if unknown:
+        console.print(f"[red]Error: Version(s) not found: {', '.join(unknown)}[/red]")
+        sys.exit(1)
+
+    templates = [THEMES_DIR / xml_file for xml_file in (xml_files or ["StrawberryMilk.xml"])]
+    missing = [str(template) for template in templates if not template.exists()]
+    if missing:
+        console.print(f"[red]Error: Template(s) not found: {', '.join(missing)}[/red]")
+        sys.exit(1)
+
+    source_path = Path(source_dir) if source_dir else get_source_path()
+    if source_path is not None and not source_path.is_dir():
+        console.print(f"[yellow][WARNING]  Source path not found, not watching it: {source_path}[/yellow]")
+        source_path = None
+    if (source_path is not None or not no_install) and not verify_notepad_installation():
+        sys.exit(1)
+
+    palette_path = (THEMES_DIR / "color_config.json").resolve()
+    state = {
+        "config": config,
+        "versions": list(versions) or list(config),
+        "base": base,
+        "templates": [template.resolve() for template in templates],
+        "palette_path": palette_path,
+        "output_dir": Path(output_dir).expanduser() if output_dir else THEMES_DIR / "rendered",
+        "source_dir": source_path.resolve() if source_path is not None else None,
+        "install": not no_install,
     }
 
-    for key, name in color_map.items():
-        if key in colors:
-            color = colors[key]
-            preview = f"[#{color}]######[/]"
-            table.add_row(name, f"#{color}", preview)
+    # Bring the outputs up to date once; later batches only redo what changed
+    handle_watch_changes(set(state["templates"]), state)
+
+    directories = [palette_path.parent] + [template.parent for template in state["templates"]]
+    if state["source_dir"] is not None:
+        directories.append(state["source_dir"])
+    watcher = open_watch(directories, poll, interval)
+
+    mode = "inotify" if watcher["inotify"] is not None else f"polling every {interval:g}s"
+    console.print(f"\n[cyan]Watching {len(watcher['directories'])} folder(s) ({mode}). Press Ctrl+C to stop.[/cyan]")
+    for directory in watcher["directories"]:
+        console.print(f"[dim]  {directory}[/dim]")
+
+    pending = set()
+    try:
+        while True:
+            changed = wait_for_changes(watcher, debounce if pending else None)
+            if changed:
+                pending |= changed
+                continue
+            if pending:
+                handle_watch_changes(expand_watch_changes(pending, watcher["directories"]), state)
+                pending = set()
+    except KeyboardInterrupt:
+        console.print("\n[cyan]Stopped watching[/cyan]")
+    finally:
+        close_watch(watcher)
+
+
+@cli.command()
+@click.argument("xml_file")
+@click.option("--base", help="Palette version the file is colored with; detected by default")
+@click.option("--output", "-o", type=click.Path(dir_okay=False),
+              help="Template path [default: the file's path plus .tmpl]")
+def template(xml_file, base, output):
+    """Convert a theme or UDL file into a {{token}} template for render"""
+    print_banner()
+
+    config = load_palette_config()
+    if not config:
+        sys.exit(1)
+
+    xml_path = THEMES_DIR / xml_file
+    if not xml_path.exists():
+        console.print(f"[red]Error: {xml_file} not found[/red]")
+        sys.exit(1)
+
+    content = xml_path.read_text(encoding='utf-8')
+    base = base or detect_template_version(content, config)
+    if base not in config:
+        console.print(f"[red]Error: Could not tell which palette {xml_path.name} uses; pass --base[/red]")
+        sys.exit(1)
+
+    tokenized, counts = tokenize_theme(content, config[base]["colors"])
+    template_path = Path(output).expanduser() if output else xml_path.with_name(xml_path.name + TEMPLATE_SUFFIX)
+    atomic_write_text(template_path, tokenized)
+    load_render_plan(template_path)
+
+    console.print(f"[green][OK] Wrote {template_path} from {base} colors[/green]")
+    for key, count in counts.items():
+        if count:
+            console.print(f"  {{{{{key}}}}}: {count}")
+    console.print(f"[dim]Render it with: mkpp render --all --file {template_path}[/dim]")
+
+
+@cli.command()
+@click.argument("repo_url")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=DEFAULT_INSTALL_JOBS, show_default=True,
+              help="Number of files to copy in parallel")
+@click.option("--force", is_flag=True, help="Copy every file, even if the installed copy is unchanged")
+@click.option("--include", multiple=True, help="Only install files matching this glob (repeatable)")
+@click.option("--exclude", multiple=True, help="Skip files matching this glob (repeatable)")
+@click.option("--atomic", is_flag=True, help="Install all files or none: roll back the batch if any copy fails")
+@click.option("--yes", "-y", is_flag=True, help="Install without asking for confirmation")
+def install_git(repo_url, jobs, force, include, exclude, atomic, yes):
+    """Install every theme and UDL file from a Git repository"""
+    print_banner()
+
+    if not verify_notepad_installation():
+        sys.exit(1)
+
+    repo_dir = get_repo_cache_dir(repo_url)
+    with repo_cache_lock(repo_dir):
+        if (repo_dir / ".git").exists():
+            console.print("[dim]Updating cached repository...[/dim]")
+        else:
+            console.print("[dim]Cloning repository...[/dim]")
+
+        if not clone_git_repo(repo_url, repo_dir):
+            console.print("[bold red][ERROR] Failed to clone repository[/bold red]")
+            sys.exit(1)
+
+        themes, udls = discover_files(repo_dir, recursive=True, include=list(include), exclude=list(exclude))
+        if not themes and not udls:
+            console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found in repository[/yellow]")
+            return
+        if report_name_clashes(themes, udls):
+            sys.exit(1)
+
+        console.print(f"\n[green]Found {len(themes)} theme(s) and {len(udls)} UDL file(s)[/green]")
+        if confirm("Install all files?", yes):
+            run_batch_install(themes, udls, jobs, force, atomic)
+
+
+def show_pack_contents(members: List[Dict]):
+    """Display one row per pack member"""
+    from rich.table import Table
+    from rich import box
+
+    table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    table.add_column("File", style="cyan")
+    table.add_column("Type", style="white")
+    table.add_column("Size", style="white", justify="right")
+    table.add_column("SHA-256", style="dim")
+    labels = {"theme": "Theme", "udl": "UDL", "palette": "Palettes"}
+    for member in members:
+        table.add_row(member["name"], labels[member["kind"]], format_file_size(member["size"]),
+                      member["sha256"][:16])
+    console.print(table)
+
+
+@cli.command()
+@click.argument("folder", type=click.Path(exists=True, file_okay=False))
+@click.option("--output", "-o", type=click.Path(dir_okay=False),
+              help="Archive path [default: the folder's name plus .mkpp]")
+@click.option("--recursive", "-r", is_flag=True, help="Also pack files in subfolders")
+@click.option("--include", multiple=True, help="Only pack files matching this glob (repeatable)")
+@click.option("--exclude", multiple=True, help="Skip files matching this glob (repeatable)")
+def pack(folder, output, recursive, include, exclude):
+    """Build a theme pack archive from a folder of themes, UDLs and palettes"""
+    print_banner()
+
+    folder_path = Path(folder).expanduser().resolve()
+    members, errors = collect_pack_members(folder_path, recursive, list(include), list(exclude))
+    if errors:
+        console.print(f"[red][ERROR] Can't build the pack, {len(errors)} problem(s):[/red]")
+        for error in errors:
+            console.print(f"  [red]•[/red] {error}")
+        sys.exit(1)
+    if not any(kind != "palette" for _, kind in members):
+        console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found[/yellow]")
+        sys.exit(1)
+
+    dest = Path(output).expanduser() if output else folder_path.parent / f"{folder_path.name}{PACK_SUFFIX}"
+    try:
+        toc = build_pack(dest, members)
+    except OSError as e:
+        console.print(f"[red][ERROR] Could not write {dest}: {e}[/red]")
+        sys.exit(1)
 
-    console.print(table)
+    counts = {kind: sum(1 for member in toc["members"] if member["kind"] == kind)
+              for kind in ("theme", "udl", "palette")}
+    console.print(f"[green][OK] Packed {counts['theme']} theme(s), {counts['udl']} UDL file(s)"
+                  f"{' and palettes' if counts['palette'] else ''} "
+                  f"({format_file_size(dest.stat().st_size)})[/green]")
+    click.echo(f"Archive: {dest}")
+
+
+@cli.command(name="install-pack")
+@click.argument("archive", type=click.Path(exists=True, dir_okay=False))
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=DEFAULT_INSTALL_JOBS, show_default=True,
+              help="Number of files to write in parallel")
+@click.option("--force", is_flag=True, help="Write every file, even if the installed copy is unchanged")
+@click.option("--atomic", is_flag=True, help="Install all files or none: roll back the batch if any write fails")
+@click.option("--palettes", is_flag=True,
+              help="Also add the pack's palette versions to color_config.json (--force replaces existing ones)")
+@click.option("--list", "list_only", is_flag=True, help="Show the pack's contents without installing")
+@click.option("--validate-only", is_flag=True,
+              help="Only check the pack's checksums and files; exits with status 1 if any is invalid")
+def install_pack_cmd(archive, jobs, force, atomic, palettes, list_only, validate_only):
+    """Install the themes and UDL files in a theme pack archive"""
+    print_banner()
+    archive_path = Path(archive).expanduser().resolve()
 
-def show_palette_editor():
-    """Display palette editor menu"""
-    while True:
-        config = load_palette_config()
+    if validate_only:
+        try:
+            with open_pack(archive_path) as (view, toc):
+                names = [member["name"] for member in toc["members"]]
+                invalid = verify_pack_checksums(view, toc["members"])
+                members = [member for member in toc["members"]
+                           if member["kind"] != "palette" and member["name"] not in invalid]
+                invalid.update(validate_pack_members(view, members))
+        except (OSError, ValueError) as e:
+            console.print(f"[red][ERROR] {archive_path.name}: {e}[/red]")
+            sys.exit(1)
+        if not show_validation_report(names, invalid):
+            sys.exit(1)
+        return
 
-        console.print("\n[bold cyan]=== Palette Editor ===[/bold cyan]\n")
+    if list_only:
+        try:
+            with open_pack(archive_path) as (_, toc):
+                members = toc["members"]
+        except (OSError, ValueError) as e:
+            console.print(f"[red][ERROR] {archive_path.name}: {e}[/red]")
+            sys.exit(1)
+        show_pack_contents(members)
+        return
 
-        table = Table(show_header=False, box=box.SIMPLE)
-        table.add_column("Option", style="cyan", width=6)
-        table.add_column("Description", style="white")
+    if not verify_notepad_installation():
+        sys.exit(1)
 
-        table.add_row("1", "Edit StrawberryMilk Classic (ver_001)")
-        table.add_row("2", "Edit StrawberryMilk Modern (ver_002)")
-        table.add_row("3", "Edit StrawberryMilk High Contrast (ver_003)")
-        table.add_row("4", "Preview All Palettes")
-        table.add_row("5", "Apply Theme to XML")
-        table.add_row("b", "Back to Main Menu")
+    try:
+        results, palette_json = install_pack(archive_path, jobs, force, atomic)
+    except (OSError, ValueError) as e:
+        console.print(f"[red][ERROR] {archive_path.name}: {e}[/red]")
+        sys.exit(1)
+    show_install_summary(results)
 
-        console.print(table)
+    if palettes and palette_json is not None:
+        merged = merge_pack_palettes(palette_json, replace=force)
+        if merged is None:
+            sys.exit(1)
+        added, kept = merged
+        if added:
+            console.print(f"[green][OK] Added palette(s): {', '.join(added)}[/green]")
+        if kept:
+            console.print(f"[dim]Kept existing palette(s): {', '.join(kept)} (use --force to replace)[/dim]")
+    elif palette_json is not None:
+        console.print("[dim]This pack has palettes; add them with --palettes[/dim]")
+
+    if any(result["status"] == "failed" for result in results):
+        sys.exit(1)
 
-        choice = Prompt.ask(
-            "\n[bold yellow]Select option[/bold yellow]",
-            choices=["1", "2", "3", "4", "5", "b"],
-            default="b"
-        )
 
-        if choice == "1":
-            edit_palette("ver_001", config)
-        elif choice == "2":
-            edit_palette("ver_002", config)
-        elif choice == "3":
-            edit_palette("ver_003", config)
-        elif choice == "4":
-            preview_all_palettes(config)
-        elif choice == "5":
-            apply_theme_to_xml()
-        elif choice == "b":
-            break
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="Only report what would be removed")
+def gc(dry_run):
+    """Remove store objects that no installed theme or UDL links to"""
+    print_banner()
 
-def edit_palette(version: str, config: Dict):
-    """Edit a specific palette"""
-    if version not in config:
-        console.print(f"[red]Error: Version '{version}' not found[/red]")
-        return
+    kept, removed, freed = gc_store(dry_run)
+    if dry_run:
+        console.print(f"[cyan]Would remove {removed} object(s), freeing {format_file_size(freed)}; "
+                      f"{kept} in use[/cyan]")
+    else:
+        console.print(f"[green][OK] Removed {removed} object(s), freed {format_file_size(freed)}; "
+                      f"{kept} in use[/green]")
 
-    palette = config[version]
-    colors = palette["colors"]
 
-    console.print(f"\n[bold cyan]Editing {palette['name']}[/bold cyan]")
-    console.print(f"[dim]{palette['description']}[/dim]\n")
+def read_repo_manifest(path: Path) -> List[str]:
+    """Repository URLs listed in a manifest file, one per line; # starts a comment"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line.split('#', 1)[0].strip() for line in f)
+        return [line for line in lines if line]
 
-    # Show current colors
-    show_color_preview(colors)
 
-    while True:
-        console.print(f"\n[bold yellow]Edit {version} Colors:[/bold yellow]")
+async def fetch_repo(repo_url: str, semaphore, install_lock, timeout: float, install: bool,
+                     jobs: int, force: bool, include: List[str], exclude: List[str]) -> Dict:
+    """Clone or update one repository, then discover and install its files
 
-        table = Table(show_header=False, box=box.SIMPLE)
-        table.add_column("Option", style="cyan", width=6)
-        table.add_column("Description", style="white")
+    Clones are limited by ``semaphore``; discovery and install run on
+    executor threads as soon as this repository is ready, while other
+    clones carry on. ``install_lock`` keeps installs one at a time, because
+    each one rewrites the shared install manifest. The repository's lock
+    file is held throughout (see repo_cache_lock).
+    """
+    import asyncio
+    import subprocess
+
+    result = {"url": repo_url, "status": "failed", "error": None, "themes": 0, "udls": 0,
+              "installed": 0, "skipped": 0, "failed": 0, "seconds": 0.0}
+    dest = get_repo_cache_dir(repo_url)
+    loop = asyncio.get_running_loop()
+
+    # Held through install, so another mkpp process can't reset the checkout mid-copy
+    async with repo_cache_lock_async(dest):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(clone_git_repo_async(repo_url, dest), timeout)
+            except asyncio.TimeoutError:
+                result["error"] = f"Timed out after {timeout:g}s"
+            except subprocess.CalledProcessError as e:
+                lines = (e.stderr or b"").decode('utf-8', 'replace').strip().splitlines()
+                fatal = [line for line in lines if line.startswith(("fatal:", "error:"))]
+                result["error"] = (fatal or lines or [f"git exited with status {e.returncode}"])[0]
+            except FileNotFoundError:
+                result["error"] = "Git not installed"
+            except OSError as e:
+                result["error"] = str(e)
+            result["seconds"] = time.perf_counter() - start
+
+        if result["error"]:
+            console.print(f"[red][ERROR] {repo_url}: {result['error']}[/red]")
+            return result
+
+        themes, udls = await loop.run_in_executor(
+            None, lambda: discover_files(dest, recursive=True, include=include, exclude=exclude))
+        result.update(themes=len(themes), udls=len(udls), status="fetched")
+        clashes = find_name_clashes(themes) + find_name_clashes(udls)
+        if clashes:
+            result.update(status="failed", error=clashes[0])
+            console.print(f"[red][ERROR] {repo_url}: {clashes[0]}[/red]")
+            return result
+
+        if install and (themes or udls):
+            async with install_lock:
+                installs = await loop.run_in_executor(None, lambda: install_many(themes, udls, jobs, force))
+            for status in ("installed", "skipped", "failed"):
+                result[status] = sum(1 for install_result in installs if install_result["status"] == status)
+            result["status"] = "failed" if result["failed"] else "installed"
+            if result["failed"]:
+                result["error"] = next(r["error"] for r in installs if r["status"] == "failed")
+
+        console.print(f"[green][OK] {repo_url}: {len(themes)} theme(s), {len(udls)} UDL file(s) "
+                      f"in {result['seconds']:.1f}s[/green]")
+        return result
+
+
+async def fetch_repos(repo_urls: List[str], jobs: int, timeout: float, install: bool, copy_jobs: int,
+                      force: bool, include: List[str], exclude: List[str]) -> List[Dict]:
+    """Fetch many repositories concurrently, at most ``jobs`` clones at a time"""
+    import asyncio
+
+    semaphore = asyncio.Semaphore(jobs)
+    install_lock = asyncio.Lock()
+    return await asyncio.gather(*(
+        fetch_repo(repo_url, semaphore, install_lock, timeout, install, copy_jobs, force, include, exclude)
+        for repo_url in repo_urls
+    ))
+
+
+def show_fetch_summary(results: List[Dict]):
+    """Display one row per fetched repository"""
+    from rich.table import Table
+    from rich import box
+
+    table = Table(title="Fetch Summary", box=box.ROUNDED)
+    table.add_column("Repository", style="cyan", overflow="fold")
+    table.add_column("Themes", justify="right")
+    table.add_column("UDLs", justify="right")
+    table.add_column("Installed", style="green", justify="right")
+    table.add_column("Skipped", style="dim", justify="right")
+    table.add_column("Failed", style="red", justify="right")
+    table.add_column("Clone", justify="right")
+    table.add_column("Status")
+
+    for result in results:
+        status = "[red]failed[/red]" if result["status"] == "failed" else f"[green]{result['status']}[/green]"
+        table.add_row(result["url"], str(result["themes"]), str(result["udls"]), str(result["installed"]),
+                      str(result["skipped"]), str(result["failed"]), f"{result['seconds']:.1f}s", status)
 
-        table.add_row("1", "Edit Background Colors")
-        table.add_row("2", "Edit Text Colors")
-        table.add_row("3", "Edit Accent Colors")
-        table.add_row("4", "Preview Changes")
-        table.add_row("5", "Save Palette")
-        table.add_row("b", "Back to Palette Editor")
+    console.print()
+    console.print(table)
 
-        console.print(table)
 
-        choice = Prompt.ask(
-            "\n[bold yellow]Select option[/bold yellow]",
-            choices=["1", "2", "3", "4", "5", "b"],
-            default="b"
-        )
+@cli.command()
+@click.argument("repo_urls", nargs=-1)
+@click.option("--manifest", "-m", type=click.Path(exists=True, dir_okay=False),
+              help="File listing repository URLs, one per line")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=DEFAULT_FETCH_JOBS, show_default=True,
+              help="Number of repositories to clone at the same time")
+@click.option("--timeout", type=click.FloatRange(min=1), default=DEFAULT_FETCH_TIMEOUT, show_default=True,
+              help="Seconds allowed for each repository's clone or update")
+@click.option("--copy-jobs", type=click.IntRange(min=1), default=DEFAULT_INSTALL_JOBS, show_default=True,
+              help="Number of files to copy in parallel per repository")
+@click.option("--force", is_flag=True, help="Copy every file, even if the installed copy is unchanged")
+@click.option("--include", multiple=True, help="Only install files matching this glob (repeatable)")
+@click.option("--exclude", multiple=True, help="Skip files matching this glob (repeatable)")
+@click.option("--no-install", is_flag=True, help="Only clone or update the repositories")
+def fetch(repo_urls, manifest, jobs, timeout, copy_jobs, force, include, exclude, no_install):
+    """Clone or update many Git repositories at once and install their files
+
+    Each repository is installed as soon as its own clone finishes.
+    """
+    import asyncio
 
-        if choice == "1":
-            edit_background_colors(colors)
-        elif choice == "2":
-            edit_text_colors(colors)
-        elif choice == "3":
-            edit_accent_colors(colors)
-        elif choice == "4":
-            show_color_preview(colors)
-        elif choice == "5":
-            if save_palette_config(config):
-                console.print(f"[green]Saved {version} palette[/green]")
-        elif choice == "b":
-            break
+    print_banner()
 
-def edit_background_colors(colors: Dict):
-    """Edit background colors"""
-    console.print("\n[bold cyan]Background Colors:[/bold cyan]")
+    urls = list(repo_urls)
+    if manifest:
+        try:
+            urls += read_repo_manifest(Path(manifest))
+        except OSError as e:
+            console.print(f"[red][ERROR] Could not read {manifest}: {e}[/red]")
+            sys.exit(1)
+    # URLs that share a checkout folder are fetched once
+    unique = {}
+    for url in urls:
+        unique.setdefault(get_repo_cache_dir(url), url.strip().rstrip('/'))
+    urls = list(unique.values())
+    if not urls:
+        console.print("[red]Error: Give one or more repository URLs, or --manifest[/red]")
+        sys.exit(1)
 
-    bg_colors = {
-        "bg_primary": "Primary Background",
-        "bg_secondary": "Secondary Background",
-        "bg_surface": "Surface Background",
-        "bg_surface_alt": "Alternative Surface"
-    }
+    if not no_install and not verify_notepad_installation():
+        sys.exit(1)
 
-    for key, name in bg_colors.items():
-        current = colors.get(key, "000000")
-        console.print(f"\n[cyan]{name}:[/cyan] #{current}")
+    if sys.platform == "win32" and sys.version_info < (3, 8):
+        # Only the proactor loop can run subprocesses on Windows
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-        new_color = Prompt.ask(
-            f"Enter new color (hex, no #)",
-            default=current
-        )
+    console.print(f"[dim]Fetching {len(urls)} repositories, {min(jobs, len(urls))} at a time...[/dim]")
+    results = asyncio.run(fetch_repos(urls, jobs, timeout, not no_install, copy_jobs, force,
+                                      list(include), list(exclude)))
+    show_fetch_summary(results)
 
-        if new_color and len(new_color) == 6:
-            colors[key] = new_color.upper()
+    failed = [result for result in results if result["status"] == "failed"]
+    for result in failed:
+        if result["failed"]:
+            console.print(f"[red]  • {result['url']}: {result['error']}[/red]")
+    if failed:
+        sys.exit(1)
 
-def edit_text_colors(colors: Dict):
-    """Edit text colors"""
-    console.print("\n[bold cyan]Text Colors:[/bold cyan]")
 
-    text_colors = {
-        "text_primary": "Primary Text",
-        "text_secondary": "Secondary Text",
-        "text_muted": "Muted Text"
-    }
+@palette.command()
+@click.argument("versions", nargs=-1)
+def show(versions):
+    """Preview palette versions (all by default)"""
+    print_banner()
 
-    for key, name in text_colors.items():
-        current = colors.get(key, "000000")
-        console.print(f"\n[cyan]{name}:[/cyan] #{current}")
+    config = load_palette_config()
+    unknown = [version for version in versions if version not in config]
+    if not config or unknown:
+        if unknown:
+            console.print(f"[red]Error: Version(s) not found: {', '.join(unknown)}[/red]")
+        sys.exit(1)
+    preview_all_palettes({version: config[version] for version in versions} if versions else config)
 
-        new_color = Prompt.ask(
-            f"Enter new color (hex, no #)",
-            default=current
-        )
 
-        if new_color and len(new_color) == 6:
-            colors[key] = new_color.upper()
+@palette.command(name="set")
+@click.argument("version")
+@click.argument("assignments", nargs=-1, required=True)
+def set_colors(version, assignments):
+    """Set palette colors, e.g. `mkpp palette set ver_002 bg_primary=120A14 text_muted=+10%`
 
-def edit_accent_colors(colors: Dict):
-    """Edit accent colors"""
-    console.print("\n[bold cyan]Accent Colors:[/bold cyan]")
+    Values are RRGGBB, #RRGGBB or a lightness shift of the current color.
+    """
+    print_banner()
 
-    accent_colors = {
-        "accent_primary": "Primary Accent",
-        "accent_secondary": "Secondary Accent",
-        "accent_light": "Light Accent"
-    }
+    config = load_palette_config()
+    if version not in config:
+        console.print(f"[red]Error: Version '{version}' not found[/red]")
+        sys.exit(1)
 
-    for key, name in accent_colors.items():
-        current = colors.get(key, "000000")
-        console.print(f"\n[cyan]{name}:[/cyan] #{current}")
+    colors = config[version]["colors"]
+    errors = []
+    for assignment in assignments:
+        key, sep, value = assignment.partition("=")
+        parsed = parse_color_input(value, colors.get(key, "")) if sep and key else None
+        if parsed is None:
+            errors.append(assignment)
+            continue
+        colors[key] = parsed
+
+    if errors:
+        console.print(f"[red]Error: Not KEY=COLOR: {', '.join(errors)}[/red]")
+        sys.exit(1)
+    if not save_palette_config(config):
+        sys.exit(1)
+    console.print(f"[green][OK] Updated {len(assignments)} color(s) in {version}[/green]")
+    console.print(f"[dim]Apply it with: mkpp apply {version}[/dim]")
 
-        new_color = Prompt.ask(
-            f"Enter new color (hex, no #)",
-            default=current
-        )
 
-        if new_color and len(new_color) == 6:
-            colors[key] = new_color.upper()
+def load_run_plan(plan_file: Path) -> Tuple[List[List[str]], bool]:
+    """Read a plan's steps as argument lists, plus its keep_going setting
 
-def preview_all_palettes(config: Dict):
-    """Preview all available palettes"""
-    console.print("\n[bold cyan]All Available Palettes:[/bold cyan]\n")
+    A plan is a JSON list of steps, or an object with "steps" and an
+    optional "keep_going". Each step is a list of arguments, e.g.
+    ["install", "theme.xml"], or a command line string.
+    """
+    import json
+    import shlex
 
-    for version, palette in config.items():
-        console.print(f"[bold magenta]{palette['name']} ({version})[/bold magenta]")
-        console.print(f"[dim]{palette['description']}[/dim]")
-        show_color_preview(palette["colors"])
-        console.print()
+    with open(plan_file, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
 
-def apply_theme_to_xml():
-    """Apply a palette to the XML theme file"""
-    config = load_palette_config()
+    if isinstance(plan, dict):
+        steps, keep_going = plan.get("steps"), bool(plan.get("keep_going", False))
+    else:
+        steps, keep_going = plan, False
+    if not isinstance(steps, list):
+        raise ValueError("a plan is a list of steps, or an object with a \"steps\" list")
 
-    console.print("\n[bold cyan]Apply Theme to XML:[/bold cyan]\n")
+    parsed = []
+    for number, step in enumerate(steps, 1):
+        if isinstance(step, str):
+            # Keep Windows backslashes as they are
+            step = shlex.split(step, posix=os.name != 'nt')
+        if not isinstance(step, list) or not step or not all(isinstance(arg, str) for arg in step):
+            raise ValueError(f"step {number} must be a non-empty list of strings or a command line")
+        parsed.append(step)
+    return parsed, keep_going
 
-    table = Table(show_header=False, box=box.SIMPLE)
-    table.add_column("Option", style="cyan", width=6)
-    table.add_column("Description", style="white")
 
-    # Create numbered options for better UX
-    version_list = list(config.keys())
-    for i, version in enumerate(version_list, 1):
-        palette = config[version]
-        table.add_row(str(i), palette["name"])
+@cli.command()
+@click.argument("plan_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--keep-going", is_flag=True, help="Run the remaining steps after a step fails")
+@click.pass_context
+def run(ctx, plan_file, keep_going):
+    """Run a JSON plan of mkpp commands in one process, without prompts"""
+    global SHOW_BANNER, ASSUME_YES
+    from rich.table import Table
+    from rich import box
 
-    table.add_row("b", "Back to Palette Editor")
+    print_banner()
 
-    console.print(table)
+    try:
+        steps, plan_keep_going = load_run_plan(Path(plan_file))
+    except (OSError, ValueError) as e:
+        console.print(f"[red][ERROR] Invalid plan {plan_file}: {e}[/red]")
+        sys.exit(1)
+    keep_going = keep_going or plan_keep_going
+
+    # Check every command name before running anything
+    commands = []
+    for step in steps:
+        command = cli.get_command(ctx, step[0])
+        if command is None or step[0] == "run":
+            console.print(f"[red][ERROR] Unknown or unsupported command in plan: {step[0]}[/red]")
+            sys.exit(1)
+        commands.append(command)
 
-    # Create choices list with numbers
-    choices = [str(i) for i in range(1, len(version_list) + 1)] + ["b"]
+    results = []
+    previous = SHOW_BANNER, ASSUME_YES
+    SHOW_BANNER, ASSUME_YES = False, True
+    try:
+        for number, (step, command) in enumerate(zip(steps, commands), 1):
+            console.print(f"\n[bold cyan]Step {number}/{len(steps)}: mkpp {' '.join(step)}[/bold cyan]")
+            start = time.perf_counter()
+            ok = True
+            try:
+                with trace_span(f"mkpp {step[0]}", f"step {number}"), \
+                        command.make_context(step[0], step[1:], parent=ctx) as step_ctx:
+                    command.invoke(step_ctx)
+            except SystemExit as e:
+                ok = e.code in (0, None)
+            except click.exceptions.Exit as e:
+                ok = e.exit_code == 0
+            except click.ClickException as e:
+                e.show()
+                ok = False
+            except click.Abort:
+                ok = False
+            results.append((number, " ".join(step), ok, time.perf_counter() - start))
+            if not ok and not keep_going:
+                break
+    finally:
+        SHOW_BANNER, ASSUME_YES = previous
+
+    table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    table.add_column("Step", style="cyan", justify="right")
+    table.add_column("Command", style="white")
+    table.add_column("Status", style="white")
+    table.add_column("Time", style="white", justify="right")
+    for number, command_line, ok, elapsed in results:
+        table.add_row(str(number), command_line, "[green]ok[/green]" if ok else "[red]failed[/red]", f"{elapsed:.2f}s")
+    console.print()
+    console.print(table)
 
-    choice = Prompt.ask(
-        "\n[bold yellow]Select palette to apply[/bold yellow]",
-        choices=choices,
-        default="b"
-    )
+    failed = sum(1 for result in results if not result[2])
+    skipped = len(steps) - len(results)
+    if failed or skipped:
+        console.print(f"[red][ERROR] {failed} step(s) failed, {skipped} not run[/red]")
+        sys.exit(1)
+    console.print(f"[green][OK] All {len(steps)} step(s) completed[/green]")
 
-    if choice != "b" and choice.isdigit():
-        index = int(choice) - 1
-        if 0 <= index < len(version_list):
-            version = version_list[index]
-            if update_theme_xml(version):
-                console.print(f"\n[green]Successfully applied {config[version]['name']} to StrawberryMilk.xml[/green]")
-                console.print("[dim]If not already installed, use: mkpp install Themes/StrawberryMilk.xml[/dim]")
 
 @cli.command()
-def themes():
+@click.option("--refresh", is_flag=True, help="Rescan the themes folder instead of trusting the index")
+@click.option("--json", "as_json", is_flag=True, help="Print the list as JSON")
+def themes(refresh, as_json):
     """List installed themes"""
-    print_banner()
-    list_themes()
+    if not as_json:
+        print_banner()
+    list_themes(refresh, as_json, pause=False)
 
 
 @cli.command()
-def udls():
+@click.option("--refresh", is_flag=True, help="Rescan the UDL folder instead of trusting the index")
+@click.option("--json", "as_json", is_flag=True, help="Print the list as JSON")
+def udls(refresh, as_json):
     """List installed UDL files"""
+    if not as_json:
+        print_banner()
+    list_udls(refresh, as_json, pause=False)
+
+
+@cli.command(name="diff")
+@click.argument("old_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("new_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Save the changes as a patch for mkpp patch")
+@click.option("--json", "as_json", is_flag=True, help="Print the patch as JSON")
+def diff_cmd(old_file, new_file, output, as_json):
+    """Show what changed between two themes or UDL files"""
+    import hashlib
+    import json
+
+    old_path, new_path = Path(old_file), Path(new_file)
+    old_data = old_path.read_bytes()
+    old_text = old_data.decode('utf-8', errors='replace')
+    changes = diff_themes(old_text, new_path.read_text(encoding='utf-8', errors='replace'))
+    patch = {"mkpp_patch": PATCH_FORMAT, "base": old_path.name,
+             "base_sha256": hashlib.sha256(old_data).hexdigest(), "target": new_path.name}
+    patch.update(changes)
+
+    if as_json:
+        click.echo(json.dumps(patch, indent=1, ensure_ascii=False))
+    else:
+        print_banner()
+        if changes:
+            show_theme_diff(changes, old_text)
+        console.print(f"\n[dim]{count_patch_changes(changes)} change(s)[/dim]")
+
+    if output:
+        atomic_write_text(Path(output), json.dumps(patch, indent=1, ensure_ascii=False))
+        if not as_json:
+            console.print(f"[green][OK] Patch saved to {output}[/green]")
+
+
+@cli.command(name="patch")
+@click.argument("base_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("patch_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", "-o", type=click.Path(dir_okay=False),
+              help="Where to write the result [default: the patch's target name beside the base]")
+@click.option("--force", is_flag=True, help="Apply even if the base differs from the one the patch was made from")
+def patch_cmd(base_file, patch_file, output, force):
+    """Rebuild a theme variant from a base file and a patch"""
+    import hashlib
+    import json
+
+    print_banner()
+    base_path = Path(base_file)
+
+    try:
+        with open(patch_file, 'r', encoding='utf-8') as f:
+            patch = json.load(f)
+    except ValueError as e:
+        console.print(f"[red][ERROR] {patch_file} is not a valid patch: {e}[/red]")
+        sys.exit(1)
+    if not isinstance(patch, dict) or patch.get("mkpp_patch") != PATCH_FORMAT:
+        console.print(f"[red][ERROR] {patch_file} is not an mkpp patch (format {PATCH_FORMAT})[/red]")
+        sys.exit(1)
+
+    base_data = base_path.read_bytes()
+    if patch.get("base_sha256") not in (None, hashlib.sha256(base_data).hexdigest()):
+        if not force:
+            console.print(f"[red][ERROR] {base_path.name} is not the base this patch was made from "
+                          f"({patch.get('base')}); use --force to apply anyway[/red]")
+            sys.exit(1)
+        console.print(f"[yellow][WARNING]  Base differs from {patch.get('base')}; applying anyway[/yellow]")
+
+    try:
+        result = apply_theme_patch(base_data.decode('utf-8', errors='replace'), patch)
+    except ValueError as e:
+        console.print(f"[red][ERROR] Could not apply patch: {e}[/red]")
+        sys.exit(1)
+
+    dest = Path(output) if output else base_path.with_name(patch.get("target") or base_path.name)
+    atomic_write_text(dest, result)
+    console.print(f"[green][OK] Wrote {dest} ({count_patch_changes(patch)} change(s))[/green]")
+
+
+@cli.command()
+@click.option("--color", "-c", help="Hex color to look for, e.g. FF6BA8")
+@click.option("--lexer", "-l", help="Lexer (or UDL language) name or glob, e.g. rust")
+@click.option("--style", "-s", help="Style name glob, e.g. '*STRING*' (with --color)")
+@click.option("--attr", type=click.Choice(["fgColor", "bgColor"]), help="Only this attribute (with --color)")
+@click.option("--refresh", is_flag=True, help="Re-parse every installed file instead of only changed ones")
+@click.option("--json", "as_json", is_flag=True, help="Print the matches as JSON")
+def search(color, lexer, style, attr, refresh, as_json):
+    """Search installed themes by color or lexer"""
+    import json
+    from rich.table import Table
+    from rich import box
+
+    if not color and not lexer:
+        raise click.UsageError("Give --color, --lexer or both")
+    if color and not re.fullmatch(r'#?[0-9A-Fa-f]{6}', color):
+        raise click.BadParameter(f"'{color}' is not a 6-digit hex color", param_hint="--color")
+
+    db = open_search_index()
+    try:
+        update_search_index(db, refresh)
+        results = search_themes(db, color, lexer, style, attr)
+    finally:
+        db.close()
+
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+        return
+
     print_banner()
-    list_udls()
+    if not results:
+        console.print("[yellow]No matches[/yellow]")
+        return
+
+    if not color:
+        console.print(f"\n[green]{len(results)} file(s) define {lexer}:[/green]\n")
+        for result in results:
+            console.print(f"  • {result['file']}")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta", box=box.SIMPLE)
+    table.add_column("File", style="cyan")
+    table.add_column("Lexer", style="white")
+    table.add_column("Style", style="white")
+    table.add_column("Attribute", style="white")
+    for result in results:
+        table.add_row(result["file"], result["lexer"], result["style"], result["attr"])
+    console.print(table)
+    files = len({result["path"] for result in results})
+    console.print(f"[dim]{len(results)} match(es) in {files} file(s)[/dim]")
 
 
 @cli.command()
-@click.argument("directory", type=click.Path(exists=True))
-def scan(directory):
-    """Scan and install all themes and UDL files from a directory"""
+@click.argument("directory", type=click.Path(exists=True), required=False)
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=DEFAULT_INSTALL_JOBS, show_default=True,
+              help="Number of files to copy in parallel")
+@click.option("--force", is_flag=True, help="Copy every file, even if the installed copy is unchanged")
+@click.option("--recursive", "-r", is_flag=True, help="Also scan subfolders")
+@click.option("--include", multiple=True, help="Only install files matching this glob (repeatable)")
+@click.option("--exclude", multiple=True, help="Skip files matching this glob (repeatable)")
+@click.option("--max-depth", type=click.IntRange(min=0), help="Deepest subfolder level to scan (implies --recursive)")
+@click.option("--atomic", is_flag=True, help="Install all files or none: roll back the batch if any copy fails")
+@click.option("--yes", "-y", is_flag=True, help="Install without asking for confirmation")
+@click.option("--validate-only", is_flag=True,
+              help="Only check the files (e.g. in CI); exits with status 1 if any is invalid")
+def scan(directory, jobs, force, recursive, include, exclude, max_depth, atomic, yes, validate_only):
+    """Scan and install all themes and UDL files from a directory
+
+    DIRECTORY defaults to the source path set with `mkpp path --setpath`.
+    """
     print_banner()
+    if directory is None:
+        directory = get_source_path()
+        if directory is None:
+            console.print("[bold red][ERROR] No directory given and no source path set "
+                          "(mkpp path --setpath DIR)[/bold red]")
+            sys.exit(1)
     folder_path = Path(directory).expanduser().resolve()
 
-    if not verify_notepad_installation():
+    if not validate_only and not verify_notepad_installation():
         sys.exit(1)
 
-    # Find both themes and UDL files
-    themes = find_theme_files(folder_path)
-    udls = find_udl_files(folder_path)
+    # Find both themes and UDL files in one walk
+    themes, udls = discover_files(
+        folder_path,
+        recursive=recursive or max_depth is not None,
+        include=list(include),
+        exclude=list(exclude),
+        max_depth=max_depth
+    )
 
     if not themes and not udls:
         console.print("[yellow][WARNING]  No .xml theme files or .udl.xml files found[/yellow]")
         return
+    if report_name_clashes(themes, udls):
+        sys.exit(1)
+
+    if validate_only:
+        run_validate_only([(theme, "theme") for theme in themes] + [(udl, "udl") for udl in udls], jobs)
+        return
 
     # Show found files
     if themes:
@@ -996,25 +5464,8 @@ def scan(directory):
             console.print(f"  • {udl.name}")
 
     console.print()
-    if Confirm.ask("Install all?", default=True):
-        installed_themes = 0
-        installed_udls = 0
-
-        # Install themes
-        for theme in themes:
-            if install_theme(theme):
-                installed_themes += 1
-
-        # Install UDL files
-        for udl in udls:
-            if install_udl(udl):
-                installed_udls += 1
-
-        # Summary
-        if installed_themes > 0:
-            console.print(f"\n[green][OK] Installed {installed_themes}/{len(themes)} themes[/green]")
-        if installed_udls > 0:
-            console.print(f"[green][OK] Installed {installed_udls}/{len(udls)} UDL files[/green]")
+    if confirm("Install all?", yes):
+        run_batch_install(themes, udls, jobs, force, atomic)
 
 
 if __name__ == "__main__":
@@ -30,6 +30,9 @@ setup(
         "rich>=10.0.0",
         "requests>=2.25.0",
     ],
+    extras_require={
+        "fast": ["numpy>=1.20"],
+    },
     entry_points={
         "console_scripts": [
             "mkpp=mkpp_cli:cli",
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Benchmark mkpp's discovery, install and recolor hot paths
+
+Runs entirely offline against synthetic theme trees and stylers files in a
+temp folder; HOME/APPDATA are pointed there before mkpp_cli is imported,
+so DEFAULT_THEME_DIR, DEFAULT_UDL_DIR and ~/.mkpp never touch the real
+profile.
+
+    python tests/bench_hot_paths.py                      # quick run
+    python tests/bench_hot_paths.py --full               # adds 10k files / 20 MB
+    python tests/bench_hot_paths.py --save baseline.json
+    python tests/bench_hot_paths.py --compare baseline.json
+
+With --compare, exits with status 1 if any benchmark got slower than the
+baseline by more than --tolerance (default 1.5x).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEMPLATE = REPO_ROOT / "Themes" / "StrawberryMilk.xml"
+UDL_TEMPLATE = REPO_ROOT / "Themes" / "UDL" / "markdown.strawberrymilk.udl.xml"
+PALETTE_CONFIG = REPO_ROOT / "Themes" / "color_config.json"
+
+QUICK_TREE_SIZES = [10, 1000]
+FULL_TREE_SIZES = [10, 1000, 10000]
+QUICK_XML_SIZES = [70 * 1024, 1024 * 1024]
+FULL_XML_SIZES = [70 * 1024, 1024 * 1024, 20 * 1024 * 1024]
+INSTALL_THEME_SAMPLE = 100
+
+WORK_DIR = Path(tempfile.mkdtemp(prefix="mkpp-bench-"))
+os.environ["HOME"] = os.environ["USERPROFILE"] = str(WORK_DIR / "home")
+os.environ["APPDATA"] = str(WORK_DIR / "appdata")
+(WORK_DIR / "home").mkdir()
+(WORK_DIR / "appdata" / "Notepad++").mkdir(parents=True)
+
+sys.path.insert(0, str(REPO_ROOT))
+import mkpp_cli  # noqa: E402
+
+mkpp_cli.console.plain = True
+
+
+def timed(fn, repeat: int):
+    """Run fn repeat times with output silenced; returns timings in ms"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def make_small_xml(template: Path, section: str, size: int = 1024) -> bytes:
+    """A valid file of about size bytes: the template's first styles in one section"""
+    text = template.read_text(encoding="utf-8")
+    styles = re.findall(r'<WordsStyle\b[^>]*(?:/>|>[^<]*</WordsStyle>)', text)
+    body = ""
+    while len(body) < size and styles:
+        body += styles.pop(0) + "\n"
+    return (f'<?xml version="1.0" encoding="UTF-8" ?>\n<NotepadPlus>\n<{section} name="bench">\n'
+            f'{body}</{section}>\n</NotepadPlus>\n').encode("utf-8")
+
+
+def make_theme_tree(root: Path, count: int) -> Path:
+    """Create count files, three quarters themes and the rest UDLs, in subfolders"""
+    theme_xml = make_small_xml(TEMPLATE, "LexerStyles")
+    udl_xml = make_small_xml(UDL_TEMPLATE, "UserLang")
+    for i in range(count):
+        folder = root / f"pack{i // 100:03d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        if i % 4 == 3:
+            (folder / f"lang{i:05d}.udl.xml").write_bytes(udl_xml)
+        else:
+            (folder / f"theme{i:05d}.xml").write_bytes(theme_xml)
+    # Top-level files for the non-recursive finders
+    for i in range(count):
+        name = f"top{i:05d}.udl.xml" if i % 4 == 3 else f"top{i:05d}.xml"
+        (root / name).write_bytes(udl_xml if i % 4 == 3 else theme_xml)
+    return root
+
+
+def make_stylers_xml(path: Path, size: int) -> Path:
+    """Write a stylers file of about size bytes by repeating real lexers"""
+    text = TEMPLATE.read_text(encoding="utf-8")
+    head, rest = text.split("<LexerStyles>", 1)
+    lexers, tail = rest.split("</LexerStyles>", 1)
+
+    parts = [head, "<LexerStyles>"]
+    written = len(head) + len(tail)
+    copy = 0
+    while written < size:
+        block = lexers.replace('<LexerType name="', f'<LexerType name="c{copy}_')
+        parts.append(block)
+        written += len(block)
+        copy += 1
+    parts += ["</LexerStyles>", tail]
+    path.write_text("".join(parts), encoding="utf-8")
+    return path
+
+
+def run_benchmarks(tree_sizes, xml_sizes):
+    results = {}
+
+    def record(name, timings):
+        results[name] = {"min_ms": min(timings), "median_ms": statistics.median(timings),
+                         "runs": len(timings)}
+        print(f"{name:<40} min {min(timings):10.2f} ms   median {statistics.median(timings):10.2f} ms")
+
+    for count in tree_sizes:
+        tree = make_theme_tree(WORK_DIR / f"tree{count}", count)
+        repeat = 5 if count <= 1000 else 2
+        record(f"find_theme_files[{count}]", timed(lambda: mkpp_cli.find_theme_files(tree), repeat))
+        record(f"find_udl_files[{count}]", timed(lambda: mkpp_cli.find_udl_files(tree), repeat))
+        record(f"discover_files_recursive[{count}]",
+               timed(lambda: mkpp_cli.discover_files(tree, recursive=True), repeat))
+
+        themes, udls = mkpp_cli.discover_files(tree)
+        candidates = [(theme, "theme") for theme in themes] + [(udl, "udl") for udl in udls]
+        record(f"validate_install_files[{count}]",
+               timed(lambda: mkpp_cli.validate_install_files(candidates), repeat))
+        # One-by-one installs rewrite the manifest each time, so cap them
+        sample = themes[:INSTALL_THEME_SAMPLE]
+        record(f"install_theme_each[{len(sample)}]",
+               timed(lambda: [mkpp_cli.install_theme(theme) for theme in sample], 1))
+        record(f"install_many_unchanged[{count}]", timed(lambda: mkpp_cli.install_many(themes, udls), 1))
+        record(f"install_many_forced[{count}]",
+               timed(lambda: mkpp_cli.install_many(themes, udls, force=True), 1))
+
+    themes_dir = WORK_DIR / "Themes"
+    themes_dir.mkdir()
+    shutil.copy2(PALETTE_CONFIG, themes_dir / "color_config.json")
+    mkpp_cli.THEMES_DIR = themes_dir
+
+    record("load_palette_config", timed(mkpp_cli.load_palette_config, 20))
+
+    for size in xml_sizes:
+        label = f"{size // 1024}KB" if size < 1024 * 1024 else f"{size // (1024 * 1024)}MB"
+        xml_path = make_stylers_xml(themes_dir / f"stylers_{label}.xml", size)
+        repeat = 5 if size <= 1024 * 1024 else 2
+        record(f"update_theme_xml[{label}]",
+               timed(lambda: mkpp_cli.update_theme_xml("ver_002", xml_path.name), repeat))
+
+    return results
+
+
+def compare(results, baseline, tolerance: float) -> bool:
+    ok = True
+    print(f"\nComparison against baseline (tolerance {tolerance:.2f}x):")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["min_ms"] / max(baseline[name]["min_ms"], 1e-6)
+        flag = "REGRESSION" if ratio > tolerance else "ok"
+        ok = ok and ratio <= tolerance
+        print(f"{name:<40} {ratio:6.2f}x  {flag}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="Include 10k-file trees and 20 MB stylers")
+    parser.add_argument("--save", type=Path, help="Write results as baseline JSON")
+    parser.add_argument("--compare", type=Path, help="Compare against a saved baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown factor")
+    args = parser.parse_args()
+
+    try:
+        results = run_benchmarks(
+            FULL_TREE_SIZES if args.full else QUICK_TREE_SIZES,
+            FULL_XML_SIZES if args.full else QUICK_XML_SIZES,
+        )
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.save:
+        args.save.write_text(json.dumps({
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, indent=2))
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["results"]
+        if not compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Check mkpp's import-time startup budget
+
+Run from the repository root:  python tests/bench_startup.py
+Exits with status 1 if importing mkpp_cli pulls in a deferred module or
+takes longer than the budget on top of a bare interpreter start.
+"""
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Milliseconds that `import mkpp_cli` may add to interpreter startup
+STARTUP_BUDGET_MS = 50
+RUNS = 15
+
+# Modules that must only be imported by the commands that need them
+DEFERRED_MODULES = [
+    "rich",
+    "rich.console",
+    "rich.panel",
+    "rich.prompt",
+    "rich.table",
+    "subprocess",
+    "shutil",
+    "json",
+    "tempfile",
+    "hashlib",
+    "concurrent.futures",
+    "sqlite3",
+    "numpy",
+]
+
+
+def best_time_ms(code: str) -> float:
+    """Fastest wall time of a fresh interpreter running code, in milliseconds"""
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def eagerly_imported_modules():
+    """Deferred modules that are loaded right after importing mkpp_cli"""
+    code = (
+        "import sys, mkpp_cli\n"
+        f"print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT,
+                            check=True, capture_output=True, text=True)
+    return result.stdout.split()
+
+
+def main() -> int:
+    # Warm up so the bytecode cache is in place
+    subprocess.run([sys.executable, "-c", "import mkpp_cli"], cwd=REPO_ROOT, check=True)
+
+    baseline = best_time_ms("pass")
+    with_mkpp = best_time_ms("import mkpp_cli")
+    overhead = with_mkpp - baseline
+    eager = eagerly_imported_modules()
+
+    print(f"interpreter start : {baseline:6.1f} ms")
+    print(f"import mkpp_cli   : {with_mkpp:6.1f} ms")
+    print(f"overhead          : {overhead:6.1f} ms (budget {STARTUP_BUDGET_MS} ms)")
+
+    ok = True
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        ok = False
+    if overhead > STARTUP_BUDGET_MS:
+        print("FAIL: startup budget exceeded")
+        ok = False
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
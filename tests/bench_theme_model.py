@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Check ThemeModel's memory budget when loading thousands of themes
+
+Run from the repository root:  python tests/bench_theme_model.py [--themes N]
+Writes N variants of StrawberryMilk.xml (each with its own colors) to a
+temp folder, loads them all with load_theme_models and exits with status 1
+if any model does not serialize back to its file's bytes or the models
+use more than the per-theme memory budget.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEMPLATE = REPO_ROOT / "Themes" / "StrawberryMilk.xml"
+
+# Average traced memory each loaded theme may take, in KiB. The template
+# itself is about 70 KiB of text.
+MEMORY_BUDGET_KB_PER_THEME = 32
+
+WORK_DIR = Path(tempfile.mkdtemp(prefix="mkpp-model-"))
+os.environ["HOME"] = os.environ["USERPROFILE"] = str(WORK_DIR / "home")
+os.environ["APPDATA"] = str(WORK_DIR / "appdata")
+(WORK_DIR / "home").mkdir()
+
+sys.path.insert(0, str(REPO_ROOT))
+import mkpp_cli  # noqa: E402
+
+
+def make_themes(folder: Path, count: int):
+    """Write count copies of the template, each with a few colors swapped"""
+    folder.mkdir(parents=True)
+    text = TEMPLATE.read_text(encoding="utf-8")
+    sources = sorted(set(value for _, value in mkpp_cli.COLOR_ATTR_RE.findall(text)))
+    rng = random.Random(0)
+    for i in range(count):
+        variant = text
+        for source in rng.sample(sources, 3):
+            variant = variant.replace(f'"{source}"', f'"{rng.randrange(0x1000000):06X}"')
+        (folder / f"theme{i:05d}.xml").write_text(variant, encoding="utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--themes", type=int, default=1000, help="Number of themes to load")
+    args = parser.parse_args()
+
+    try:
+        folder = WORK_DIR / "themes"
+        make_themes(folder, args.themes)
+        raw_kb = sum(path.stat().st_size for path in folder.iterdir()) / 1024
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        models = mkpp_cli.load_theme_models(folder)
+        elapsed = time.perf_counter() - start
+        used_kb = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+
+        mismatched = [path for path, model in models.items() if model.serialize() != Path(path).read_bytes()]
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    per_theme = used_kb / max(len(models), 1)
+    print(f"themes loaded : {len(models)} in {elapsed:.2f} s (traced)")
+    print(f"file size     : {raw_kb / 1024:8.1f} MiB")
+    print(f"model memory  : {used_kb / 1024:8.1f} MiB "
+          f"({per_theme:.1f} KiB per theme, budget {MEMORY_BUDGET_KB_PER_THEME} KiB)")
+
+    ok = True
+    if mismatched:
+        print(f"FAIL: {len(mismatched)} model(s) did not serialize to the original bytes")
+        ok = False
+    if per_theme > MEMORY_BUDGET_KB_PER_THEME:
+        print("FAIL: memory budget exceeded")
+        ok = False
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Shared fixtures: every test runs against a throwaway ~/.mkpp and Notepad++ profile"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Point HOME/APPDATA away from the real profile before mkpp_cli computes its paths
+_IMPORT_HOME = tempfile.mkdtemp(prefix="mkpp-tests-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = _IMPORT_HOME
+os.environ["APPDATA"] = _IMPORT_HOME
+
+sys.path.insert(0, str(REPO_ROOT))
+import mkpp_cli  # noqa: E402
+
+
+@pytest.fixture
+def mkpp_home(tmp_path, monkeypatch):
+    """Fresh config, store and Notepad++ folders for one test; returns their root"""
+    config_dir = tmp_path / "home" / ".mkpp"
+    config_dir.parent.mkdir()
+    notepad_dir = tmp_path / "appdata" / "Notepad++"
+    (notepad_dir / "themes").mkdir(parents=True)
+    (notepad_dir / "userDefineLangs").mkdir()
+
+    monkeypatch.setattr(mkpp_cli, "CONFIG_DIR", config_dir)
+    monkeypatch.setattr(mkpp_cli, "CONFIG_FILE", config_dir / "config.txt")
+    monkeypatch.setattr(mkpp_cli, "INSTALL_MANIFEST_FILE", config_dir / "install_manifest.json")
+    monkeypatch.setattr(mkpp_cli, "REPO_CACHE_DIR", config_dir / "repos")
+    monkeypatch.setattr(mkpp_cli, "INSTALLED_INDEX_FILE", config_dir / "installed_index.json")
+    monkeypatch.setattr(mkpp_cli, "SEARCH_INDEX_FILE", config_dir / "search_index.db")
+    monkeypatch.setattr(mkpp_cli, "STORE_DIR", config_dir / "store")
+    monkeypatch.setattr(mkpp_cli, "DEFAULT_THEME_DIR", notepad_dir / "themes")
+    monkeypatch.setattr(mkpp_cli, "DEFAULT_UDL_DIR", notepad_dir / "userDefineLangs")
+    monkeypatch.setattr(mkpp_cli, "DEDUPE_INSTALLS", False)
+    monkeypatch.setattr(mkpp_cli.console, "plain", True)
+    return tmp_path
+
+
+@pytest.fixture
+def themes_dir(tmp_path, monkeypatch):
+    """A copy of the bundled Themes folder, so tests can rewrite themes and palettes"""
+    copy = tmp_path / "Themes"
+    shutil.copytree(REPO_ROOT / "Themes", copy)
+    monkeypatch.setattr(mkpp_cli, "THEMES_DIR", copy)
+    return copy
+
+
+def make_theme_xml(name: str = "test", fg: str = "FF8FB8", bg: str = "FFF0F5") -> bytes:
+    """A small valid stylers file with one lexer"""
+    return (f'<?xml version="1.0" encoding="UTF-8" ?>\n<NotepadPlus>\n<LexerStyles>\n'
+            f'<LexerType name="{name}" desc="{name}" ext="">\n'
+            f'<WordsStyle name="DEFAULT" styleID="0" fgColor="{fg}" bgColor="{bg}" fontStyle="0" />\n'
+            f'</LexerType>\n</LexerStyles>\n</NotepadPlus>\n').encode("utf-8")
+
+
+def make_udl_xml(name: str = "test") -> bytes:
+    """A small valid UDL file"""
+    return (f'<?xml version="1.0" encoding="UTF-8" ?>\n<NotepadPlus>\n'
+            f'<UserLang name="{name}" ext="{name}">\n<Styles>\n'
+            f'<WordsStyle name="DEFAULT" fgColor="4A4A4A" bgColor="FFF0F5" />\n'
+            f'</Styles>\n</UserLang>\n</NotepadPlus>\n').encode("utf-8")
@@ -0,0 +1,131 @@
+"""Tests for structural theme diffs: patch(old, diff(old, new)) gives back new"""
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+import mkpp_cli
+
+THEME = (mkpp_cli.THEMES_DIR / "StrawberryMilk.xml").read_text(encoding="utf-8")
+UDL = (mkpp_cli.THEMES_DIR / "UDL" / "markdown.strawberrymilk.udl.xml").read_text(encoding="utf-8")
+
+PALETTE = {"text_primary": "505050", "text_muted": "707070", "bg_primary": "101010"}
+
+
+def edit_lines(text, edit):
+    """Apply edit to the list of lines that contain text and join them back"""
+    lines = text.split("\n")
+    edit(lines)
+    return "\n".join(lines)
+
+
+def line_index(lines, needle):
+    return next(i for i, line in enumerate(lines) if needle in line)
+
+
+def remove_line(needle):
+    return lambda lines: lines.pop(line_index(lines, needle))
+
+
+def add_line_after(needle, new_line):
+    def edit(lines):
+        i = line_index(lines, needle)
+        indent = lines[i][:len(lines[i]) - len(lines[i].lstrip())]
+        lines.insert(i + 1, indent + new_line)
+    return edit
+
+
+def remove_block(start, end):
+    def edit(lines):
+        first = line_index(lines, start)
+        last = first + line_index(lines[first:], end)
+        del lines[first:last + 1]
+    return edit
+
+
+def round_trip(old, new):
+    patch = mkpp_cli.diff_themes(old, new)
+    patched = mkpp_cli.apply_theme_patch(old, patch)
+    assert patched == new
+    assert mkpp_cli.diff_themes(patched, new) == {}
+    return patch
+
+
+def test_identical_files_have_an_empty_diff():
+    assert mkpp_cli.diff_themes(THEME, THEME) == {}
+    assert mkpp_cli.apply_theme_patch(THEME, {}) == THEME
+
+
+def test_recolor_round_trip_only_sets_attributes():
+    new, counts = mkpp_cli.recolor_by_roles(THEME, PALETTE)
+    patch = round_trip(THEME, new)
+    assert list(patch) == ["set"]
+    assert mkpp_cli.count_patch_changes(patch) == sum(counts.values())
+
+
+@pytest.mark.parametrize("edit", [
+    remove_line('name="NUMBER" styleID="2" fgColor="FF6BA8"'),
+    add_line_after('name="COMMENTLINE" styleID="1"',
+                   '<WordsStyle name="NEWSTYLE" styleID="16" fgColor="FF8DBD" bgColor="141415" />'),
+    remove_block('<LexerType name="batch"', '</LexerType>'),
+], ids=["remove-style", "add-style", "remove-lexer"])
+def test_structural_round_trip(edit):
+    round_trip(THEME, edit_lines(THEME, edit))
+
+
+def test_attribute_added_and_removed_round_trip():
+    python_default = '<WordsStyle name="DEFAULT" styleID="0" fgColor="E8C5D5" bgColor="141415" fontName="" ' \
+                     'fontStyle="0" fontSize=""></WordsStyle>'
+    start = THEME.index('<LexerType name="python"')
+    at = THEME.index(python_default, start)
+    edited = python_default.replace(' fontName=""', '').replace('fontSize=""', 'fontSize="" keywordClass="instre1"')
+    new = THEME[:at] + edited + THEME[at + len(python_default):]
+
+    patch = round_trip(THEME, new)
+    path = next(iter(patch["set"]))
+    assert patch["set"] == {path: {"keywordClass": "instre1"}}
+    assert patch["unset"] == {path: ["fontName"]}
+
+
+def test_udl_keyword_text_round_trip():
+    new = UDL.replace("00# 01 02((EOL))", "00// 01 02((EOL))", 1)
+    patch = round_trip(UDL, new)
+    assert list(patch) == ["text"]
+
+
+def test_patch_refuses_a_file_without_the_element():
+    patch = mkpp_cli.diff_themes(THEME, edit_lines(THEME, remove_line('name="NUMBER" styleID="2" fgColor="FF6BA8"')))
+    without_python = edit_lines(THEME, remove_block('<LexerType name="python"', '</LexerType>'))
+    with pytest.raises(ValueError, match="element not found"):
+        mkpp_cli.apply_theme_patch(without_python, patch)
+
+
+def test_diff_and_patch_commands_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(mkpp_cli.console, "plain", True)
+    old = tmp_path / "StrawberryMilk.xml"
+    new = tmp_path / "StrawberryMilk.Gray.xml"
+    old.write_text(THEME, encoding="utf-8")
+    new.write_text(mkpp_cli.recolor_by_roles(THEME, PALETTE)[0], encoding="utf-8")
+    patch_file = tmp_path / "gray.json"
+    runner = CliRunner()
+
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "diff", str(old), str(new), "-o", str(patch_file)])
+    assert result.exit_code == 0, result.output
+    assert json.loads(patch_file.read_text(encoding="utf-8"))["target"] == new.name
+
+    new_bytes = new.read_bytes()
+    new.unlink()
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "patch", str(old), str(patch_file)])
+    assert result.exit_code == 0, result.output
+    assert new.read_bytes() == new_bytes
+
+    old.write_text(THEME + "<!-- edited -->\n", encoding="utf-8")
+    out = tmp_path / "out.xml"
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "patch", str(old), str(patch_file), "-o", str(out)])
+    assert result.exit_code == 1
+    assert not out.exists()
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "patch", str(old), str(patch_file), "-o", str(out),
+                                          "--force"])
+    assert result.exit_code == 0, result.output
+    assert out.exists()
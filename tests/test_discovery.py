@@ -0,0 +1,70 @@
+"""Tests for theme/UDL discovery and the name clashes it reports"""
+
+from pathlib import Path
+
+import mkpp_cli
+from conftest import make_theme_xml, make_udl_xml
+
+
+def write_files(root: Path, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_udl_xml() if name.lower().endswith(".udl.xml") else make_theme_xml())
+
+
+def test_discover_files_splits_themes_and_udls(tmp_path):
+    write_files(tmp_path, ["a.xml", "b.udl.xml", "C.UDL.XML", "D.XML", "notes.txt",
+                           "sub/e.xml", ".git/f.xml"])
+
+    themes, udls = mkpp_cli.discover_files(tmp_path)
+    assert [p.name for p in themes] == ["D.XML", "a.xml"]
+    assert [p.name for p in udls] == ["C.UDL.XML", "b.udl.xml"]
+
+    themes, udls = mkpp_cli.discover_files(tmp_path, recursive=True)
+    assert sorted(p.name for p in themes) == ["D.XML", "a.xml", "e.xml"]
+
+
+def test_discover_files_filters_and_depth(tmp_path):
+    write_files(tmp_path, ["a.xml", "one/b.xml", "one/two/c.xml"])
+
+    themes, _ = mkpp_cli.discover_files(tmp_path, recursive=True, max_depth=1)
+    assert [p.name for p in themes] == ["a.xml", "b.xml"]
+
+    themes, _ = mkpp_cli.discover_files(tmp_path, recursive=True, exclude=["one/*"])
+    assert [p.name for p in themes] == ["a.xml"]
+
+    themes, _ = mkpp_cli.discover_files(tmp_path, recursive=True, include=["c.xml"])
+    assert [p.name for p in themes] == ["c.xml"]
+
+
+def test_udl_names_are_case_insensitive():
+    assert mkpp_cli.is_udl_file_name("Foo.UDL.XML")
+    assert not mkpp_cli.is_theme_file_name("Foo.UDL.XML")
+    assert mkpp_cli.is_theme_file_name("Foo.XML")
+    assert mkpp_cli.resolve_install_dest(Path("Foo.UDL.XML"), "udl").name == "Foo.UDL.XML"
+
+
+def test_recursive_discovery_reports_name_clashes(tmp_path):
+    write_files(tmp_path, ["dark/Theme.xml", "light/theme.xml", "dark/md.udl.xml",
+                           "light/md.udl.xml", "light/other.xml"])
+
+    themes, udls = mkpp_cli.discover_files(tmp_path, recursive=True)
+    clashes = mkpp_cli.find_name_clashes(themes)
+    assert len(clashes) == 1
+    assert "has the same name as" in clashes[0]
+    assert len(mkpp_cli.find_name_clashes(udls)) == 1
+    assert mkpp_cli.report_name_clashes(themes, udls)
+    assert not mkpp_cli.report_name_clashes([tmp_path / "light" / "other.xml"], [])
+
+
+def test_scan_refuses_clashing_files(mkpp_home, tmp_path):
+    from click.testing import CliRunner
+
+    source = tmp_path / "src"
+    write_files(source, ["dark/Theme.xml", "light/Theme.xml"])
+
+    result = CliRunner().invoke(mkpp_cli.cli, ["--no-banner", "scan", str(source), "-r", "--yes"])
+    assert result.exit_code == 1
+    assert "has the same name as" in result.output
+    assert not list(mkpp_cli.DEFAULT_THEME_DIR.iterdir())
@@ -0,0 +1,146 @@
+"""Tests for git sources, against a temporary bare repository served over file://"""
+
+import asyncio
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+import mkpp_cli
+from conftest import make_theme_xml, make_udl_xml
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+REPO_FILES = {
+    "Pink.xml": make_theme_xml("pink"),
+    "themes/dark/Night.xml": make_theme_xml("night"),
+    "themes/light/Day.xml": make_theme_xml("day"),
+    "udl/markdown.udl.xml": make_udl_xml("markdown"),
+    "README.md": b"# Themes\n",
+    "screenshots/preview.png": b"\x89PNG\r\n\x1a\n" + b"\0" * 64,
+}
+
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def bare_repo(tmp_path, monkeypatch):
+    """A bare repository with themes in subfolders and a few other files; returns its file:// URL"""
+    for name, value in (("NAME", "mkpp tests"), ("EMAIL", "tests@example.com")):
+        monkeypatch.setenv(f"GIT_AUTHOR_{name}", value)
+        monkeypatch.setenv(f"GIT_COMMITTER_{name}", value)
+
+    work = tmp_path / "work"
+    for name, data in REPO_FILES.items():
+        (work / name).parent.mkdir(parents=True, exist_ok=True)
+        (work / name).write_bytes(data)
+    git("init", "-q", str(work))
+    git("add", ".", cwd=work)
+    git("commit", "-q", "-m", "first", cwd=work)
+    (work / "Pink.xml").write_bytes(make_theme_xml("pink", fg="FF0000"))
+    git("commit", "-q", "-am", "second", cwd=work)
+
+    bare = tmp_path / "themes.git"
+    git("clone", "-q", "--bare", str(work), str(bare))
+    git("config", "uploadpack.allowFilter", "true", cwd=bare)
+    return bare.as_uri()
+
+
+def checkout_files(dest):
+    return sorted(path.relative_to(dest).as_posix() for path in dest.rglob("*")
+                  if path.is_file() and ".git" not in path.relative_to(dest).parts)
+
+
+def test_sync_and_async_clones_run_the_same_steps(mkpp_home, bare_repo):
+    sync_dest = mkpp_home / "sync"
+    async_dest = mkpp_home / "async"
+
+    assert mkpp_cli.clone_git_repo(bare_repo, sync_dest)
+    asyncio.run(mkpp_cli.clone_git_repo_async(bare_repo, async_dest))
+
+    assert checkout_files(sync_dest) == checkout_files(async_dest)
+    assert git("rev-parse", "HEAD", cwd=sync_dest) == git("rev-parse", "HEAD", cwd=async_dest)
+
+
+def test_fetch_fetches_a_repeated_url_once(mkpp_home, bare_repo):
+    result = CliRunner().invoke(mkpp_cli.cli, ["--no-banner", "fetch", bare_repo, bare_repo + "/", "--no-install"])
+    assert result.exit_code == 0, result.output
+    assert "Fetching 1 repositories" in result.output
+    assert (mkpp_cli.get_repo_cache_dir(bare_repo) / "Pink.xml").exists()
+
+
+def test_fetch_waits_for_the_repository_lock(mkpp_home, bare_repo):
+    dest = mkpp_cli.get_repo_cache_dir(bare_repo)
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        # A separate open of the lock file stands in for another mkpp process
+        with mkpp_cli.repo_cache_lock(dest):
+            locked.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    locked.wait(5)
+    threading.Timer(0.5, release.set).start()
+
+    start = time.perf_counter()
+    results = asyncio.run(mkpp_cli.fetch_repos([bare_repo], 1, 60, False, 1, False, [], []))
+    holder.join()
+
+    assert results[0]["status"] == "fetched", results[0]["error"]
+    assert time.perf_counter() - start >= 0.4
+    with open(mkpp_cli.get_repo_lock_path(dest), 'wb') as f:
+        assert mkpp_cli.try_lock_file(f)
+
+
+def test_clone_is_shallow_and_sparse(mkpp_home, bare_repo):
+    dest = mkpp_cli.get_repo_cache_dir(bare_repo)
+    assert mkpp_cli.clone_git_repo(bare_repo, dest)
+
+    assert git("rev-parse", "--is-shallow-repository", cwd=dest).strip() == "true"
+    assert git("rev-list", "--count", "HEAD", cwd=dest).strip() == "1"
+    assert checkout_files(dest) == ["Pink.xml", "themes/dark/Night.xml", "themes/light/Day.xml",
+                                    "udl/markdown.udl.xml"]
+    assert b'fgColor="FF0000"' in (dest / "Pink.xml").read_bytes()
+
+
+def test_recursive_discovery_in_a_clone(mkpp_home, bare_repo):
+    dest = mkpp_cli.get_repo_cache_dir(bare_repo)
+    assert mkpp_cli.clone_git_repo(bare_repo, dest)
+
+    themes, udls = mkpp_cli.discover_files(dest, recursive=True)
+    assert [p.relative_to(dest).as_posix() for p in themes] == [
+        "Pink.xml", "themes/dark/Night.xml", "themes/light/Day.xml"]
+    assert [p.name for p in udls] == ["markdown.udl.xml"]
+
+
+def test_cached_clone_is_updated_in_place(mkpp_home, bare_repo, tmp_path):
+    dest = mkpp_cli.get_repo_cache_dir(bare_repo)
+    assert mkpp_cli.clone_git_repo(bare_repo, dest)
+    (dest / ".git" / "marker").write_text("kept")
+
+    work = tmp_path / "update"
+    git("clone", "-q", bare_repo, str(work))
+    (work / "themes" / "New.xml").write_bytes(make_theme_xml("new"))
+    git("add", ".", cwd=work)
+    git("commit", "-q", "-m", "third", cwd=work)
+    git("push", "-q", "origin", "HEAD", cwd=work)
+
+    assert mkpp_cli.clone_git_repo(bare_repo, dest)
+    assert (dest / ".git" / "marker").exists()
+    assert (dest / "themes" / "New.xml").exists()
+    assert git("rev-list", "--count", "HEAD", cwd=dest).strip() == "1"
+
+
+def test_install_git_installs_every_file(mkpp_home, bare_repo):
+    result = CliRunner().invoke(mkpp_cli.cli, ["--no-banner", "install-git", bare_repo, "--yes"])
+    assert result.exit_code == 0, result.output
+    assert sorted(p.name for p in mkpp_cli.DEFAULT_THEME_DIR.iterdir()) == ["Day.xml", "Night.xml", "Pink.xml"]
+    assert [p.name for p in mkpp_cli.DEFAULT_UDL_DIR.iterdir()] == ["markdown.udl.xml"]
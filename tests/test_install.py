@@ -0,0 +1,137 @@
+"""Tests for single and batch installs: manifest skips, validation and atomic batches"""
+
+import os
+
+import mkpp_cli
+from conftest import make_theme_xml, make_udl_xml
+
+
+def make_sources(root, count=3):
+    root.mkdir(parents=True, exist_ok=True)
+    themes = []
+    for i in range(count):
+        path = root / f"theme{i}.xml"
+        path.write_bytes(make_theme_xml(f"lexer{i}"))
+        themes.append(path)
+    udl = root / "lang.udl.xml"
+    udl.write_bytes(make_udl_xml())
+    return themes, [udl]
+
+
+def statuses(results):
+    return [r["status"] for r in results]
+
+
+def bump_mtime(path, seconds=1):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+
+def test_install_many_installs_then_skips(mkpp_home):
+    themes, udls = make_sources(mkpp_home / "src")
+
+    results = mkpp_cli.install_many(themes, udls)
+    assert statuses(results) == ["installed"] * 4
+    assert (mkpp_cli.DEFAULT_THEME_DIR / "theme0.xml").read_bytes() == themes[0].read_bytes()
+    assert (mkpp_cli.DEFAULT_UDL_DIR / "lang.udl.xml").exists()
+
+    assert statuses(mkpp_cli.install_many(themes, udls)) == ["skipped"] * 4
+    assert statuses(mkpp_cli.install_many(themes, udls, force=True)) == ["installed"] * 4
+
+
+def test_install_many_hashes_a_touched_source_once(mkpp_home, monkeypatch):
+    themes, _ = make_sources(mkpp_home / "src", 1)
+    mkpp_cli.install_many(themes, [])
+
+    bump_mtime(themes[0])
+    hashed = []
+    real_sha256 = mkpp_cli.file_sha256
+    monkeypatch.setattr(mkpp_cli, "file_sha256", lambda path: hashed.append(path) or real_sha256(path))
+
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["skipped"]
+    assert hashed == [themes[0]]
+
+
+def test_install_many_counts_invalid_and_missing_files_as_failures(mkpp_home):
+    themes, udls = make_sources(mkpp_home / "src", 2)
+    themes[1].write_bytes(b"<NotepadPlus><LexerStyles>")
+    missing = mkpp_home / "src" / "missing.xml"
+
+    results = mkpp_cli.install_many(themes + [missing], udls)
+    assert statuses(results) == ["installed", "failed", "failed", "installed"]
+    assert results[1]["error"].startswith("Invalid theme: not well-formed XML")
+    assert "not found" in results[2]["error"]
+    assert not (mkpp_cli.DEFAULT_THEME_DIR / "theme1.xml").exists()
+
+
+def test_atomic_install_writes_nothing_when_a_file_is_invalid(mkpp_home):
+    themes, udls = make_sources(mkpp_home / "src", 2)
+    themes[1].write_bytes(b"<NotepadPlus><UserLang/></NotepadPlus>")
+
+    results = mkpp_cli.install_many(themes, udls, atomic=True)
+    assert statuses(results) == ["failed"] * 3
+    assert "another file" in results[0]["error"]
+    assert not list(mkpp_cli.DEFAULT_THEME_DIR.iterdir())
+    assert not list(mkpp_cli.DEFAULT_UDL_DIR.iterdir())
+
+
+def test_install_many_reinstalls_an_edited_copy(mkpp_home):
+    themes, _ = make_sources(mkpp_home / "src", 2)
+    mkpp_cli.install_many(themes, [])
+
+    # Same size, different content: only the recorded mtime gives it away
+    installed = mkpp_cli.DEFAULT_THEME_DIR / "theme0.xml"
+    installed.write_bytes(installed.read_bytes().replace(b"FF8FB8", b"000000"))
+    # A different size is caught even with the recorded mtime put back
+    record = mkpp_cli.load_install_manifest()[str(mkpp_cli.DEFAULT_THEME_DIR / "theme1.xml")]
+    other = mkpp_cli.DEFAULT_THEME_DIR / "theme1.xml"
+    other.write_bytes(other.read_bytes() + b"\n")
+    os.utime(other, ns=(record["mtime"], record["mtime"]))
+
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["installed", "installed"]
+    assert installed.read_bytes() == themes[0].read_bytes()
+    assert other.read_bytes() == themes[1].read_bytes()
+
+
+def test_install_many_reinstalls_changed_source_content(mkpp_home):
+    themes, _ = make_sources(mkpp_home / "src", 1)
+    mkpp_cli.install_many(themes, [])
+
+    themes[0].write_bytes(make_theme_xml("lexer0", fg="000000"))
+    bump_mtime(themes[0])
+
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["installed"]
+    assert b'fgColor="000000"' in (mkpp_cli.DEFAULT_THEME_DIR / "theme0.xml").read_bytes()
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["skipped"]
+
+
+def test_same_content_from_another_folder_is_skipped(mkpp_home):
+    themes, _ = make_sources(mkpp_home / "src", 1)
+    mkpp_cli.install_many(themes, [])
+    moved, _ = make_sources(mkpp_home / "elsewhere", 1)
+
+    assert statuses(mkpp_cli.install_many(moved, [])) == ["skipped"]
+
+
+def test_a_missing_or_damaged_manifest_means_a_full_copy(mkpp_home):
+    themes, _ = make_sources(mkpp_home / "src", 1)
+    mkpp_cli.install_many(themes, [])
+
+    mkpp_cli.INSTALL_MANIFEST_FILE.write_text("{not json", encoding="utf-8")
+    assert mkpp_cli.load_install_manifest() == {}
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["installed"]
+
+    mkpp_cli.INSTALL_MANIFEST_FILE.unlink()
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["installed"]
+    assert statuses(mkpp_cli.install_many(themes, [])) == ["skipped"]
+
+
+def test_install_file_reports_an_up_to_date_copy(mkpp_home, capsys):
+    themes, _ = make_sources(mkpp_home / "src", 1)
+
+    assert mkpp_cli.install_file(themes[0], "theme")
+    assert "installed!" in capsys.readouterr().out
+    assert mkpp_cli.install_file(themes[0], "theme")
+    assert "already up to date" in capsys.readouterr().out
+    assert mkpp_cli.install_file(themes[0], "theme", force=True)
+    assert "installed!" in capsys.readouterr().out
@@ -0,0 +1,168 @@
+"""Tests for theme pack archives: pack -> install-pack round trips and damaged packs"""
+
+import json
+import struct
+
+import pytest
+from click.testing import CliRunner
+
+import mkpp_cli
+from conftest import make_theme_xml, make_udl_xml
+
+PALETTES = {"ver_pack": {"name": "Pack", "description": "From a pack", "colors": {
+    "bg_primary": "101010", "bg_secondary": "202020", "bg_surface": "303030", "bg_surface_alt": "404040",
+    "text_primary": "505050", "text_secondary": "606060", "text_muted": "707070",
+    "accent_primary": "808080", "accent_secondary": "909090", "accent_light": "A0A0A0"}}}
+
+
+@pytest.fixture
+def pack_folder(tmp_path):
+    folder = tmp_path / "pack"
+    (folder / "dark").mkdir(parents=True)
+    (folder / "Pink.xml").write_bytes(make_theme_xml("pink"))
+    (folder / "dark" / "Night.xml").write_bytes(make_theme_xml("night", bg="000000"))
+    (folder / "lang.udl.xml").write_bytes(make_udl_xml("lang"))
+    (folder / "color_config.json").write_text(json.dumps(PALETTES), encoding="utf-8")
+    return folder
+
+
+def make_pack(folder, dest):
+    members, errors = mkpp_cli.collect_pack_members(folder, recursive=True)
+    assert errors == []
+    return mkpp_cli.build_pack(dest, members)
+
+
+def rewrite_toc(archive, edit):
+    """Apply edit to the archive's table of contents and write it back, header included"""
+    data = archive.read_bytes()
+    magic, toc_offset, toc_size = struct.unpack_from(mkpp_cli.PACK_HEADER_FORMAT, data)
+    toc = json.loads(data[toc_offset:toc_offset + toc_size])
+    edit(toc)
+    toc_bytes = json.dumps(toc).encode("utf-8")
+    archive.write_bytes(struct.pack(mkpp_cli.PACK_HEADER_FORMAT, magic, toc_offset, len(toc_bytes))
+                        + data[mkpp_cli.PACK_HEADER_SIZE:toc_offset] + toc_bytes)
+
+
+def test_pack_round_trip(mkpp_home, pack_folder):
+    archive = mkpp_home / "themes.mkpp"
+    toc = make_pack(pack_folder, archive)
+    assert sorted((m["name"], m["kind"]) for m in toc["members"]) == [
+        ("Night.xml", "theme"), ("Pink.xml", "theme"), ("color_config.json", "palette"),
+        ("lang.udl.xml", "udl")]
+
+    results, palette_json = mkpp_cli.install_pack(archive)
+    assert sorted(r["status"] for r in results) == ["installed"] * 3
+    assert (mkpp_cli.DEFAULT_THEME_DIR / "Pink.xml").read_bytes() == (pack_folder / "Pink.xml").read_bytes()
+    assert (mkpp_cli.DEFAULT_THEME_DIR / "Night.xml").read_bytes() == \
+        (pack_folder / "dark" / "Night.xml").read_bytes()
+    assert (mkpp_cli.DEFAULT_UDL_DIR / "lang.udl.xml").read_bytes() == \
+        (pack_folder / "lang.udl.xml").read_bytes()
+    assert json.loads(palette_json) == PALETTES
+
+    results, _ = mkpp_cli.install_pack(archive)
+    assert [r["status"] for r in results] == ["skipped"] * 3
+
+
+def test_pack_commands_round_trip(mkpp_home, themes_dir, pack_folder):
+    archive = mkpp_home / "themes.mkpp"
+    runner = CliRunner()
+
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "pack", str(pack_folder), "-r", "-o", str(archive)])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "install-pack", str(archive), "--palettes"])
+    assert result.exit_code == 0, result.output
+
+    assert sorted(p.name for p in mkpp_cli.DEFAULT_THEME_DIR.iterdir()) == ["Night.xml", "Pink.xml"]
+    config = json.loads((themes_dir / "color_config.json").read_text(encoding="utf-8"))
+    assert config["ver_pack"] == PALETTES["ver_pack"]
+    assert "ver_001" in config
+
+
+def test_pack_refuses_clashing_names(tmp_path, pack_folder):
+    (pack_folder / "dark" / "pink.xml").write_bytes(make_theme_xml("other"))
+    _, errors = mkpp_cli.collect_pack_members(pack_folder, recursive=True)
+    assert any("has the same name as" in error for error in errors)
+
+
+def test_corrupted_member_fails_its_checksum(mkpp_home, pack_folder):
+    archive = mkpp_home / "themes.mkpp"
+    toc = make_pack(pack_folder, archive)
+    pink = next(m for m in toc["members"] if m["name"] == "Pink.xml")
+    data = bytearray(archive.read_bytes())
+    data[pink["offset"] + pink["size"] - 20] ^= 0x01
+    archive.write_bytes(bytes(data))
+
+    results, _ = mkpp_cli.install_pack(archive)
+    by_name = {r["source"].name: r for r in results}
+    assert by_name["Pink.xml"]["status"] == "failed"
+    assert "Checksum mismatch" in by_name["Pink.xml"]["error"]
+    assert by_name["Night.xml"]["status"] == "installed"
+    assert not (mkpp_cli.DEFAULT_THEME_DIR / "Pink.xml").exists()
+
+    with mkpp_cli.open_pack(archive) as (view, toc):
+        assert list(mkpp_cli.verify_pack_checksums(view, toc["members"])) == ["Pink.xml"]
+
+
+def test_atomic_install_of_a_corrupted_pack_writes_nothing(mkpp_home, pack_folder):
+    archive = mkpp_home / "themes.mkpp"
+    toc = make_pack(pack_folder, archive)
+    udl = next(m for m in toc["members"] if m["kind"] == "udl")
+    data = bytearray(archive.read_bytes())
+    data[udl["offset"] + udl["size"] - 20] ^= 0x01
+    archive.write_bytes(bytes(data))
+
+    results, _ = mkpp_cli.install_pack(archive, atomic=True)
+    assert [r["status"] for r in results] == ["failed"] * 3
+    assert not list(mkpp_cli.DEFAULT_THEME_DIR.iterdir())
+    assert not list(mkpp_cli.DEFAULT_UDL_DIR.iterdir())
+
+
+def test_corrupted_palette_rejects_the_pack(mkpp_home, pack_folder):
+    archive = mkpp_home / "themes.mkpp"
+    toc = make_pack(pack_folder, archive)
+    palette = next(m for m in toc["members"] if m["kind"] == "palette")
+    rewrite_toc(archive, lambda toc: next(m for m in toc["members"] if m["kind"] == "palette")
+                .update(sha256="0" * 64))
+
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        mkpp_cli.install_pack(archive)
+    assert palette["name"] == "color_config.json"
+
+
+@pytest.mark.parametrize("edit, message", [
+    (lambda toc: toc["members"][0].update(name="../../evil.xml"), "bad table of contents entry"),
+    (lambda toc: toc["members"][0].update(name="evil.exe"), "bad table of contents entry"),
+    (lambda toc: toc["members"][0].update(kind="udl"), "bad table of contents entry"),
+    (lambda toc: toc["members"][0].update(size=10 ** 9), "bad table of contents entry"),
+    (lambda toc: toc["members"][0].update(offset=0), "bad table of contents entry"),
+    (lambda toc: toc.update(format=99), "unsupported pack format"),
+])
+def test_tampered_toc_is_rejected(mkpp_home, pack_folder, edit, message):
+    archive = mkpp_home / "themes.mkpp"
+    make_pack(pack_folder, archive)
+    rewrite_toc(archive, edit)
+
+    with pytest.raises(ValueError, match=message):
+        mkpp_cli.install_pack(archive)
+    assert not list(mkpp_cli.DEFAULT_THEME_DIR.iterdir())
+
+
+def test_damaged_header_and_toc_are_rejected(mkpp_home, pack_folder):
+    archive = mkpp_home / "themes.mkpp"
+    make_pack(pack_folder, archive)
+    data = archive.read_bytes()
+
+    archive.write_bytes(data[:-5])
+    with pytest.raises(ValueError, match="truncated"):
+        mkpp_cli.install_pack(archive)
+
+    archive.write_bytes(data[:-5] + b"\xff" * 5)
+    with pytest.raises(ValueError, match="damaged"):
+        mkpp_cli.install_pack(archive)
+
+    archive.write_bytes(b"NOTAPACK" + data[8:])
+    with pytest.raises(ValueError, match="not a milk"):
+        mkpp_cli.install_pack(archive)
+
+    result = CliRunner().invoke(mkpp_cli.cli, ["--no-banner", "install-pack", str(archive), "--validate-only"])
+    assert result.exit_code == 1
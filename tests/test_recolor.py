@@ -0,0 +1,83 @@
+"""Tests for role-aware recoloring against the bundled StrawberryMilk theme"""
+
+import pytest
+
+import mkpp_cli
+
+THEME = (mkpp_cli.THEMES_DIR / "StrawberryMilk.xml").read_text(encoding="utf-8")
+
+PALETTE = {
+    "bg_primary": "101010", "bg_secondary": "202020", "bg_surface": "303030", "bg_surface_alt": "404040",
+    "text_primary": "505050", "text_secondary": "606060", "text_muted": "707070",
+    "accent_primary": "808080", "accent_secondary": "909090", "accent_light": "A0A0A0",
+}
+
+
+def style_color(content: str, lexer: str, name: str, attr: str) -> str:
+    entry = mkpp_cli.build_style_index(content)[(lexer, name)][0]
+    return content[slice(*entry["spans"][attr])]
+
+
+@pytest.fixture(scope="module")
+def recolored():
+    return mkpp_cli.recolor_by_roles(THEME, PALETTE)[0]
+
+
+@pytest.mark.parametrize("lexer, name, attr, before, key", [
+    ("python", "DEFAULT", "fgColor", "E8C5D5", "text_primary"),
+    ("python", "DEFAULT", "bgColor", "141415", "bg_primary"),
+    ("python", "COMMENTLINE", "fgColor", "BB889F", "text_muted"),
+    ("python", "NUMBER", "fgColor", "FF6BA8", "accent_secondary"),
+    ("python", "KEYWORDS", "fgColor", "FFB3D1", "text_secondary"),
+    ("python", "STRING", "fgColor", "E8C5D5", "accent_light"),
+    # No rule names these; they take the role of their current color
+    ("python", "OPERATOR", "fgColor", "E8C5D5", "text_primary"),
+    ("python", "IDENTIFIER", "bgColor", "141415", "bg_primary"),
+    ("python", "CLASSNAME", "fgColor", "FFB3D1", "text_secondary"),
+    ("batch", "COMMAND", "fgColor", "BB889F", "text_muted"),
+    ("GlobalStyles", "Default Style", "bgColor", "141415", "bg_primary"),
+    ("GlobalStyles", "Current line background colour", "bgColor", "161619", "bg_secondary"),
+    ("GlobalStyles", "Bad brace colour", "fgColor", "E8C5D5", "text_primary"),
+])
+def test_roles_recolor_styles(recolored, lexer, name, attr, before, key):
+    assert style_color(THEME, lexer, name, attr) == before
+    assert style_color(recolored, lexer, name, attr) == PALETTE[key]
+
+
+@pytest.mark.parametrize("lexer, name, before", [
+    ("rust", "LEXICAL ERROR", "FF6BA8"),
+    ("latex", "SYNTAX ERROR", "FF6BA8"),
+    ("GlobalStyles", "Bad brace colour", "FF6BA8"),
+    ("GlobalStyles", "Smart HighLighting", "E8C5D5"),
+])
+def test_roles_keep_highlight_backgrounds(recolored, lexer, name, before):
+    assert style_color(THEME, lexer, name, "bgColor") == before
+    assert style_color(recolored, lexer, name, "bgColor") == before
+
+
+def test_roles_leave_no_old_text_colors(recolored):
+    for old in ("E8C5D5", "FFB3D1", "BB889F", "FFD6E8", "FF6BA8"):
+        assert f'fgColor="{old}"' in THEME
+        assert f'fgColor="{old}"' not in recolored
+
+
+def test_roles_leave_change_history_alone(recolored):
+    assert style_color(recolored, "GlobalStyles", "Change History modified", "fgColor") == \
+        style_color(THEME, "GlobalStyles", "Change History modified", "fgColor")
+
+
+def test_lexer_filter_and_extra_rules():
+    content, _ = mkpp_cli.recolor_by_roles(
+        THEME, PALETTE, [("python", "COMMENT*", "fgColor", "accent_primary")] + mkpp_cli.ROLE_RULES, ["python"])
+    assert style_color(content, "python", "COMMENTLINE", "fgColor") == PALETTE["accent_primary"]
+    assert style_color(content, "batch", "COMMENT", "fgColor") == "BB889F"
+
+
+def test_unanchored_colors_fall_back_to_the_legacy_color_map():
+    content = ('<NotepadPlus><LexerStyles><LexerType name="x" desc="x" ext="">'
+               '<WordsStyle name="OPERATOR" styleID="1" fgColor="FFB3D1" bgColor="120A14" />'
+               '</LexerType></LexerStyles></NotepadPlus>')
+    recolored, counts = mkpp_cli.recolor_by_roles(content, PALETTE)
+    assert style_color(recolored, "x", "OPERATOR", "fgColor") == PALETTE["text_secondary"]
+    assert style_color(recolored, "x", "OPERATOR", "bgColor") == PALETTE["bg_primary"]
+    assert counts == {"text_secondary": 1, "bg_primary": 1}
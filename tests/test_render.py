@@ -0,0 +1,98 @@
+"""Tests that token templates render exactly what recoloring the source theme does"""
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+import mkpp_cli
+
+THEME_FILES = ["StrawberryMilk.xml", "UDL/markdown.strawberrymilk.udl.xml"]
+
+
+@pytest.fixture
+def config(themes_dir):
+    return mkpp_cli.load_palette_config()
+
+
+def test_plan_has_one_more_chunk_than_slots():
+    plan = mkpp_cli.compile_render_plan('<a fgColor="{{text_primary}}" bgColor="{{ bg_primary }}" />')
+    assert plan["chunks"] == ['<a fgColor="', '" bgColor="', '" />']
+    assert plan["slots"] == ["text_primary", "bg_primary"]
+    assert mkpp_cli.fill_render_plan(plan, {"text_primary": "111111", "bg_primary": "222222"}) == \
+        '<a fgColor="111111" bgColor="222222" />'
+    assert mkpp_cli.fill_render_plan(mkpp_cli.compile_render_plan("no tokens"), {}) == "no tokens"
+
+
+@pytest.mark.parametrize("xml_file", THEME_FILES)
+def test_template_renders_what_recoloring_does(themes_dir, config, xml_file):
+    content = (themes_dir / xml_file).read_text(encoding="utf-8")
+    base = mkpp_cli.detect_template_version(content, config)
+    assert base is not None
+    base_colors = config[base]["colors"]
+
+    template, counts = mkpp_cli.tokenize_theme(content, base_colors)
+    assert sum(counts.values())
+    plan = mkpp_cli.compile_render_plan(template)
+    assert mkpp_cli.fill_render_plan(plan, base_colors) == content
+
+    for version, palette in config.items():
+        targets = mkpp_cli.build_render_targets(base_colors, palette["colors"])
+        expected, _ = mkpp_cli.recolor_content(content, version, {}, targets)
+        assert mkpp_cli.fill_render_plan(plan, palette["colors"]) == expected, version
+
+
+def test_detect_template_version_picks_the_palette_in_use(config):
+    colors = config["ver_003"]["colors"]
+    content = "".join(f'<WordsStyle fgColor="{value}" />' for value in colors.values())
+    assert mkpp_cli.detect_template_version(content, config) == "ver_003"
+    assert mkpp_cli.detect_template_version('<WordsStyle fgColor="ABCDEF" />', config) is None
+
+
+def test_render_plan_is_cached_until_the_template_changes(tmp_path, monkeypatch):
+    template = tmp_path / "Theme.xml.tmpl"
+    template.write_text('<a fgColor="{{text_primary}}" />', encoding="utf-8")
+    plan = mkpp_cli.load_render_plan(template)
+    assert mkpp_cli.get_render_plan_path(template).exists()
+
+    compiled = []
+    real_compile = mkpp_cli.compile_render_plan
+    monkeypatch.setattr(mkpp_cli, "compile_render_plan", lambda text: compiled.append(text) or real_compile(text))
+
+    assert mkpp_cli.load_render_plan(template) == plan
+    assert compiled == []
+
+    template.write_text('<a bgColor="{{bg_primary}}" />', encoding="utf-8")
+    assert mkpp_cli.load_render_plan(template)["slots"] == ["bg_primary"]
+    assert len(compiled) == 1
+
+    mkpp_cli.get_render_plan_path(template).write_text("{damaged", encoding="utf-8")
+    assert mkpp_cli.load_render_plan(template)["slots"] == ["bg_primary"]
+    assert json.loads(mkpp_cli.get_render_plan_path(template).read_text(encoding="utf-8"))["slots"] == ["bg_primary"]
+
+
+def test_render_command_gives_the_same_files_from_a_template(themes_dir):
+    runner = CliRunner()
+    result = runner.invoke(mkpp_cli.cli, ["--no-banner", "template", "StrawberryMilk.xml"])
+    assert result.exit_code == 0, result.output
+
+    from_xml = themes_dir / "from_xml"
+    from_tmpl = themes_dir / "from_tmpl"
+    for xml_file, output in (("StrawberryMilk.xml", from_xml), ("StrawberryMilk.xml.tmpl", from_tmpl)):
+        result = runner.invoke(mkpp_cli.cli, ["--no-banner", "render", "--all", "--file", xml_file,
+                                              "-o", str(output), "-j", "1"])
+        assert result.exit_code == 0, result.output
+
+    names = sorted(path.name for path in from_xml.iterdir())
+    assert names == ["StrawberryMilk.ver_001.xml", "StrawberryMilk.ver_002.xml", "StrawberryMilk.ver_003.xml"]
+    assert sorted(path.name for path in from_tmpl.iterdir()) == names
+    for name in names:
+        assert (from_tmpl / name).read_text(encoding="utf-8") == (from_xml / name).read_text(encoding="utf-8")
+
+
+def test_render_reports_a_palette_missing_a_slot(themes_dir, config, tmp_path):
+    template = tmp_path / "Theme.xml.tmpl"
+    template.write_text('<a fgColor="{{no_such_key}}" />', encoding="utf-8")
+    results = mkpp_cli.render_templates([template], ["ver_001"], config, tmp_path / "out")
+    assert results[0]["status"] == "failed"
+    assert "no_such_key" in results[0]["error"]
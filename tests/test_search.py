@@ -0,0 +1,42 @@
+"""Tests for the style index and the color search built on it"""
+
+import mkpp_cli
+
+REPEATED_NAMES_XML = """<?xml version="1.0" encoding="UTF-8" ?>
+<NotepadPlus>
+<LexerStyles>
+<LexerType name="sql" desc="SQL" ext="">
+<WordsStyle name="KEYWORD" styleID="5" fgColor="112233" bgColor="FFFFFF" fontStyle="1" />
+<WordsStyle name="KEYWORD" styleID="16" fgColor="445566" bgColor="FFFFFF" fontStyle="0" />
+</LexerType>
+</LexerStyles>
+</NotepadPlus>
+"""
+
+
+def test_style_index_keeps_every_style_with_a_repeated_name():
+    index = mkpp_cli.build_style_index(REPEATED_NAMES_XML)
+    entries = index[("sql", "KEYWORD")]
+    assert [entry["styleID"] for entry in entries] == ["5", "16"]
+    assert [REPEATED_NAMES_XML[slice(*entry["spans"]["fgColor"])] for entry in entries] == ["112233", "445566"]
+
+
+def test_role_plan_covers_repeated_names():
+    content, counts = mkpp_cli.recolor_by_roles(REPEATED_NAMES_XML, {"text_secondary": "ABCDEF"},
+                                                [("*", "*KEYWORD*", "fgColor", "text_secondary")])
+    assert content.count('fgColor="ABCDEF"') == 2
+    assert counts == {"text_secondary": 2}
+
+
+def test_search_finds_the_second_style_with_a_name(mkpp_home):
+    (mkpp_cli.DEFAULT_THEME_DIR / "sql.xml").write_text(REPEATED_NAMES_XML, encoding="utf-8")
+
+    db = mkpp_cli.open_search_index()
+    try:
+        assert mkpp_cli.update_search_index(db) == 1
+        rows = mkpp_cli.search_themes(db, color="445566")
+        assert [(row["lexer"], row["style"], row["attr"]) for row in rows] == [("sql", "KEYWORD", "fgColor")]
+        assert mkpp_cli.search_themes(db, lexer="SQL")[0]["file"] == "sql.xml"
+        assert mkpp_cli.update_search_index(db) == 0
+    finally:
+        db.close()
@@ -0,0 +1,108 @@
+"""Tests for --dedupe installs through the content-addressed store and mkpp gc"""
+
+import os
+import stat
+
+import pytest
+
+import mkpp_cli
+from conftest import make_theme_xml
+
+
+@pytest.fixture
+def dedupe(mkpp_home, monkeypatch):
+    monkeypatch.setattr(mkpp_cli, "DEDUPE_INSTALLS", True)
+    return mkpp_home
+
+
+@pytest.fixture
+def fake_reflinks(monkeypatch):
+    """Report copies as reflinks, as on Btrfs/XFS, so the store keeps references"""
+    monkeypatch.setattr(mkpp_cli, "probe_reflink", lambda dest_dir: True)
+    real_stage = mkpp_cli.stage_store_link
+
+    def stage(obj, dest):
+        temp, _ = real_stage(obj, dest)
+        return temp, "reflink"
+
+    monkeypatch.setattr(mkpp_cli, "stage_store_link", stage)
+
+
+def make_sources(root):
+    root.mkdir()
+    shared = make_theme_xml("shared")
+    for name in ("a.xml", "b.xml"):
+        (root / name).write_bytes(shared)
+    (root / "c.xml").write_bytes(make_theme_xml("unique"))
+    return sorted(root.iterdir())
+
+
+def store_objects():
+    return sorted(path.name for path in mkpp_cli.STORE_DIR.rglob("*") if path.is_file())
+
+
+def test_dedupe_installs_are_writable_and_never_hard_links(dedupe, fake_reflinks):
+    themes = make_sources(dedupe / "src")
+    results = mkpp_cli.install_many(themes, [])
+    assert [r["status"] for r in results] == ["installed"] * 3
+
+    assert len(store_objects()) == 2
+    for result in results:
+        dest = result["dest"]
+        assert dest.read_bytes() == result["source"].read_bytes()
+        assert os.stat(dest).st_nlink == 1
+        assert os.stat(dest).st_mode & stat.S_IWUSR
+        assert result["record"]["store"] == "reflink"
+    for obj in mkpp_cli.STORE_DIR.rglob("*"):
+        if obj.is_file():
+            assert os.stat(obj).st_nlink == 1
+            assert not os.stat(obj).st_mode & stat.S_IWUSR
+
+
+def test_gc_counts_references_per_object(dedupe, fake_reflinks):
+    themes = make_sources(dedupe / "src")
+    results = mkpp_cli.install_many(themes, [])
+    assert all(r["record"]["store"] == "reflink" for r in results)
+    shared_sha = results[0]["record"]["sha256"]
+    unique_sha = results[2]["record"]["sha256"]
+    assert store_objects() == sorted([shared_sha, unique_sha])
+
+    assert mkpp_cli.gc_store() == (2, 0, 0)
+
+    # One of two installs sharing an object is gone: the object stays
+    results[0]["dest"].unlink()
+    assert mkpp_cli.gc_store() == (2, 0, 0)
+
+    # An installed copy edited in Notepad++ no longer refers to its object
+    results[2]["dest"].write_bytes(make_theme_xml("edited"))
+    size = mkpp_cli.get_store_object_path(unique_sha).stat().st_size
+    assert mkpp_cli.gc_store(dry_run=True) == (1, 1, size)
+    assert store_objects() == sorted([shared_sha, unique_sha])
+    assert mkpp_cli.gc_store() == (1, 1, size)
+    assert store_objects() == [shared_sha]
+
+    results[1]["dest"].unlink()
+    assert mkpp_cli.gc_store()[:2] == (0, 1)
+    assert store_objects() == []
+
+
+def test_without_reflinks_dedupe_installs_plain_copies(dedupe, monkeypatch, capsys):
+    probed = []
+    monkeypatch.setattr(mkpp_cli, "probe_reflink", lambda dest_dir: probed.append(dest_dir) or False)
+    themes = make_sources(dedupe / "src")
+
+    results = mkpp_cli.install_many(themes, [])
+    assert [r["status"] for r in results] == ["installed"] * 3
+    assert all("store" not in r["record"] for r in results)
+    assert all(r["dest"].read_bytes() == r["source"].read_bytes() for r in results)
+    assert not mkpp_cli.STORE_DIR.exists()
+
+    assert mkpp_cli.install_many(themes, [], force=True)
+    assert probed == [mkpp_cli.DEFAULT_THEME_DIR]
+    assert capsys.readouterr().out.count("--dedupe needs reflinks") == 1
+
+
+def test_probe_reflink_leaves_no_scratch_files(dedupe):
+    assert mkpp_cli.probe_reflink(mkpp_cli.DEFAULT_THEME_DIR) in (True, False)
+    assert not list(mkpp_cli.DEFAULT_THEME_DIR.iterdir())
+    assert not list(mkpp_cli.STORE_DIR.iterdir())
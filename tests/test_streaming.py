@@ -0,0 +1,71 @@
+"""Tests that streaming recolor writes exactly what the in-memory recolor does"""
+
+import io
+
+import pytest
+
+import mkpp_cli
+
+PALETTE = {
+    "bg_primary": "101010", "bg_secondary": "202020", "bg_surface": "303030", "bg_surface_alt": "404040",
+    "text_primary": "505050", "text_secondary": "606060", "text_muted": "707070",
+    "accent_primary": "808080", "accent_secondary": "909090", "accent_light": "A0A0A0",
+}
+
+
+def test_bundled_theme_is_streamed_in_several_pieces(themes_dir):
+    xml_path = themes_dir / "StrawberryMilk.xml"
+    assert xml_path.stat().st_size > mkpp_cli.STREAM_CHUNK_SIZE
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 4096, mkpp_cli.STREAM_CHUNK_SIZE])
+def test_pieces_end_on_tag_boundaries(themes_dir, chunk_size):
+    content = (themes_dir / "StrawberryMilk.xml").read_text(encoding="utf-8")
+    pieces = list(mkpp_cli.iter_xml_pieces(io.StringIO(content), chunk_size))
+    assert "".join(pieces) == content
+    assert all(piece.endswith(">") for piece in pieces[:-1])
+    for piece in pieces:
+        assert piece.count('Color="') == len(mkpp_cli.COLOR_ATTR_RE.findall(piece))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_recoloring_pieces_matches_recoloring_the_whole_file(themes_dir, chunk_size):
+    content = (themes_dir / "StrawberryMilk.xml").read_text(encoding="utf-8")
+    expected, expected_counts = mkpp_cli.recolor_content(content, "ver_test", PALETTE)
+
+    output = []
+    counts = {}
+    for piece in mkpp_cli.iter_xml_pieces(io.StringIO(content), chunk_size):
+        piece, piece_counts = mkpp_cli.recolor_content(piece, "ver_test", PALETTE)
+        output.append(piece)
+        for key, count in piece_counts.items():
+            counts[key] = counts.get(key, 0) + count
+
+    assert "".join(output) == expected
+    assert counts == expected_counts
+
+
+def test_streamed_file_matches_in_memory_recolor(themes_dir):
+    xml_path = themes_dir / "StrawberryMilk.xml"
+    content = xml_path.read_text(encoding="utf-8")
+    expected, expected_counts = mkpp_cli.recolor_content(content, "ver_test", PALETTE)
+    assert sum(expected_counts.values())
+
+    counts = mkpp_cli.recolor_file_streaming(xml_path, "ver_test", PALETTE)
+    assert xml_path.read_text(encoding="utf-8") == expected
+    assert counts == expected_counts
+    assert [p.name for p in themes_dir.iterdir() if p.name.startswith("StrawberryMilk.xml")] == \
+        ["StrawberryMilk.xml"]
+
+
+@pytest.mark.parametrize("xml_file", ["StrawberryMilk.xml", "UDL/markdown.strawberrymilk.udl.xml"])
+def test_update_theme_xml_writes_the_same_file_either_way(mkpp_home, themes_dir, xml_file):
+    version = next(iter(mkpp_cli.load_palette_config()))
+    original = (themes_dir / xml_file).read_bytes()
+
+    assert mkpp_cli.update_theme_xml(version, xml_file, stream=True)
+    streamed = (themes_dir / xml_file).read_bytes()
+    (themes_dir / xml_file).write_bytes(original)
+    assert mkpp_cli.update_theme_xml(version, xml_file, stream=False)
+
+    assert (themes_dir / xml_file).read_bytes() == streamed
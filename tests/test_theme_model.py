@@ -0,0 +1,116 @@
+"""Tests for ThemeModel: byte-identical round trips, lazy keywords and memory use"""
+
+import random
+import tracemalloc
+
+import pytest
+
+import mkpp_cli
+
+THEME_FILES = sorted(mkpp_cli.THEMES_DIR.glob("*.xml")) + sorted((mkpp_cli.THEMES_DIR / "UDL").glob("*.xml"))
+
+KEYWORDS_XML = (
+    b'\xef\xbb\xbf<?xml version="1.0" encoding="UTF-8" ?>\r\n<NotepadPlus>\r\n<LexerStyles>\r\n'
+    b'<LexerType name="python" desc="Python" ext="">\r\n'
+    b'  <WordsStyle name="KEYWORDS" styleID="5" fgColor="FFB3D1"  bgColor = "141415" fontStyle=\'1\'>'
+    b'and as assert\r\nbreak class</WordsStyle>\r\n'
+    b'  <WordsStyle name="DEFAULT" styleID="0" fgColor="E8C5D5" bgColor="141415" />\r\n'
+    b'  <WordsStyle name="CAF\xe9" styleID="1" fgColor="BB889F"></WordsStyle>\r\n'
+    b'</LexerType>\r\n</LexerStyles>\r\n<GlobalStyles>\r\n'
+    b'  <WidgetStyle name="Default Style" styleID="32" fgColor="E8C5D5" bgColor="141415" />\r\n'
+    b'</GlobalStyles>\r\n</NotepadPlus>\r\n'
+)
+
+
+@pytest.fixture
+def keywords_theme(tmp_path):
+    path = tmp_path / "Keywords.xml"
+    path.write_bytes(KEYWORDS_XML)
+    return path
+
+
+@pytest.mark.parametrize("path", THEME_FILES, ids=lambda path: path.name)
+def test_bundled_files_round_trip(path):
+    model = mkpp_cli.ThemeModel.load(path)
+    assert len(model)
+    assert model.serialize() == path.read_bytes()
+
+
+def test_odd_formatting_round_trips(keywords_theme):
+    model = mkpp_cli.ThemeModel.load(keywords_theme)
+    assert model.serialize() == KEYWORDS_XML
+    assert [(record.lexer, record.name) for record in model.styles()] == [
+        ("python", "KEYWORDS"), ("python", "DEFAULT"), ("python", "CAF\udce9"), ("GlobalStyles", "Default Style")]
+
+
+def test_set_changes_only_that_value(keywords_theme):
+    model = mkpp_cli.ThemeModel.load(keywords_theme)
+    record = model.find_style("python", "KEYWORDS")
+    assert record.attrs == {"name": "KEYWORDS", "styleID": "5", "fgColor": "FFB3D1", "bgColor": "141415"}
+    record.set("bgColor", "000000")
+    model.find_style("GlobalStyles", "Default Style").set("fgColor", "FFFFFF")
+
+    assert model.serialize() == KEYWORDS_XML.replace(b'bgColor = "141415"', b'bgColor = "000000"').replace(
+        b'name="Default Style" styleID="32" fgColor="E8C5D5"', b'name="Default Style" styleID="32" fgColor="FFFFFF"')
+    with pytest.raises(KeyError):
+        record.set("fontName", "Consolas")
+    assert model.find_style("python", "NOPE") is None
+
+
+def test_keywords_are_read_on_first_use(keywords_theme):
+    model = mkpp_cli.ThemeModel.load(keywords_theme)
+    assert model._keywords is None
+
+    records = list(model.styles())
+    assert records[0].keywords == "and as assert\r\nbreak class"
+    assert records[1].keywords == ""
+    assert records[2].keywords == ""
+
+
+@pytest.mark.parametrize("read", [lambda model: model.serialize(), lambda model: next(model.styles()).keywords])
+def test_a_file_changed_after_loading_is_refused(keywords_theme, read):
+    model = mkpp_cli.ThemeModel.load(keywords_theme)
+    keywords_theme.write_bytes(KEYWORDS_XML.replace(b'<LexerType name="python"', b'<LexerType  name="py"'))
+
+    with pytest.raises(ValueError, match="changed since it was loaded"):
+        read(model)
+
+
+def test_keywords_read_before_a_change_still_serialize(keywords_theme):
+    model = mkpp_cli.ThemeModel.load(keywords_theme)
+    assert next(model.styles()).keywords
+    keywords_theme.write_bytes(b"")
+    assert model.serialize() == KEYWORDS_XML
+
+
+def test_load_theme_models_reads_the_installed_themes(mkpp_home, keywords_theme):
+    (mkpp_cli.DEFAULT_THEME_DIR / "Keywords.xml").write_bytes(KEYWORDS_XML)
+    (mkpp_cli.DEFAULT_THEME_DIR / "lang.udl.xml").write_bytes(b"<NotepadPlus />")
+
+    models = mkpp_cli.load_theme_models()
+    assert list(models) == [str(mkpp_cli.DEFAULT_THEME_DIR / "Keywords.xml")]
+
+
+def test_many_loaded_themes_stay_within_the_memory_budget(tmp_path):
+    template = (mkpp_cli.THEMES_DIR / "StrawberryMilk.xml").read_text(encoding="utf-8")
+    sources = sorted(set(value for _, value in mkpp_cli.COLOR_ATTR_RE.findall(template)))
+    rng = random.Random(0)
+    folder = tmp_path / "themes"
+    folder.mkdir()
+    for i in range(200):
+        variant = template
+        for source in rng.sample(sources, 3):
+            variant = variant.replace(f'"{source}"', f'"{rng.randrange(0x1000000):06X}"')
+        (folder / f"theme{i:03d}.xml").write_text(variant, encoding="utf-8")
+
+    tracemalloc.start()
+    try:
+        models = mkpp_cli.load_theme_models(folder)
+        used = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert len(models) == 200
+    assert used / len(models) < 32 * 1024
+    assert all(model.serialize() == (folder / f"theme{i:03d}.xml").read_bytes()
+               for i, model in enumerate(models.values()))
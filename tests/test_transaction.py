@@ -0,0 +1,130 @@
+"""Tests for atomic writes and FileTransaction commits, rollbacks and discards"""
+
+import os
+
+import pytest
+
+import mkpp_cli
+from conftest import make_theme_xml
+
+
+def fail_replacing(monkeypatch, name):
+    """Make os.replace fail when a staged temp file is swapped in over ``name``"""
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if str(src).endswith(".mkpp-tmp") and os.path.basename(dst) == name:
+            raise PermissionError(f"{name} is locked")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(mkpp_cli.os, "replace", replace)
+
+
+def listing(folder):
+    return sorted(path.name for path in folder.iterdir())
+
+
+def test_commit_swaps_every_file_in(tmp_path):
+    (tmp_path / "a.xml").write_text("old a")
+    source = tmp_path / "source.txt"
+    source.write_text("copied")
+
+    with mkpp_cli.FileTransaction() as tx:
+        tx.write_text(tmp_path / "a.xml", "new a")
+        tx.write_bytes(tmp_path / "b.xml", b"new b")
+        tx.copy(source, tmp_path / "c.xml")
+        assert (tmp_path / "a.xml").read_text() == "old a"
+        assert not (tmp_path / "b.xml").exists()
+
+    assert (tmp_path / "a.xml").read_text() == "new a"
+    assert (tmp_path / "b.xml").read_bytes() == b"new b"
+    assert (tmp_path / "c.xml").read_text() == "copied"
+    assert listing(tmp_path) == ["a.xml", "b.xml", "c.xml", "source.txt"]
+
+
+def test_an_error_in_the_block_discards_the_staged_files(tmp_path):
+    (tmp_path / "a.xml").write_text("old a")
+
+    with pytest.raises(RuntimeError):
+        with mkpp_cli.FileTransaction() as tx:
+            tx.write_text(tmp_path / "a.xml", "new a")
+            tx.write_text(tmp_path / "b.xml", "new b")
+            raise RuntimeError("stop")
+
+    assert (tmp_path / "a.xml").read_text() == "old a"
+    assert listing(tmp_path) == ["a.xml"]
+
+
+def test_a_failed_commit_puts_every_original_back(tmp_path, monkeypatch):
+    (tmp_path / "a.xml").write_text("old a")
+    (tmp_path / "c.xml").write_text("old c")
+    fail_replacing(monkeypatch, "c.xml")
+
+    tx = mkpp_cli.FileTransaction()
+    tx.write_text(tmp_path / "a.xml", "new a")
+    tx.write_text(tmp_path / "b.xml", "new b")
+    tx.write_text(tmp_path / "c.xml", "new c")
+    with pytest.raises(PermissionError):
+        tx.commit()
+
+    assert (tmp_path / "a.xml").read_text() == "old a"
+    assert (tmp_path / "c.xml").read_text() == "old c"
+    assert listing(tmp_path) == ["a.xml", "c.xml"]
+
+
+def test_atomic_write_text_keeps_the_original_on_error(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("original", encoding="utf-8")
+
+    with pytest.raises(UnicodeEncodeError):
+        mkpp_cli.atomic_write_text(path, "café", encoding="ascii")
+
+    assert path.read_text(encoding="utf-8") == "original"
+    assert listing(tmp_path) == ["config.json"]
+
+
+def test_atomic_install_rolls_back_when_a_swap_fails(mkpp_home, monkeypatch):
+    source = mkpp_home / "src"
+    source.mkdir()
+    themes = []
+    for name in ("a.xml", "b.xml", "c.xml"):
+        (source / name).write_bytes(make_theme_xml(name[0]))
+        themes.append(source / name)
+    mkpp_cli.install_many(themes[:2], [])
+    installed = {name: (mkpp_cli.DEFAULT_THEME_DIR / name).read_bytes() for name in ("a.xml", "b.xml")}
+    manifest = mkpp_cli.load_install_manifest()
+
+    for theme in themes:
+        theme.write_bytes(make_theme_xml(theme.stem, fg="000000"))
+    fail_replacing(monkeypatch, "b.xml")
+
+    results = mkpp_cli.install_many(themes, [], atomic=True)
+    assert [r["status"] for r in results] == ["failed"] * 3
+    assert all(r["error"].startswith("Rolled back: b.xml is locked") for r in results)
+    assert {name: (mkpp_cli.DEFAULT_THEME_DIR / name).read_bytes() for name in ("a.xml", "b.xml")} == installed
+    assert listing(mkpp_cli.DEFAULT_THEME_DIR) == ["a.xml", "b.xml"]
+    assert mkpp_cli.load_install_manifest() == manifest
+
+
+def test_atomic_install_discards_staged_copies_when_one_copy_fails(mkpp_home, monkeypatch):
+    source = mkpp_home / "src"
+    source.mkdir()
+    themes = []
+    for name in ("a.xml", "b.xml"):
+        (source / name).write_bytes(make_theme_xml(name[0]))
+        themes.append(source / name)
+
+    real_stage = mkpp_cli.stage_file_copy
+
+    def stage(src, dest):
+        if dest.name == "b.xml":
+            raise OSError("disk full")
+        return real_stage(src, dest)
+
+    monkeypatch.setattr(mkpp_cli, "stage_file_copy", stage)
+
+    results = mkpp_cli.install_many(themes, [], atomic=True, jobs=1)
+    assert [r["status"] for r in results] == ["failed", "failed"]
+    assert results[0]["error"] == "Rolled back: another file in the batch failed"
+    assert "disk full" in results[1]["error"]
+    assert not list(mkpp_cli.DEFAULT_THEME_DIR.iterdir())